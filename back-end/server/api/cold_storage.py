@@ -0,0 +1,317 @@
+"""
+Cold storage for old message bodies.
+
+`python manage.py tier_messages` moves the bodies of messages older than
+AFTER_DAYS out of the Message table into append-only segment files on local
+disk. The row keeps its first PREVIEW_CHARS characters in message_body and a
+short body_ref, so the hot table holds little more than metadata. Bodies
+that fit in the preview stay where they are.
+
+Feeds serve the preview and flag it as truncated, without touching cold
+storage; read_message returns the full body when a message is opened.
+
+Bodies are written in blocks of up to BLOCK_SIZE messages, grouped by
+virtual number so one inbox's history shares blocks. A block is a
+zlib-compressed JSON list (zlib's Adler-32 trailer catches corruption). The
+offset index lives in the Message rows themselves:
+
+    body_ref = "<segment>:<offset>:<length>:<slot>"
+
+so reading a body is one seek and one decompress, and decompressed blocks
+are kept in an LRU. A new segment is started once the current one exceeds
+SEGMENT_BYTES.
+
+Bodies of deleted messages stay in their segment as dead space. After each
+run tier_messages compacts every sealed segment that is at least
+COMPACT_DEAD_RATIO dead: its live bodies are appended again, the rows are
+pointed at the copies and the old file is deleted. Disk use therefore stays
+below live compressed bytes / (1 - COMPACT_DEAD_RATIO), plus the open
+segment. A COMPACT_DEAD_RATIO of None turns compaction off, and the segments
+then only grow.
+
+    NUMGUARD_COLD_STORAGE = {'PATH': BASE_DIR / 'cold_storage', 'AFTER_DAYS': 7,
+                             'PREVIEW_CHARS': 64, 'COMPACT_DEAD_RATIO': 0.5}
+
+Compaction repoints rows and deletes the old file under lock_body_refs(),
+which every statement copying body_ref between tables also takes, so no copy
+can carry a reference to a deleted segment. A body that cannot be read
+raises ColdStorageError rather than coming back empty.
+
+Run a single tier_messages process at a time: segments have one writer.
+"""
+
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Length
+
+from .models import Message, RecoverableMessage
+
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64
+SEGMENT_BYTES = 64 * 1024 * 1024
+CACHE_BLOCKS = 256
+COMPRESSION_LEVEL = 6
+PREVIEW_CHARS = 64
+COMPACT_DEAD_RATIO = 0.5
+# Postgres advisory lock key guarding body_ref rewrites
+BODY_REF_LOCK_KEY = 0x4e47_636f_6c64
+
+BODY_READ_ERRORS = (OSError, ValueError, IndexError, zlib.error)
+
+
+class ColdStorageError(Exception):
+    """A body in cold storage is missing or unreadable."""
+
+
+def lock_body_refs(exclusive=False):
+    """
+    Lock body_ref rewrites until the caller's transaction ends. Statements
+    that copy body_ref between tables take it shared; compaction takes it
+    exclusive while it repoints rows and removes a segment. On Postgres this
+    is an advisory lock. SQLite has one writer at a time, so copies (which
+    are writes) need nothing and compaction just takes the write lock up
+    front. Call inside transaction.atomic().
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            function = 'pg_advisory_xact_lock' if exclusive else 'pg_advisory_xact_lock_shared'
+            cursor.execute(f"SELECT {function}(%s)", [BODY_REF_LOCK_KEY])
+        elif connection.vendor == 'sqlite' and exclusive:
+            cursor.execute(f"UPDATE {connection.ops.quote_name(Message._meta.db_table)} SET id = id WHERE 0")
+
+
+class SegmentStore:
+    """Append-only, block-compressed body store in one directory."""
+
+    def __init__(self, path, segment_bytes=SEGMENT_BYTES, cache_blocks=CACHE_BLOCKS):
+        self.path = str(path)
+        self.segment_bytes = segment_bytes
+        self.cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"{segment:06d}.seg")
+
+    def segments(self):
+        """Return the segment numbers on disk, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self.path) if name.endswith('.seg'))
+
+    def segment_size(self, segment):
+        return os.path.getsize(self._segment_path(segment))
+
+    def remove(self, segment):
+        """Delete a segment file and forget its cached blocks."""
+        with self._lock:
+            os.remove(self._segment_path(segment))
+            for key in [key for key in self._blocks if key[0] == segment]:
+                del self._blocks[key]
+
+    def _current_segment(self):
+        segment = max(self.segments(), default=1)
+        if os.path.exists(self._segment_path(segment)) and os.path.getsize(self._segment_path(segment)) >= self.segment_bytes:
+            segment += 1
+        return segment
+
+    def append(self, bodies):
+        """
+        Write one block and fsync it.
+
+        Returns:
+            list: the body_ref of each body, in order
+        """
+        data = zlib.compress(json.dumps(bodies).encode(), COMPRESSION_LEVEL)
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            segment = self._current_segment()
+            with open(self._segment_path(segment), 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return [f"{segment}:{offset}:{len(data)}:{slot}" for slot in range(len(bodies))]
+
+    def _block(self, segment, offset, length):
+        key = (segment, offset)
+        with self._lock:
+            bodies = self._blocks.get(key)
+            if bodies is not None:
+                self._blocks.move_to_end(key)
+                return bodies
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            bodies = json.loads(zlib.decompress(f.read(length)))
+        with self._lock:
+            self._blocks[key] = bodies
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return bodies
+
+    def read(self, body_ref):
+        """Return one body; raises ColdStorageError if it cannot be read."""
+        try:
+            segment, offset, length, slot = map(int, body_ref.split(':'))
+            return self._block(segment, offset, length)[slot]
+        except BODY_READ_ERRORS as e:
+            logger.error("Cannot read cold message body %s: %s", body_ref, e)
+            raise ColdStorageError(f"Cannot read cold message body {body_ref}") from e
+
+    def read_many(self, body_refs):
+        """Return {body_ref: body}, decompressing each block once."""
+        return {body_ref: self.read(body_ref) for body_ref in set(body_refs)}
+
+    def clear_cache(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+def cold_storage_config():
+    config = getattr(settings, 'NUMGUARD_COLD_STORAGE', {})
+    return {
+        'PATH': config.get('PATH', settings.BASE_DIR / 'cold_storage'),
+        'AFTER_DAYS': config.get('AFTER_DAYS', 7),
+        'BLOCK_SIZE': config.get('BLOCK_SIZE', BLOCK_SIZE),
+        'PREVIEW_CHARS': config.get('PREVIEW_CHARS', PREVIEW_CHARS),
+        'COMPACT_DEAD_RATIO': config.get('COMPACT_DEAD_RATIO', COMPACT_DEAD_RATIO),
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cold_store():
+    """Return the process-wide store at NUMGUARD_COLD_STORAGE['PATH']."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SegmentStore(cold_storage_config()['PATH'])
+    return _store
+
+
+def rehydrate(rows):
+    """Fill in message_body of row dicts that point into cold storage."""
+    cold = [row for row in rows if row.get('body_ref')]
+    if cold:
+        bodies = get_cold_store().read_many(row['body_ref'] for row in cold)
+        for row in cold:
+            row['message_body'] = bodies[row['body_ref']]
+    return rows
+
+
+def full_body(message):
+    """Return the whole body of a Message or RecoverableMessage."""
+    if not message.body_ref:
+        return message.message_body
+    try:
+        return get_cold_store().read(message.body_ref)
+    except ColdStorageError:
+        # Compaction may have moved the body since the row was loaded
+        body_ref = type(message).objects.filter(pk=message.pk).values_list('body_ref', flat=True).first()
+        if not body_ref or body_ref == message.body_ref:
+            raise
+        return get_cold_store().read(body_ref)
+
+
+def tier_messages(store, before, batch_size=1000, block_size=BLOCK_SIZE, preview_chars=PREVIEW_CHARS):
+    """
+    Move the bodies of up to `batch_size` messages received before `before`
+    into `store`, keeping a `preview_chars` preview in the row.
+
+    Returns:
+        tuple: (messages moved, body bytes, compressed bytes written)
+    """
+    rows = list(
+        Message.objects.alias(body_length=Length('message_body'))
+        .filter(received_at__lt=before, body_ref__isnull=True, body_length__gt=preview_chars)
+        .order_by('received_at', 'id')
+        .values_list('id', 'virtual_number_id', 'message_body')[:batch_size]
+    )
+    if not rows:
+        return 0, 0, 0
+    # Keep each inbox's history together in as few blocks as possible
+    rows.sort(key=lambda row: (row[1], row[0]))
+
+    moved = []
+    raw_bytes = stored_bytes = 0
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        refs = store.append([body for _, _, body in block])
+        stored_bytes += int(refs[0].split(':')[2])
+        raw_bytes += sum(len(body.encode()) for _, _, body in block)
+        moved += [
+            Message(id=message_id, body_ref=ref, message_body=body[:preview_chars])
+            for (message_id, _, body), ref in zip(block, refs)
+        ]
+
+    # Blocks are on disk before any row points at them
+    Message.objects.bulk_update(moved, ['body_ref', 'message_body'], batch_size=500)
+    return len(moved), raw_bytes, stored_bytes
+
+
+def compact_segments(store, min_dead_ratio=COMPACT_DEAD_RATIO, block_size=BLOCK_SIZE):
+    """
+    Rewrite sealed segments that are at least `min_dead_ratio` dead.
+
+    Live bodies are appended to the open segment and every Message and
+    RecoverableMessage row is pointed at its copy. The repoint and the check
+    that no row still refers to the segment run under lock_body_refs, so a
+    copy made before the repoint keeps the segment for the next run, and a
+    copy made after it sees the new refs. The file is deleted once that
+    transaction commits; deleting it earlier would lose bodies if the commit
+    failed.
+
+    Returns:
+        tuple: (segments removed, bytes reclaimed)
+    """
+    removed = reclaimed = 0
+    # The newest segment is still being appended to
+    for segment in store.segments()[:-1]:
+        prefix = f"{segment}:"
+        live = {
+            model: list(model.objects.filter(body_ref__startswith=prefix).order_by('id').values_list('id', 'body_ref'))
+            for model in (Message, RecoverableMessage)
+        }
+        refs = {ref for rows in live.values() for _, ref in rows}
+        size = store.segment_size(segment)
+        # A block is live if any row still points into it
+        live_bytes = sum({tuple(ref.split(':')[1:3]): int(ref.split(':')[2]) for ref in refs}.values())
+        if size and 1 - live_bytes / size < min_dead_ratio:
+            continue
+
+        ordered = sorted(refs, key=lambda ref: tuple(map(int, ref.split(':'))))
+        try:
+            bodies = {ref: store.read(ref) for ref in ordered}
+        except ColdStorageError:
+            # Never drop a segment whose bodies could not all be copied
+            logger.error("Cannot compact cold segment %s", segment)
+            continue
+        moved = {}
+        for start in range(0, len(ordered), block_size):
+            block = ordered[start:start + block_size]
+            moved.update(zip(block, store.append([bodies[ref] for ref in block])))
+        with transaction.atomic():
+            lock_body_refs(exclusive=True)
+            for model, rows in live.items():
+                model.objects.bulk_update(
+                    [model(id=row_id, body_ref=moved[ref]) for row_id, ref in rows], ['body_ref'], batch_size=500
+                )
+            if any(model.objects.filter(body_ref__startswith=prefix).exists() for model in live):
+                logger.info("Cold segment %s gained references while compacting; keeping it", segment)
+                continue
+            transaction.on_commit(lambda segment=segment: store.remove(segment))
+        removed += 1
+        reclaimed += size
+    return removed, reclaimed
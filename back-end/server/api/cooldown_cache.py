@@ -0,0 +1,182 @@
+"""
+Cache of CategoryCooldown timestamps.
+
+Cooldown checks run on every create, restore and dashboard poll, but the
+underlying rows only change when a number is deleted or recovered. This
+cache answers those checks from memory, along with the rendered
+check_category_cooldowns payload, and is invalidated by
+CategoryCooldown.mark_deletion / mark_recovery.
+
+By default entries live in a process-local dict with a short TTL; the TTL
+bounds how long another worker can serve a stale entry after a mark it did
+not see. Setting NUMGUARD_COOLDOWN_CACHE['BACKEND'] to 'django' stores
+entries in a Django cache alias instead, so every worker shares them and
+invalidation is immediate everywhere:
+
+    NUMGUARD_COOLDOWN_CACHE = {'BACKEND': 'django', 'ALIAS': 'default', 'TTL': 60}
+
+A reload can race an invalidation: a reader that queried the table just
+before a mark committed would otherwise write the old timestamps back after
+the mark deleted them, and serve them for a whole TTL. Every invalidation
+bumps a generation counter, and a reload or payload is only stored if the
+generation is unchanged since before it was read. The local backend checks
+the generation and stores under one lock; on the Django backend a narrow
+window remains between the check and the write.
+"""
+
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULT_TTL = 30
+KEY_PREFIX = 'numguard:cooldown:'
+PAYLOAD_KEY = 'numguard:cooldown-status'
+GENERATION_KEY = 'numguard:cooldown-generation'
+# Stored for categories that have no CategoryCooldown row yet
+EMPTY = {'last_deleted_at': None, 'last_recovered_at': None}
+
+
+class LocalBackend:
+    """Thread-safe in-process dict with per-entry expiry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+
+    def generation(self):
+        return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    found[key] = entry[1]
+            return found
+
+    def set_many(self, values, ttl, generation=None):
+        expires = time.monotonic() + ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            for key, value in values.items():
+                self._entries[key] = (expires, value)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class DjangoCacheBackend:
+    """Adapter over a configured Django cache alias."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def generation(self):
+        return self.cache.get(GENERATION_KEY, 0)
+
+    def bump_generation(self):
+        # incr is atomic on the shared backends, but needs an existing key
+        self.cache.add(GENERATION_KEY, 0, timeout=None)
+        try:
+            self.cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.add(GENERATION_KEY, 1, timeout=None)
+
+    def set_many(self, values, ttl, generation=None):
+        if generation is not None and generation != self.generation():
+            return
+        self.cache.set_many(values, timeout=ttl)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+
+class CooldownCache:
+    """Per-category snapshots of last_deleted_at / last_recovered_at."""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def key(category):
+        return f"{KEY_PREFIX}{category}"
+
+    def get_many(self, categories):
+        """
+        Return {category: snapshot} for the given categories. Any miss
+        reloads every category with one query over CategoryCooldown.
+        """
+        keys = {self.key(category): category for category in categories}
+        found = self.backend.get_many(list(keys))
+        result = {keys[key]: value for key, value in found.items()}
+
+        if any(category not in result for category in categories):
+            # Read before the query: a mark landing meanwhile makes the load stale
+            generation = self.backend.generation()
+            loaded = self._load(categories)
+            self.backend.set_many(
+                {self.key(category): value for category, value in loaded.items()}, self.ttl, generation
+            )
+            result.update(loaded)
+        return result
+
+    def _load(self, categories):
+        # The table holds one row per category, so refill all of them at once
+        CategoryCooldown = apps.get_model('api', 'CategoryCooldown')
+        known = [choice for choice, _ in CategoryCooldown.CATEGORY_CHOICES]
+        loaded = {category: dict(EMPTY) for category in [*known, *categories]}
+        rows = CategoryCooldown.objects.values('category', 'last_deleted_at', 'last_recovered_at')
+        for row in rows:
+            loaded[row.pop('category')] = row
+        return loaded
+
+    def get(self, category):
+        return self.get_many([category])[category]
+
+    def generation(self):
+        """Return the invalidation counter; pass it back to set_payload."""
+        return self.backend.generation()
+
+    def invalidate(self, *categories):
+        # Bump first, so loads already in flight are not stored afterwards
+        self.backend.bump_generation()
+        # Any change also invalidates the rendered status payload
+        self.backend.delete_many([self.key(category) for category in categories] + [PAYLOAD_KEY])
+
+    def get_payload(self):
+        """Return the cached check_category_cooldowns payload entry, if any."""
+        return self.backend.get_many([PAYLOAD_KEY]).get(PAYLOAD_KEY)
+
+    def set_payload(self, entry, ttl, generation=None):
+        self.backend.set_many({PAYLOAD_KEY: entry}, min(ttl, self.ttl), generation)
+
+
+def _build_cache():
+    config = getattr(settings, 'NUMGUARD_COOLDOWN_CACHE', {})
+    if config.get('BACKEND', 'local') == 'django':
+        backend = DjangoCacheBackend(config.get('ALIAS', 'default'))
+    else:
+        backend = LocalBackend()
+    return CooldownCache(backend, ttl=config.get('TTL', DEFAULT_TTL))
+
+
+cooldown_cache = _build_cache()
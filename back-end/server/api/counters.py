@@ -0,0 +1,140 @@
+"""
+Denormalized unread message counters.
+
+Every virtual number carries an unread_count column and a single
+UnreadCounter row holds the total across all numbers. Writes that change
+read state adjust both inside their own transaction:
+
+- new messages: the Message post_save handler (api/signals.py) and
+  forward_messages for bulk inserts
+- read_message / delete_message
+- read_messages / delete_messages (bulk, via recount())
+- delete_virtual_number (drops the number's share of the total)
+- restore_messages (adds the restored unread messages back)
+
+Paths that bypass these helpers (admin edits, cascades from deleting a
+physical number, manual SQL) can let the counters drift; reconcile()
+recomputes them from the message table and is exposed as
+`python manage.py reconcile_unread`.
+"""
+
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Message, UnreadCounter, VirtualNumber
+
+
+def adjust_unread(deltas):
+    """
+    Apply {virtual_number_id: delta} to the per-number counters and the
+    global total. Costs at most two UPDATE queries however many numbers are
+    touched. Must run in the same transaction as the write it accounts for.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        (pk, delta), = deltas.items()
+        VirtualNumber.objects.filter(pk=pk).update(unread_count=F('unread_count') + delta)
+    else:
+        VirtualNumber.objects.filter(pk__in=deltas).update(
+            unread_count=F('unread_count') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+    adjust_total(sum(deltas.values()))
+
+
+def adjust_total(delta):
+    """Add `delta` to the global unread total, creating the row on first use."""
+    if not delta:
+        return
+    updated = UnreadCounter.objects.filter(name=UnreadCounter.TOTAL).update(
+        count=F('count') + delta, updated_at=timezone.now()
+    )
+    if not updated:
+        _, created = UnreadCounter.objects.get_or_create(name=UnreadCounter.TOTAL, defaults={'count': delta})
+        if not created:
+            UnreadCounter.objects.filter(name=UnreadCounter.TOTAL).update(count=F('count') + delta)
+
+
+def recount(virtual_number_ids):
+    """
+    Recompute the counters of the given virtual numbers from their messages
+    and shift the global total by the difference. Used after set-based
+    updates and deletes, where the per-number change is not known up front.
+    The rows are locked first, so concurrent adjustments apply on top.
+    """
+    stored = dict(
+        VirtualNumber.objects.select_for_update()
+        .filter(pk__in=set(virtual_number_ids))
+        .values_list('pk', 'unread_count')
+    )
+    if not stored:
+        return
+    actual = dict(
+        Message.objects.filter(virtual_number__in=stored, is_read=False)
+        .values('virtual_number')
+        .annotate(total=Count('id'))
+        .values_list('virtual_number', 'total')
+    )
+    adjust_unread({pk: actual.get(pk, 0) - count for pk, count in stored.items()})
+
+
+def total_unread():
+    """Return the global unread total with a single-row lookup."""
+    total = UnreadCounter.objects.filter(name=UnreadCounter.TOTAL).values_list('count', flat=True).first()
+    return total or 0
+
+
+def unread_count(virtual_number_id):
+    """Return one virtual number's stored unread counter."""
+    count = VirtualNumber.objects.filter(pk=virtual_number_id).values_list('unread_count', flat=True).first()
+    return count or 0
+
+
+def reconcile(fix=True):
+    """
+    Recompute every counter from the message table.
+
+    Args:
+        fix (bool): write the recomputed values back; with False only report
+
+    Returns:
+        dict: {'numbers': [(virtual_number, stored, actual), ...],
+               'total': (stored, actual)} listing only counters that drifted
+    """
+    actual = dict(
+        Message.objects.filter(is_read=False)
+        .values('virtual_number')
+        .annotate(total=Count('id'))
+        .values_list('virtual_number', 'total')
+    )
+    drifted = [
+        (numbers, stored, actual.get(pk, 0))
+        for pk, numbers, stored in VirtualNumber.objects.values_list('pk', 'numbers', 'unread_count')
+        if stored != actual.get(pk, 0)
+    ]
+    stored_total, actual_total = total_unread(), sum(actual.values())
+
+    if fix:
+        if drifted:
+            unread = (
+                Message.objects.filter(virtual_number=OuterRef('pk'), is_read=False)
+                .values('virtual_number')
+                .annotate(total=Count('id'))
+                .values('total')
+            )
+            VirtualNumber.objects.filter(numbers__in=[numbers for numbers, _, _ in drifted]).update(
+                unread_count=Coalesce(Subquery(unread), Value(0))
+            )
+        if stored_total != actual_total:
+            UnreadCounter.objects.update_or_create(name=UnreadCounter.TOTAL, defaults={'count': actual_total})
+
+    return {
+        'numbers': drifted,
+        'total': (stored_total, actual_total) if stored_total != actual_total else None,
+    }
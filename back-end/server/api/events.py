@@ -0,0 +1,153 @@
+"""
+Publish/subscribe layer for server-push delivery.
+
+Writes publish small JSON events (new messages, unread count changes) to a
+broker, and the streaming endpoint relays them to subscribed clients as
+Server-Sent Events. The default InProcessBroker keeps subscribers in memory
+and only reaches clients connected to the same process, which is all a
+single ASGI worker needs and keeps tests free of outside services.
+
+Multi-worker deployments point NUMGUARD_EVENT_BROKER at a dotted path to a
+BaseBroker subclass (for example one backed by Redis pub/sub) that fans
+events out across processes.
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .counters import unread_count
+
+
+class Subscription:
+    """A single subscriber's queue and the filters it was opened with."""
+
+    def __init__(self, loop, category=None, virtual_number=None, max_pending=100):
+        self.loop = loop
+        self.category = category
+        self.virtual_number = virtual_number
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def matches(self, event):
+        if self.category and event.get('category') != self.category:
+            return False
+        if self.virtual_number and event.get('virtual_number') != self.virtual_number:
+            return False
+        return True
+
+    def deliver(self, event):
+        """Queue an event from any thread; slow consumers drop events."""
+        def put():
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+        self.loop.call_soon_threadsafe(put)
+
+    async def get(self, timeout=None):
+        """Wait for the next event, or return None after `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BaseBroker:
+    """Interface every event broker implements."""
+
+    def publish(self, event):
+        """Send an event to every matching subscriber. Safe to call from sync code."""
+        raise NotImplementedError
+
+    def subscribe(self, category=None, virtual_number=None):
+        """Open a Subscription; must be called from the event loop that will read it."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def has_subscribers(self):
+        """Cheap check that lets publishers skip building events nobody reads."""
+        return True
+
+
+class InProcessBroker(BaseBroker):
+    """Broker that delivers events to subscribers inside the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # The server loop closed without the stream unsubscribing
+                self.unsubscribe(subscription)
+
+    def subscribe(self, category=None, virtual_number=None):
+        subscription = Subscription(asyncio.get_running_loop(), category, virtual_number)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker configured by NUMGUARD_EVENT_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NUMGUARD_EVENT_BROKER', 'api.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+#! ==================== EVENT BUILDERS ====================
+
+def publish_message_created(message):
+    """Publish a newly stored message and the new unread count of its number."""
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    from .serializer import MessageSerializer
+
+    virtual_number = message.virtual_number
+    broker.publish({
+        'type': 'message',
+        'category': message.category,
+        'virtual_number': virtual_number.numbers,
+        'message': MessageSerializer(message).data,
+    })
+    publish_unread_count(virtual_number)
+
+
+def publish_unread_count(virtual_number):
+    """Publish the current unread count of a virtual number."""
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    broker.publish({
+        'type': 'unread_count',
+        'category': virtual_number.category,
+        'virtual_number': virtual_number.numbers,
+        'unread_count': unread_count(virtual_number.pk),
+    })
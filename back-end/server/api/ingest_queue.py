@@ -0,0 +1,240 @@
+"""
+Durable local queue for incoming carrier messages.
+
+In queued ingest mode receive_message only validates that the required
+parameters are present, appends the raw message to this journal and answers
+`202 Accepted`. The journal is a separate SQLite file written with the
+stdlib sqlite3 module (WAL, synchronous=FULL), so an acknowledged message
+survives a crash and the webhook never waits on the main database.
+
+`python manage.py drain_ingest_queue` workers claim entries in batches,
+store them through views.forward_messages and record each entry's result.
+Several workers can run at once: a claim is a lease, and entries whose
+worker died are claimed again once the lease expires. Delivery into the
+message table is therefore at-least-once if a worker dies between storing
+a batch and completing it.
+
+A claim is not an attempt. If a batch fails to store, each entry is retried
+on its own; only an entry that still fails by itself has its attempts
+counted, and it waits out its lease before it is claimed again. Errors
+that are not the entry's fault (the database being down or locked) leave
+the batch leased without charging anyone.
+
+Carrier retries are deduplicated by idempotency key: appending a key that
+is already in the journal returns the existing entry instead of queueing
+the message twice. Completed entries are kept for KEEP_DONE_SECONDS so the
+keys stay known for the carrier's retry window.
+
+    NUMGUARD_INGEST_QUEUE = {'ENABLED': True, 'PATH': BASE_DIR / 'ingest_queue.sqlite3'}
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 5
+KEEP_DONE_SECONDS = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_entry (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL,
+    claimed_by TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    done_at REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS ingest_entry_pending_idx ON ingest_entry (done_at, claimed_at, id);
+"""
+
+
+class IngestQueue:
+    """Append-only message journal backed by a local SQLite file."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # fsync on every commit: an acknowledged message must survive power loss
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def append(self, payload, idempotency_key=None):
+        """
+        Durably queue one message.
+
+        Returns:
+            tuple: (entry_id, duplicate) where duplicate is True when the
+            idempotency key was already queued and nothing new was written
+        """
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO ingest_entry (idempotency_key, payload, enqueued_at) VALUES (?, ?, ?)",
+            (idempotency_key, json.dumps(payload), time.time())
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid, False
+        row = conn.execute("SELECT id FROM ingest_entry WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return row[0], True
+
+    def claim(self, limit, worker=None, lease_seconds=LEASE_SECONDS):
+        """
+        Lease up to `limit` pending entries, oldest first.
+
+        Returns:
+            list: (entry_id, payload dict) tuples
+        """
+        conn = self._connection()
+        now = time.time()
+        worker = worker or f"{os.getpid()}:{threading.get_ident()}"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, payload FROM ingest_entry "
+                "WHERE done_at IS NULL AND (claimed_at IS NULL OR claimed_at < ?) "
+                "ORDER BY id LIMIT ?",
+                (now - lease_seconds, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE ingest_entry SET claimed_at = ?, claimed_by = ? WHERE id = ?",
+                [(now, worker, entry_id) for entry_id, _ in rows]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [(entry_id, json.loads(payload)) for entry_id, payload in rows]
+
+    def complete(self, results):
+        """Mark entries done and record their results ({entry_id: result dict})."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE ingest_entry SET done_at = ?, result = ? WHERE id = ?",
+                [(now, json.dumps(result, default=str), entry_id) for entry_id, result in results.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record_failures(self, errors):
+        """
+        Count one failed attempt for each entry ({entry_id: error message}).
+        The entries keep their lease, so they are retried once it expires.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE ingest_entry SET attempts = attempts + 1, result = ? WHERE id = ? AND done_at IS NULL",
+                [(json.dumps({'success': False, 'message': error}), entry_id) for entry_id, error in errors.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def fail_exhausted(self, max_attempts=MAX_ATTEMPTS, lease_seconds=LEASE_SECONDS):
+        """
+        Give up on entries that keep failing, so one bad entry cannot block the
+        queue. Entries still leased to a worker are left alone.
+        """
+        conn = self._connection()
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE ingest_entry SET done_at = ?, result = ? "
+            "WHERE done_at IS NULL AND attempts >= ? AND (claimed_at IS NULL OR claimed_at < ?)",
+            (now, json.dumps({'success': False, 'message': "Gave up after repeated failures"}),
+             max_attempts, now - lease_seconds)
+        )
+        return cursor.rowcount
+
+    def purge(self, keep_seconds=KEEP_DONE_SECONDS):
+        """Delete completed entries older than `keep_seconds`."""
+        conn = self._connection()
+        cursor = conn.execute(
+            "DELETE FROM ingest_entry WHERE done_at IS NOT NULL AND done_at < ?", (time.time() - keep_seconds,)
+        )
+        return cursor.rowcount
+
+    def get(self, entry_id):
+        """Return an entry's state and result, or None."""
+        row = self._connection().execute(
+            "SELECT id, idempotency_key, enqueued_at, attempts, done_at, result FROM ingest_entry WHERE id = ?",
+            (entry_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry_id, key, enqueued_at, attempts, done_at, result = row
+        return {
+            'id': entry_id,
+            'idempotency_key': key,
+            'enqueued_at': enqueued_at,
+            'attempts': attempts,
+            'done': done_at is not None,
+            'result': json.loads(result) if result else None,
+        }
+
+    def stats(self):
+        """Return counts of pending and done entries."""
+        pending, done = self._connection().execute(
+            "SELECT COALESCE(SUM(done_at IS NULL), 0), COALESCE(SUM(done_at IS NOT NULL), 0) FROM ingest_entry"
+        ).fetchone()
+        return {'pending': pending, 'done': done}
+
+
+def queue_config():
+    config = getattr(settings, 'NUMGUARD_INGEST_QUEUE', {})
+    return {
+        'ENABLED': config.get('ENABLED', False),
+        'PATH': config.get('PATH', settings.BASE_DIR / 'ingest_queue.sqlite3'),
+    }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue():
+    """Return the process-wide queue at NUMGUARD_INGEST_QUEUE['PATH']."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestQueue(queue_config()['PATH'])
+    return _queue
+
+
+def queued_ingest_enabled():
+    return queue_config()['ENABLED']
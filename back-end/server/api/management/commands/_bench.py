@@ -0,0 +1,43 @@
+"""
+Shared helpers for the bench_* management commands.
+
+Benchmarks run against a throwaway test database (in-memory for SQLite, or
+a temporary file with on_disk=True), so they never touch the data in
+db.sqlite3.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.db import connection
+
+
+@contextlib.contextmanager
+def benchmark_database(on_disk=False):
+    """Create a fresh test database for the duration of the block."""
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    tmpdir = None
+    if on_disk and connection.vendor == 'sqlite':
+        # Commit and fsync costs only show up on a real file
+        tmpdir = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def timed(func, *args, **kwargs):
+    """Run func once and return (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
@@ -0,0 +1,119 @@
+"""
+Benchmark sustained message ingest with concurrent writers.
+
+Each writer thread stores messages through forward_message, the path behind
+receive_message, first with one transaction per message and then through
+the write batcher (api/write_batcher.py). The database is a temporary file
+opened with the connection profile in effect (server/db_profile.py), so
+compare pragmas by setting e.g. NUMGUARD_SQLITE_SYNCHRONOUS=FULL.
+
+--bulk also times forward_messages, the path behind receive_messages_bulk and
+the ingest queue drain, storing batches of the given sizes from one thread.
+
+    python manage.py bench_ingest --writers 1 4 16 --messages 500
+    python manage.py bench_ingest --writers --bulk 100 1000 --messages 10000
+"""
+
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from api import write_batcher
+from api.models import PhysicalNumber, VirtualNumber
+from api.senders import sender_classifier
+from api.views import forward_message, forward_messages
+from ._bench import benchmark_database
+
+
+def run_writers(virtual_numbers, writers, messages):
+    """Start `writers` threads storing `messages` messages each; return elapsed seconds."""
+    barrier = threading.Barrier(writers + 1)
+    failures = []
+
+    def write(index):
+        virtual_number = virtual_numbers[index % len(virtual_numbers)]
+        barrier.wait()
+        try:
+            for i in range(messages):
+                result = forward_message(virtual_number, 'family', f"writer {index} message {i}")
+                if not result['success']:
+                    failures.append(result['message'])
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise RuntimeError(f"{len(failures)} writes failed, first: {failures[0]}")
+    return elapsed
+
+
+def run_bulk(virtual_numbers, batch_size, messages):
+    """Store `messages` messages through forward_messages in batches; return elapsed seconds."""
+    items = [
+        {'virtual_number': virtual_numbers[i % len(virtual_numbers)].numbers, 'sender_name': 'family',
+         'message': f"bulk message {i}"}
+        for i in range(messages)
+    ]
+    started = time.perf_counter()
+    for start in range(0, messages, batch_size):
+        results = forward_messages(items[start:start + batch_size])
+        failed = [result['message'] for result in results if not result['success']]
+        if failed:
+            raise RuntimeError(f"{len(failed)} writes failed, first: {failed[0]}")
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Measure message ingest throughput with and without write batching"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, nargs='*', default=[1, 4, 16])
+        parser.add_argument('--bulk', type=int, nargs='*', default=[], help="Batch sizes for forward_messages")
+        parser.add_argument('--messages', type=int, default=500, help="Messages per writer or bulk run")
+        parser.add_argument('--max-delay-ms', type=float, default=write_batcher.MAX_DELAY_MS)
+
+    def handle(self, *args, **options):
+        with benchmark_database(on_disk=True):
+            physical_numbers = [
+                PhysicalNumber.objects.create(number=f"90000{i:05d}", owner_name=f"bench {i}")
+                for i in range(4)
+            ]
+            virtual_numbers = [
+                VirtualNumber.objects.create(numbers=f"70000{i:05d}", category='personal', physical_number=physical)
+                for i, physical in enumerate(physical_numbers)
+            ]
+            sender_classifier.rules()
+            pragmas = {}
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    for name in ('journal_mode', 'synchronous', 'mmap_size'):
+                        cursor.execute(f"PRAGMA {name}")
+                        pragmas[name] = cursor.fetchone()[0]
+            connection.close()
+            self.stdout.write(f"{connection.vendor} {pragmas}")
+
+            self.stdout.write(f"{'writers':>8} {'mode':>10} {'msgs/s':>10}")
+            for writers in options['writers']:
+                for mode, enabled in (('direct', False), ('batched', True)):
+                    config = {'ENABLED': enabled, 'MAX_DELAY_MS': options['max_delay_ms']}
+                    with override_settings(NUMGUARD_WRITE_BATCHING=config):
+                        write_batcher._batcher = None
+                        elapsed = run_writers(virtual_numbers, writers, options['messages'])
+                    rate = writers * options['messages'] / elapsed
+                    self.stdout.write(f"{writers:>8} {mode:>10} {rate:>10.0f}")
+            write_batcher._batcher = None
+
+            for batch_size in options['bulk']:
+                elapsed = run_bulk(virtual_numbers, batch_size, options['messages'])
+                rate = options['messages'] / elapsed
+                self.stdout.write(f"{1:>8} {f'bulk {batch_size}':>10} {rate:>10.0f}")
@@ -0,0 +1,93 @@
+"""
+Benchmark restoring a deleted virtual number's archived messages.
+
+Compares the previous per-row restore (one Message.objects.create per
+archived message) with the set-based restore_messages used by
+restore_last_deleted_virtual_number.
+
+    python manage.py bench_restore --sizes 1000 10000 100000
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import PhysicalNumber, VirtualNumber, Message, RecoverableVirtualNumber, RecoverableMessage
+from api.views import restore_messages
+from ._bench import benchmark_database, timed
+
+
+def legacy_restore(recoverable_virtual_number, virtual_number):
+    """The restore loop as it was before set-based copying."""
+    recoverable_messages = RecoverableMessage.objects.filter(recoverable_virtual_number=recoverable_virtual_number)
+    count = recoverable_messages.count()
+    for rec_message in recoverable_messages:
+        Message.objects.create(
+            virtual_number=virtual_number,
+            category=rec_message.category,
+            sender=rec_message.sender,
+            message_body=rec_message.message_body,
+            is_read=rec_message.is_read,
+            received_at=rec_message.received_at,
+            created_at=rec_message.created_at
+        )
+    return count
+
+
+class Command(BaseCommand):
+    help = "Compare legacy and set-based restore latency for archived inboxes of several sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--skip-legacy-above', type=int, default=None,
+                            help="Skip the slow legacy run for archives larger than this")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            physical_number = PhysicalNumber.objects.create(number='9000000000', owner_name='bench')
+            self.stdout.write(f"{'messages':>10} {'legacy (s)':>12} {'bulk (s)':>10} {'speedup':>8}")
+            for size in options['sizes']:
+                recoverable = self.make_archive(physical_number, size)
+
+                legacy = None
+                limit = options['skip_legacy_above']
+                if limit is None or size <= limit:
+                    _, legacy = self.run(legacy_restore, recoverable)
+                _, bulk = self.run(restore_messages, recoverable)
+
+                speedup = f"{legacy / bulk:7.1f}x" if legacy else '-'
+                legacy_text = f"{legacy:12.3f}" if legacy else f"{'skipped':>12}"
+                self.stdout.write(f"{size:>10} {legacy_text} {bulk:10.3f} {speedup:>8}")
+                RecoverableVirtualNumber.objects.all().delete()
+
+    def make_archive(self, physical_number, size):
+        recoverable = RecoverableVirtualNumber.objects.create(
+            number='7000000000', category='personal', physical_number=physical_number
+        )
+        now = timezone.now()
+        RecoverableMessage.objects.bulk_create(
+            [
+                RecoverableMessage(
+                    recoverable_virtual_number=recoverable,
+                    category='personal',
+                    sender='family',
+                    message_body=f"benchmark message {i}",
+                    received_at=now,
+                    created_at=now
+                )
+                for i in range(size)
+            ],
+            batch_size=5000
+        )
+        return recoverable
+
+    def run(self, restore, recoverable):
+        """Restore into a fresh virtual number inside one transaction, then clean up."""
+        with transaction.atomic():
+            virtual_number = VirtualNumber.objects.create(
+                numbers=recoverable.number, category=recoverable.category,
+                physical_number=recoverable.physical_number
+            )
+            result = timed(restore, recoverable, virtual_number)
+            virtual_number.delete()
+        return result
@@ -0,0 +1,97 @@
+"""
+Benchmark sender classification over synthetic carrier sender IDs.
+
+Compares the previous exact lookup in the SENDER_CATEGORIES dict with the
+compiled rule engine in api/senders.py. The headline row is the engine
+uncached, so every lookup walks the compiled tables. By default every ID
+in the stream is distinct, so the memoized row shows the cost of cache
+misses too. Pass a small --distinct to see what repeated IDs cost.
+
+    python manage.py bench_senders --count 1000000
+    python manage.py bench_senders --count 1000000 --distinct 5000
+"""
+
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.senders import CompiledRules, load_rules
+from ._bench import benchmark_database
+
+
+# The exact-match map classification used before the rule engine
+LEGACY_SENDER_CATEGORIES = {
+    'shopeasy': 'e-commerce', 'amazon': 'e-commerce', 'flipkart': 'e-commerce', 'ebay': 'e-commerce',
+    'walmart': 'e-commerce', 'insta': 'social-media', 'twitter': 'social-media', 'linkedin': 'social-media',
+    '12': 'personal', 'personal': 'personal', 'family': 'personal', 'friend': 'personal',
+}
+
+HEADERS = [
+    'AMAZON', 'AMZN', 'AMAZONPAY', 'FLPKRT', 'FKART', 'FLIPKART', 'EBAY', 'WLMART', 'SHPESY',
+    'INSTGM', 'TWITTR', 'LNKDIN', 'LINKEDIN', 'FAMILY', 'FRIEND',
+]
+
+
+def synthetic_sender_ids(count, distinct, seed=0):
+    """Carrier-style sender IDs: DLT headers, phone numbers and unknown brands."""
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(distinct):
+        roll = rng.random()
+        if roll < 0.6:
+            header = rng.choice(HEADERS)
+        elif roll < 0.8:
+            header = ''.join(rng.choices(string.ascii_uppercase, k=6))
+        else:
+            pool.append(f"+91{rng.randrange(6000000000, 9999999999)}")
+            continue
+        sender_id = f"{''.join(rng.choices(string.ascii_uppercase, k=2))}-{header}"
+        if rng.random() < 0.3:
+            sender_id += rng.choice(['-S', '-P', '-T', '-G'])
+        pool.append(sender_id)
+    return [rng.choice(pool) for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = "Measure per-message sender classification time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000)
+        parser.add_argument('--distinct', type=int, help="Distinct sender IDs in the stream (default: --count)")
+
+    def handle(self, *args, **options):
+        count = options['count']
+        distinct = options['distinct'] or count
+        sender_ids = synthetic_sender_ids(count, distinct)
+
+        # Rules come from the seeded SenderRule table of a throwaway database
+        with benchmark_database():
+            rules = load_rules()
+        started = time.perf_counter()
+        compiled = CompiledRules(rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Compiled {len(rules)} rules in {compile_ms:.2f}ms; {count} IDs, {distinct} distinct")
+
+        def legacy(sender_id):
+            return LEGACY_SENDER_CATEGORIES.get(sender_id.lower())
+
+        def run(classify):
+            started = time.perf_counter()
+            results = list(map(classify, sender_ids))
+            return results, time.perf_counter() - started
+
+        # Cost of the loop itself, subtracted from every row
+        _, baseline = run(str)
+
+        self.stdout.write(f"{'classifier':<22} {'ns/msg':>8} {'matched':>8}")
+        for name, classify in (
+            ('rules (uncached)', compiled.classify_uncached),
+            ('rules (memoized)', compiled.classify),
+            ('legacy dict', legacy),
+        ):
+            results, elapsed = run(classify)
+            matched = sum(1 for result in results if result is not None)
+            per_message = max(elapsed - baseline, 0) / count * 1e9
+            self.stdout.write(f"{name:<22} {per_message:>8.0f} {matched / count:>8.1%}")
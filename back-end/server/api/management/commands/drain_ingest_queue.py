@@ -0,0 +1,68 @@
+"""
+Store messages queued by receive_message in queued ingest mode.
+
+    python manage.py drain_ingest_queue            # drain until empty, then exit
+    python manage.py drain_ingest_queue --loop     # keep polling, as a worker process
+
+Several workers may run at once; each claims its own batches. A batch that
+fails (the database is down, say) is logged and left leased, and the worker
+backs off before claiming again, doubling the wait up to MAX_BACKOFF seconds.
+Without --loop the command gives up after --max-errors failures in a row.
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.ingest_queue import get_ingest_queue
+from api.views import drain_ingest_queue
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = "Drain the durable ingest queue into the message table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when empty")
+        parser.add_argument('--interval', type=float, default=0.5, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--max-errors', type=int, default=5,
+                            help="Without --loop, stop after this many failed batches in a row")
+
+    def handle(self, *args, **options):
+        queue = get_ingest_queue()
+        total = 0
+        errors = 0
+        try:
+            while True:
+                try:
+                    processed = drain_ingest_queue(queue, options['batch_size'])
+                    if not processed:
+                        # Idle: give up on poison entries and drop old completed ones
+                        queue.fail_exhausted()
+                        queue.purge()
+                except Exception:
+                    errors += 1
+                    logger.exception("Failed to drain an ingest batch (%d in a row)", errors)
+                    if not options['loop'] and errors >= options['max_errors']:
+                        break
+                    close_old_connections()
+                    time.sleep(min(options['interval'] * 2 ** errors, MAX_BACKOFF))
+                    continue
+                errors = 0
+                total += processed
+                if processed:
+                    continue
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Processed {total} queued message(s); {queue.stats()['pending']} pending")
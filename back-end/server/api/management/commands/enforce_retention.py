@@ -0,0 +1,86 @@
+"""
+Prune rows past their retention period (see api/retention.py), then refresh
+the planner statistics.
+
+    python manage.py enforce_retention                     # prune once, then ANALYZE
+    python manage.py enforce_retention --archive           # keep gzipped NDJSON copies
+    python manage.py enforce_retention --loop --interval 3600
+    python manage.py enforce_retention --vacuum            # also shrink the file, off-peak
+
+VACUUM locks the whole database while it rewrites it, so it is opt-in.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.retention import DEFAULT_BATCH_SIZE, NDJSONArchive, compact, prune, retention_config
+
+
+class Command(BaseCommand):
+    help = "Delete rows older than their retention period in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rows deleted per transaction")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between batches")
+        parser.add_argument('--archive', action='store_true', help="Write deleted rows to gzipped NDJSON files")
+        parser.add_argument('--archive-dir', help="Overrides NUMGUARD_RETENTION['ARCHIVE_DIR']")
+        parser.add_argument('--policy', action='append', help="Only run the named policy (repeatable)")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM after pruning too; locks the database while it runs")
+        parser.add_argument('--loop', action='store_true', help="Keep running instead of exiting when done")
+        parser.add_argument('--interval', type=float, default=3600, help="Seconds to sleep between runs")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.run_once(options)
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def run_once(self, options):
+        config = retention_config()
+        policies = [
+            policy for policy in config['policies']
+            if not options['policy'] or policy.name in options['policy']
+        ]
+        now = timezone.now()
+        pruned_tables = []
+        for policy in policies:
+            archive = None
+            if options['archive']:
+                archive = NDJSONArchive(options['archive_dir'] or config['ARCHIVE_DIR'], policy.name, now)
+
+            started = time.perf_counter()
+
+            def progress(deleted):
+                if options['verbosity'] > 1:
+                    rate = deleted / max(time.perf_counter() - started, 1e-6)
+                    self.stdout.write(f"  {policy.name}: {deleted} rows ({rate:.0f} rows/s)")
+
+            try:
+                deleted = prune(policy, options['batch_size'], archive=archive, pause=options['pause'], now=now, progress=progress)
+            finally:
+                if archive:
+                    archive.close()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{policy.name}: deleted {deleted} rows older than {policy.days} days "
+                f"in {elapsed:.2f}s ({deleted / max(elapsed, 1e-6):.0f} rows/s)"
+            )
+            if deleted:
+                pruned_tables.append(policy.table)
+                if archive:
+                    self.stdout.write(f"  archived to {archive.path}")
+
+        if pruned_tables:
+            started = time.perf_counter()
+            compact(pruned_tables, vacuum=options['vacuum'])
+            action = "VACUUM and ANALYZE" if options['vacuum'] else "ANALYZE"
+            self.stdout.write(f"{action} took {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,34 @@
+"""
+Report the size and occupancy of each geo code's virtual number space.
+
+    python manage.py number_capacity
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import Length
+
+from api.models import NumberPool, VirtualNumber
+from api.numbering import GEO_CODE_LENGTHS, capacity, collision_probability
+
+
+class Command(BaseCommand):
+    help = "Show exact capacity, occupancy and random-draw collision rate per geo code"
+
+    def handle(self, *args, **options):
+        # Geo codes have distinct lengths, so a number's length identifies its geo code
+        occupied_by_length = dict(
+            VirtualNumber.objects.annotate(length=Length('numbers'))
+            .values('length')
+            .annotate(total=Count('id'))
+            .values_list('length', 'total')
+        )
+        allocated = dict(NumberPool.objects.values_list('geo_code', 'next_index'))
+
+        self.stdout.write(f"{'geo':<4} {'digits':>6} {'capacity':>10} {'in use':>8} {'allocated':>10} {'collision':>10}")
+        for geo_code, length in GEO_CODE_LENGTHS.items():
+            occupied = occupied_by_length.get(length, 0)
+            self.stdout.write(
+                f"{geo_code:<4} {length:>6} {capacity(geo_code):>10} {occupied:>8} "
+                f"{allocated.get(geo_code, 0):>10} {collision_probability(geo_code, occupied):>10.4%}"
+            )
@@ -0,0 +1,37 @@
+"""
+Recompute the denormalized unread counters from the message table.
+
+    python manage.py reconcile_unread           # repair drift
+    python manage.py reconcile_unread --check   # report only, exit 1 on drift
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Repair drift between unread counters and the messages they count"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift, do not fix it")
+
+    def handle(self, *args, **options):
+        fix = not options['check']
+        with transaction.atomic():
+            report = reconcile(fix=fix)
+
+        for numbers, stored, actual in report['numbers']:
+            self.stdout.write(f"{numbers}: stored {stored}, actual {actual}")
+        if report['total']:
+            stored, actual = report['total']
+            self.stdout.write(f"total: stored {stored}, actual {actual}")
+
+        drifted = len(report['numbers']) + bool(report['total'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Unread counters are in sync"))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {drifted} counter(s)"))
+        else:
+            raise CommandError(f"{drifted} counter(s) drifted")
@@ -0,0 +1,42 @@
+"""
+Remove expired recovery stack entries and their archived messages.
+
+delete_virtual_number and restore only mark entries as expired; this
+sweeper does the cascading deletes off the request path.
+
+    python manage.py sweep_recoverable           # sweep once, then exit
+    python manage.py sweep_recoverable --loop    # keep sweeping, as a worker process
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.models import RecoverableVirtualNumber
+
+
+class Command(BaseCommand):
+    help = "Delete expired recoverable virtual numbers in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Entries deleted per transaction")
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping instead of exiting when done")
+        parser.add_argument('--interval', type=float, default=60, help="Seconds to sleep between sweeps")
+
+    def handle(self, *args, **options):
+        entries = messages = 0
+        try:
+            while True:
+                swept, swept_messages = RecoverableVirtualNumber.sweep_expired(options['batch_size'])
+                entries += swept
+                messages += swept_messages
+                if swept:
+                    continue
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Swept {entries} expired entries and {messages} archived messages")
@@ -0,0 +1,65 @@
+"""
+Move old message bodies into the cold segment store (see api/cold_storage.py).
+
+    python manage.py tier_messages                  # tier everything older than AFTER_DAYS
+    python manage.py tier_messages --days 1 --loop  # keep tiering, as a worker process
+    python manage.py tier_messages --no-compact     # leave mostly dead segments in place
+
+Each run ends by compacting sealed segments past COMPACT_DEAD_RATIO.
+"""
+
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.cold_storage import cold_storage_config, compact_segments, get_cold_store, tier_messages
+
+
+class Command(BaseCommand):
+    help = "Move message bodies older than the retention threshold to cold storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help="Overrides NUMGUARD_COLD_STORAGE['AFTER_DAYS']")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Messages moved per database update")
+        parser.add_argument('--loop', action='store_true', help="Keep tiering instead of exiting when done")
+        parser.add_argument('--interval', type=float, default=3600, help="Seconds to sleep between runs")
+        parser.add_argument('--no-compact', action='store_true', help="Do not rewrite mostly dead segments")
+
+    def handle(self, *args, **options):
+        config = cold_storage_config()
+        days = options['days'] if options['days'] is not None else config['AFTER_DAYS']
+        store = get_cold_store()
+        try:
+            while True:
+                self.run_once(store, days, options['batch_size'], config)
+                if config['COMPACT_DEAD_RATIO'] is not None and not options['no_compact']:
+                    removed, reclaimed = compact_segments(store, config['COMPACT_DEAD_RATIO'], config['BLOCK_SIZE'])
+                    if removed:
+                        self.stdout.write(f"Compacted {removed} segment(s), reclaiming {reclaimed} bytes")
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def run_once(self, store, days, batch_size, config):
+        before = timezone.now() - datetime.timedelta(days=days)
+        started = time.perf_counter()
+        moved = raw_bytes = stored_bytes = 0
+        while True:
+            count, raw, stored = tier_messages(store, before, batch_size, config['BLOCK_SIZE'], config['PREVIEW_CHARS'])
+            moved += count
+            raw_bytes += raw
+            stored_bytes += stored
+            if count < batch_size:
+                break
+        elapsed = time.perf_counter() - started
+        ratio = raw_bytes / stored_bytes if stored_bytes else 0
+        self.stdout.write(
+            f"Moved {moved} message bodies ({raw_bytes} bytes, {stored_bytes} compressed, {ratio:.1f}x) "
+            f"in {elapsed:.2f}s ({moved / max(elapsed, 1e-6):.0f} rows/s)"
+        )
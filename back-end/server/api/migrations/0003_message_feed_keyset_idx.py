@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_categorycooldown'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['virtual_number', 'received_at', 'id'], name='message_feed_keyset_idx'),
+        ),
+    ]
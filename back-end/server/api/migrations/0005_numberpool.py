@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_resourceversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geo_code', models.CharField(max_length=2, unique=True)),
+                ('next_index', models.BigIntegerField(default=0)),
+                ('stride', models.BigIntegerField()),
+                ('offset', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FreeNumber',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geo_code', models.CharField(max_length=2)),
+                ('number', models.CharField(max_length=13, unique=True)),
+                ('released_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['geo_code', 'released_at'], name='free_number_idx')],
+            },
+        ),
+    ]
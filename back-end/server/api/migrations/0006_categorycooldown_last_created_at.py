@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_numberpool'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorycooldown',
+            name='last_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counters(apps, schema_editor):
+    VirtualNumber = apps.get_model('api', 'VirtualNumber')
+    Message = apps.get_model('api', 'Message')
+    UnreadCounter = apps.get_model('api', 'UnreadCounter')
+    unread = (
+        Message.objects.filter(virtual_number=OuterRef('pk'), is_read=False)
+        .values('virtual_number')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    VirtualNumber.objects.update(unread_count=Coalesce(Subquery(unread), Value(0)))
+    UnreadCounter.objects.create(name='total', count=Message.objects.filter(is_read=False).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_categorycooldown_last_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='virtualnumber',
+            name='unread_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+# The former hard-coded SENDER_CATEGORIES map, plus common DLT header spellings
+SEED_RULES = [
+    ('exact', 'shopeasy', 'e-commerce', ''),
+    ('exact', 'amazon', 'e-commerce', ''),
+    ('exact', 'flipkart', 'e-commerce', ''),
+    ('exact', 'ebay', 'e-commerce', ''),
+    ('exact', 'walmart', 'e-commerce', ''),
+    ('exact', 'insta', 'social-media', ''),
+    ('exact', 'twitter', 'social-media', ''),
+    ('exact', 'linkedin', 'social-media', ''),
+    ('exact', '12', 'personal', ''),
+    ('exact', 'personal', 'personal', ''),
+    ('exact', 'family', 'personal', ''),
+    ('exact', 'friend', 'personal', ''),
+    ('alias', 'amazn', '', 'amazon'),
+    ('alias', 'amzn', '', 'amazon'),
+    ('alias', 'amzin', '', 'amazon'),
+    ('alias', 'flpkrt', '', 'flipkart'),
+    ('alias', 'fkart', '', 'flipkart'),
+    ('alias', 'flipkt', '', 'flipkart'),
+    ('alias', 'wlmart', '', 'walmart'),
+    ('alias', 'shpesy', '', 'shopeasy'),
+    ('alias', 'instgm', '', 'insta'),
+    ('alias', 'instagram', '', 'insta'),
+    ('alias', 'twittr', '', 'twitter'),
+    ('alias', 'lnkdin', '', 'linkedin'),
+    ('alias', 'linkdn', '', 'linkedin'),
+    ('prefix', 'amazon', 'e-commerce', ''),
+    ('prefix', 'flipkart', 'e-commerce', ''),
+    ('prefix', 'ebay', 'e-commerce', ''),
+    ('prefix', 'walmart', 'e-commerce', ''),
+    ('prefix', 'insta', 'social-media', ''),
+    ('prefix', 'twitter', 'social-media', ''),
+    ('prefix', 'linkedin', 'social-media', ''),
+    # Person-to-person messages arrive from a phone number
+    ('regex', r'\+?\d{6,15}', 'personal', ''),
+]
+
+
+def seed_sender_rules(apps, schema_editor):
+    SenderRule = apps.get_model('api', 'SenderRule')
+    SenderRule.objects.bulk_create([
+        SenderRule(kind=kind, pattern=pattern, category=category, target=target)
+        for kind, pattern, category, target in SEED_RULES
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_unread_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SenderRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('exact', 'Exact'), ('prefix', 'Prefix'), ('suffix', 'Suffix'), ('regex', 'Regex'), ('alias', 'Alias')], max_length=10)),
+                ('pattern', models.CharField(max_length=200)),
+                ('category', models.CharField(blank=True, choices=[('social-media', 'Social Media'), ('e-commerce', 'E-commerce'), ('personal', 'Personal')], max_length=20)),
+                ('target', models.CharField(blank=True, max_length=100)),
+                ('priority', models.IntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['kind', 'priority', 'id'],
+            },
+        ),
+        migrations.RunPython(seed_sender_rules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_senderrule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deletedvirtualnumber',
+            index=models.Index(fields=['number'], name='deleted_virtual_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['category', 'received_at'], name='message_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['received_at'], name='message_received_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['virtual_number'], name='message_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='virtualnumber',
+            index=models.Index(fields=['category'], name='virtual_number_category_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_ownership(apps, schema_editor):
+    """
+    Rebuild intervals from the existing tables. Deletion records only know
+    when a number was deleted, so each deleted interval starts at the
+    previous deletion of the same number or, failing that, when the
+    physical number was registered.
+    """
+    NumberOwnership = apps.get_model('api', 'NumberOwnership')
+    VirtualNumber = apps.get_model('api', 'VirtualNumber')
+    DeletedVirtualNumber = apps.get_model('api', 'DeletedVirtualNumber')
+    RecoverableVirtualNumber = apps.get_model('api', 'RecoverableVirtualNumber')
+
+    recoverable = set(RecoverableVirtualNumber.objects.values_list('number', flat=True))
+    active = {vn.numbers: vn for vn in VirtualNumber.objects.all()}
+    rows = []
+    previous_end = {}
+    deletions = list(DeletedVirtualNumber.objects.select_related('physical_number').order_by('number', 'deleted_at'))
+    last_deletion = {}
+    for deleted in deletions:
+        last_deletion[deleted.number] = deleted
+    for deleted in deletions:
+        start = previous_end.get(deleted.number, deleted.physical_number.created_at)
+        is_last = last_deletion[deleted.number].pk == deleted.pk
+        rows.append(NumberOwnership(
+            number=deleted.number,
+            category=deleted.category,
+            physical_number_id=deleted.physical_number_id,
+            status='recoverable' if is_last and deleted.number in recoverable and deleted.number not in active else 'deleted',
+            valid_from=min(start, deleted.deleted_at),
+            valid_to=deleted.deleted_at
+        ))
+        previous_end[deleted.number] = deleted.deleted_at
+    for number, virtual_number in active.items():
+        rows.append(NumberOwnership(
+            number=number,
+            category=virtual_number.category,
+            physical_number_id=virtual_number.physical_number_id,
+            status='active',
+            valid_from=max(virtual_number.created_at, previous_end.get(number, virtual_number.created_at))
+        ))
+    NumberOwnership.objects.bulk_create(rows, batch_size=1000)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberOwnership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=13)),
+                ('category', models.CharField(choices=[('social-media', 'Social Media'), ('e-commerce', 'E-commerce'), ('personal', 'Personal')], max_length=20)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('recoverable', 'Recoverable'), ('deleted', 'Deleted')], default='active', max_length=12)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('physical_number', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_ownerships', to='api.physicalnumber')),
+            ],
+            options={
+                'ordering': ['-valid_from'],
+                'indexes': [models.Index(fields=['number', 'valid_from'], name='number_ownership_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('valid_to__isnull', True)), fields=('number',), name='one_open_ownership_per_number')],
+            },
+        ),
+        migrations.RunPython(backfill_ownership, migrations.RunPython.noop),
+    ]
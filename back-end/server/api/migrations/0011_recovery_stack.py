@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:41
+
+import datetime
+
+import api.models
+from django.db import migrations, models
+from django.db.models import F
+
+
+def expire_from_deletion_time(apps, schema_editor):
+    # Existing entries get the same TTL as new ones, counted from their deletion
+    RecoverableVirtualNumber = apps.get_model('api', 'RecoverableVirtualNumber')
+    RecoverableVirtualNumber.objects.update(expires_at=F('deleted_at') + datetime.timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_numberownership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recoverablevirtualnumber',
+            name='expires_at',
+            field=models.DateTimeField(default=api.models.recovery_expiry),
+        ),
+        migrations.RunPython(expire_from_deletion_time, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recoverablevirtualnumber',
+            index=models.Index(fields=['physical_number', 'deleted_at'], name='recovery_stack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recoverablevirtualnumber',
+            index=models.Index(fields=['expires_at'], name='recovery_expiry_idx'),
+        ),
+    ]
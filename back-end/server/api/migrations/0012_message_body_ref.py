@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_recovery_stack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='body_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='recoverablemessage',
+            name='body_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
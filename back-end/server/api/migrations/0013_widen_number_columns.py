@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_message_body_ref'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletedvirtualnumber',
+            name='number',
+            field=models.CharField(max_length=13),
+        ),
+        migrations.AlterField(
+            model_name='recoverablevirtualnumber',
+            name='number',
+            field=models.CharField(max_length=13),
+        ),
+        migrations.AlterField(
+            model_name='virtualnumber',
+            name='numbers',
+            field=models.CharField(max_length=13),
+        ),
+    ]
@@ -14,9 +14,17 @@ Key Features:
 - Deletion and recovery tracking
 """
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, Exists, Q
 from django.utils import timezone
 import datetime
+import hashlib
+import json
+import math
+
+from .cooldown_cache import cooldown_cache
+from .senders import regex_rule_error
 
 # Create your models here.
 
@@ -27,6 +35,8 @@ class PhysicalNumber(models.Model):
     Each physical number can have up to 3 virtual numbers associated with it.
     The system tracks the active status and ownership of these numbers.
     """
+    MAX_VIRTUAL_NUMBERS = 3
+
     number = models.CharField(max_length=10, unique=True)
     owner_name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
@@ -38,7 +48,49 @@ class PhysicalNumber(models.Model):
     
     def has_capacity_for_virtual_number(self):
         """Check if the physical number can accept more virtual numbers."""
-        return self.virtual_numbers.count() < 3
+        return self.virtual_numbers.count() < self.MAX_VIRTUAL_NUMBERS
+
+    @classmethod
+    def reserve_for_category(cls, category, attempts=3):
+        """
+        Find and lock an active physical number that has free capacity and no
+        virtual number in the given category yet. Must run inside a transaction.
+
+        The candidate is chosen by a single query (least-loaded first) and
+        locked with select_for_update. The capacity is checked again under
+        the lock, because a concurrent create may have claimed the same row
+        between the search and the lock; in that case the next candidate is tried.
+
+        Returns:
+            PhysicalNumber or None if no physical number has room
+        """
+        for _ in range(attempts):
+            candidates = (
+                cls.objects.filter(is_active=True)
+                .exclude(virtual_numbers__category=category)
+                .annotate(virtual_count=Count('virtual_numbers'))
+                .filter(virtual_count__lt=cls.MAX_VIRTUAL_NUMBERS)
+                .order_by('virtual_count', 'id')
+                .values('pk')[:1]
+            )
+            physical_number = cls.objects.select_for_update().filter(pk__in=candidates).first()
+            if physical_number is None:
+                return None
+            taken = list(physical_number.virtual_numbers.values_list('category', flat=True))
+            if len(taken) < cls.MAX_VIRTUAL_NUMBERS and category not in taken:
+                return physical_number
+        return None
+
+class VirtualNumberQuerySet(models.QuerySet):
+    """Query helpers for listing virtual numbers without per-row lookups."""
+
+    def with_unread_count(self):
+        """
+        Join the physical number so listing N numbers costs a single query.
+        The unread count itself is the denormalized unread_count column.
+        """
+        return self.select_related('physical_number')
+
 
 class VirtualNumber(models.Model):
     """
@@ -57,14 +109,18 @@ class VirtualNumber(models.Model):
         ('e-commerce', 'E-commerce'),
         ('personal', 'Personal')
     ]
-    numbers = models.CharField(max_length=10)
+    numbers = models.CharField(max_length=13)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     physical_number = models.ForeignKey(PhysicalNumber, on_delete=models.CASCADE, related_name='virtual_numbers')
     is_active = models.BooleanField(default=True)
     is_message_active = models.BooleanField(default=True)
     is_call_active = models.BooleanField(default=True)
+    # Maintained by api/counters.py; repaired by `manage.py reconcile_unread`
+    unread_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VirtualNumberQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.numbers}-{self.category}"
@@ -80,6 +136,10 @@ class VirtualNumber(models.Model):
                 name='unique_virtual_number'
             )
         ]
+        indexes = [
+            # Listings and message feeds filter by category
+            models.Index(fields=['category'], name='virtual_number_category_idx')
+        ]
         
     
 class Message(models.Model):
@@ -101,12 +161,37 @@ class Message(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     sender = models.CharField(max_length=100)
     message_body = models.TextField()
+    # Set once the body has moved to cold storage (api/cold_storage.py); message_body is then empty
+    body_ref = models.CharField(max_length=64, null=True, blank=True)
     is_read = models.BooleanField(default=False)
     received_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of an inbox (see api/pagination.py)
+            models.Index(
+                fields=['virtual_number', 'received_at', 'id'],
+                name='message_feed_keyset_idx'
+            ),
+            # Bulk read/delete by category, optionally bounded by time
+            models.Index(
+                fields=['category', 'received_at'],
+                name='message_category_idx'
+            ),
+            # Time-range scans across all inboxes (bulk `before`, retention)
+            models.Index(
+                fields=['received_at'],
+                name='message_received_at_idx'
+            ),
+            # Only unread rows: unread recounts stay proportional to unread mail
+            models.Index(
+                fields=['virtual_number'],
+                condition=Q(is_read=False),
+                name='message_unread_idx'
+            )
+        ]
     
     def __str__(self):
         return f"From {self.sender} to {self.virtual_number.numbers}"
@@ -124,7 +209,7 @@ class DeletedVirtualNumber(models.Model):
         ('e-commerce', 'E-commerce'),
         ('personal', 'Personal')
     ]
-    number = models.CharField(max_length=10)
+    number = models.CharField(max_length=13)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     physical_number = models.ForeignKey(PhysicalNumber, on_delete=models.CASCADE, related_name='deleted_virtual_numbers')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -132,38 +217,121 @@ class DeletedVirtualNumber(models.Model):
 
     class Meta:
         ordering = ['-deleted_at']
+        indexes = [
+            # get_physical_number_by_virtual_number falls back to deleted numbers
+            models.Index(fields=['number'], name='deleted_virtual_number_idx')
+        ]
     
     def __str__(self):
         return f"{self.number}-{self.category}"
 
 
 
+def recovery_expiry():
+    return timezone.now() + RecoverableVirtualNumber.RECOVERY_TTL
+
+
+class RecoverableVirtualNumberQuerySet(models.QuerySet):
+    """Query helpers for the per-physical-number recovery stacks."""
+
+    def live(self):
+        """Entries that can still be restored."""
+        return self.filter(expires_at__gt=timezone.now())
+
+
 class RecoverableVirtualNumber(models.Model):
     """
     Stores recently deleted virtual numbers that can be recovered.
     
-    This model maintains a temporary copy of deleted virtual numbers and their
-    settings, allowing for recovery within the specified cooldown period.
+    Each physical number keeps a stack of its most recently deleted virtual
+    numbers, bounded by RECOVERY_STACK_SIZE. Entries expire after
+    RECOVERY_TTL, when they are restored, or when newer deletions push them
+    off the stack. Expiring only sets expires_at; the archived rows are
+    removed later by `manage.py sweep_recoverable`, so deleting a number
+    never pays for cascading through other numbers' archives.
     """
+    RECOVERY_STACK_SIZE = 3
+    RECOVERY_TTL = datetime.timedelta(days=1)
+
     CATEGORY_CHOICES = [
         ('social-media', 'Social Media'),
         ('e-commerce', 'E-commerce'),
         ('personal', 'Personal')
     ]
-    number = models.CharField(max_length=10)
+    number = models.CharField(max_length=13)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     physical_number = models.ForeignKey(PhysicalNumber, on_delete=models.CASCADE, related_name='recoverable_virtual_numbers')
     is_active = models.BooleanField(default=True)
     is_message_active = models.BooleanField(default=True)
     is_call_active = models.BooleanField(default=True)
     deleted_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=recovery_expiry)
+
+    objects = RecoverableVirtualNumberQuerySet.as_manager()
     
     class Meta:
         ordering = ['-deleted_at']
+        indexes = [
+            # Stack of one physical number, newest first
+            models.Index(fields=['physical_number', 'deleted_at'], name='recovery_stack_idx'),
+            # Sweeper scans for expired entries
+            models.Index(fields=['expires_at'], name='recovery_expiry_idx')
+        ]
     
     def __str__(self):
         return f"{self.number}-{self.category}"
 
+    @classmethod
+    def make_room(cls, physical_number):
+        """
+        Expire the entries of a physical number's stack that a new deletion
+        would push past RECOVERY_STACK_SIZE. Touches at most the stack itself.
+
+        Returns:
+            list: numbers that are no longer recoverable
+        """
+        overflow = dict(
+            cls.objects.live().filter(physical_number=physical_number)
+            .order_by('-deleted_at', '-id')
+            .values_list('id', 'number')[cls.RECOVERY_STACK_SIZE - 1:]
+        )
+        if overflow:
+            cls.objects.filter(id__in=overflow).update(expires_at=timezone.now())
+        return list(overflow.values())
+
+    def claim(self):
+        """
+        Expire this entry for a restore, unless it already expired or another
+        restore claimed it first. The sweeper removes the archive later.
+
+        Returns:
+            bool: True if this caller may restore the entry
+        """
+        now = timezone.now()
+        claimed = RecoverableVirtualNumber.objects.filter(pk=self.pk, expires_at__gt=now).update(expires_at=now)
+        return bool(claimed)
+
+    @classmethod
+    def sweep_expired(cls, batch_size=100):
+        """
+        Delete up to `batch_size` expired entries with their archived
+        messages (one DELETE per table).
+
+        Returns:
+            tuple: (entries deleted, messages deleted)
+        """
+        expired = list(
+            cls.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not expired:
+            return 0, 0
+        with transaction.atomic():
+            messages, _ = RecoverableMessage.objects.filter(recoverable_virtual_number_id__in=expired).delete()
+            _, deleted = cls.objects.filter(id__in=expired).delete()
+        return deleted.get(cls._meta.label, 0), messages
+
 
 class RecoverableMessage(models.Model):
     """
@@ -181,6 +349,7 @@ class RecoverableMessage(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     sender = models.CharField(max_length=100)
     message_body = models.TextField()
+    body_ref = models.CharField(max_length=64, null=True, blank=True)
     is_read = models.BooleanField(default=False)
     received_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField()
@@ -211,6 +380,7 @@ class CategoryCooldown(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, unique=True)
     last_deleted_at = models.DateTimeField(null=True, blank=True)
     last_recovered_at = models.DateTimeField(null=True, blank=True)
+    last_created_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"Cooldown for {self.category}"
@@ -260,19 +430,180 @@ class CategoryCooldown(models.Model):
         
         return False, None
     
+    @classmethod
+    def get_cached(cls, category):
+        """
+        Return an unsaved CategoryCooldown built from the cooldown cache, or
+        None if the category has never been marked. Only use it for checks.
+        """
+        return cls.get_cached_many([category])[category]
+
+    @classmethod
+    def get_cached_many(cls, categories):
+        """Like get_cached, for several categories with at most one query."""
+        snapshots = cooldown_cache.get_many(categories)
+        return {
+            category: cls(category=category, **snapshots[category]) if any(snapshots[category].values()) else None
+            for category in categories
+        }
+
+    @classmethod
+    def status_payload(cls, cooldown_minutes=5):
+        """
+        Return the check_category_cooldowns response for all categories.
+
+        The rendered payload is cached until the next mutation (marks
+        invalidate it) or, while a cooldown is running, until the next second
+        so the remaining-time strings stay accurate.
+
+        Returns:
+            dict: with keys payload, etag and expires_at (the earliest moment a
+            running cooldown ends, or None when every category is idle)
+        """
+        now = timezone.now()
+        entry = cooldown_cache.get_payload()
+        if entry and (entry['valid_until'] is None or entry['valid_until'] > now):
+            return entry
+
+        generation = cooldown_cache.generation()
+        categories = [choice for choice, _ in cls.CATEGORY_CHOICES]
+        payload = {}
+        boundaries = []
+        for category, cooldown in cls.get_cached_many(categories).items():
+            if cooldown is None:
+                payload[category] = {
+                    "in_cooldown": False,
+                    "last_deleted": "Never",
+                    "last_recovered": "Never",
+                    "status": "Available for creation",
+                    "recovery_cooldown": False,
+                    "recovery_remaining_time": None,
+                    "cooldown_ends_at": None,
+                    "recovery_ends_at": None
+                }
+                continue
+
+            in_cooldown, remaining_time = cooldown.is_in_cooldown(cooldown_minutes)
+            in_recovery_cooldown, recovery_remaining_time = cooldown.is_in_recovery_cooldown(cooldown_minutes)
+            cooldown_ends_at = now + remaining_time if in_cooldown else None
+            recovery_ends_at = now + recovery_remaining_time if in_recovery_cooldown else None
+            boundaries += [end for end in (cooldown_ends_at, recovery_ends_at) if end]
+
+            if in_cooldown:
+                remaining_minutes = int(remaining_time.total_seconds() // 60)
+                remaining_seconds = int(remaining_time.total_seconds() % 60)
+                status = f"In cooldown - {remaining_minutes}m {remaining_seconds}s remaining"
+            else:
+                status = "Available for creation"
+
+            payload[category] = {
+                "in_cooldown": in_cooldown,
+                "last_deleted": cooldown.last_deleted_at.strftime("%Y-%m-%d %H:%M:%S") if cooldown.last_deleted_at else "Never",
+                "last_recovered": cooldown.last_recovered_at.strftime("%Y-%m-%d %H:%M:%S") if cooldown.last_recovered_at else "Never",
+                "status": status,
+                "recovery_cooldown": in_recovery_cooldown,
+                "recovery_remaining_time": f"{int(recovery_remaining_time.total_seconds() // 60)}m {int(recovery_remaining_time.total_seconds() % 60)}s" if in_recovery_cooldown else None,
+                "cooldown_ends_at": cooldown_ends_at.isoformat() if cooldown_ends_at else None,
+                "recovery_ends_at": recovery_ends_at.isoformat() if recovery_ends_at else None
+            }
+
+        expires_at = min(boundaries) if boundaries else None
+        if expires_at:
+            # Countdown strings change every second
+            valid_until = min(expires_at, now.replace(microsecond=0) + datetime.timedelta(seconds=1))
+            ttl = max(1, math.ceil((valid_until - now).total_seconds()))
+        else:
+            valid_until = None
+            ttl = cooldown_cache.ttl
+        entry = {
+            'payload': payload,
+            'etag': hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest(),
+            'expires_at': expires_at,
+            'valid_until': valid_until,
+        }
+        cooldown_cache.set_payload(entry, ttl, generation)
+        return entry
+
+    @classmethod
+    def invalidate_cache(cls, category):
+        """Drop the cached snapshot now and again once the transaction commits."""
+        cooldown_cache.invalidate(category)
+        transaction.on_commit(lambda: cooldown_cache.invalidate(category))
+
     @classmethod
     def mark_deletion(cls, category):
         """Record a deletion operation for a category."""
         cooldown, created = cls.objects.get_or_create(category=category)
         cooldown.last_deleted_at = timezone.now()
-        cooldown.save()
+        # Only write our column so concurrent claims on the row are not overwritten
+        cooldown.save(update_fields=['last_deleted_at'])
+        cls.invalidate_cache(category)
     
     @classmethod
     def mark_recovery(cls, category):
         """Record a recovery operation for a category."""
         cooldown, created = cls.objects.get_or_create(category=category)
         cooldown.last_recovered_at = timezone.now()
-        cooldown.save()
+        cooldown.save(update_fields=['last_recovered_at'])
+        cls.invalidate_cache(category)
+
+    @classmethod
+    def claim_creation(cls, category, cooldown_minutes=5):
+        """
+        Atomically check the deletion cooldown and record a creation.
+
+        A single conditional UPDATE sets last_created_at only if the category
+        is outside its deletion cooldown. The check and the mark can't be
+        split by a concurrent deletion, and the row stays locked until the
+        caller's transaction ends. Call inside transaction.atomic().
+
+        Returns:
+            tuple: (bool, str) indicating if creation is allowed and error message if not
+        """
+        now = timezone.now()
+        window_start = now - datetime.timedelta(minutes=cooldown_minutes)
+        cls.objects.get_or_create(category=category)
+        claimed = cls.objects.filter(
+            Q(last_deleted_at__isnull=True) | Q(last_deleted_at__lte=window_start),
+            category=category
+        ).update(last_created_at=now)
+        if claimed:
+            return True, None
+
+        in_cooldown, remaining_time = cls.objects.get(category=category).is_in_cooldown(cooldown_minutes)
+        remaining_minutes = int(remaining_time.total_seconds() // 60) if in_cooldown else 0
+        remaining_seconds = int(remaining_time.total_seconds() % 60) if in_cooldown else 0
+        return False, f"Cannot create a {category} number yet. Please wait {remaining_minutes} min and {remaining_seconds} sec."
+
+    @classmethod
+    def claim_recovery(cls, category, cooldown_minutes=5):
+        """
+        Atomically check the recovery cooldown (across all categories) and
+        record a recovery for `category`. Call inside transaction.atomic().
+
+        Every cooldown row is locked first, in a fixed order, so concurrent
+        recoveries queue up on databases with row locks. The conditional
+        UPDATE then re-checks the window against committed data and is atomic
+        on its own under SQLite's database-level write lock.
+
+        Returns:
+            tuple: (bool, str) indicating if recovery is allowed and error message if not
+        """
+        now = timezone.now()
+        window_start = now - datetime.timedelta(minutes=cooldown_minutes)
+        cls.objects.get_or_create(category=category)
+        list(cls.objects.select_for_update().order_by('category').values_list('id', flat=True))
+        recent = cls.objects.filter(last_recovered_at__gt=window_start)
+        claimed = cls.objects.filter(category=category).exclude(Exists(recent)).update(last_recovered_at=now)
+        if claimed:
+            cls.invalidate_cache(category)
+            return True, None
+
+        latest = recent.order_by('-last_recovered_at').first()
+        in_cooldown, remaining_time = latest.is_in_recovery_cooldown(cooldown_minutes) if latest else (False, None)
+        remaining_minutes = int(remaining_time.total_seconds() // 60) if in_cooldown else 0
+        remaining_seconds = int(remaining_time.total_seconds() % 60) if in_cooldown else 0
+        return False, f"Cannot recover number yet. Please wait {remaining_minutes}m {remaining_seconds}s."
         
     @classmethod
     def check_creation_cooldown(cls, category, cooldown_minutes=5):
@@ -286,17 +617,185 @@ class CategoryCooldown(models.Model):
         Returns:
             tuple: (bool, str) indicating if creation is allowed and error message if not
         """
-        try:
-            cooldown = cls.objects.get(category=category)
-            in_cooldown, remaining_time = cooldown.is_in_cooldown(cooldown_minutes)
-            
-            if in_cooldown:
-                remaining_minutes = int(remaining_time.total_seconds() // 60)
-                remaining_seconds = int(remaining_time.total_seconds() % 60)
-                error_message = f"Cannot create a {category} number yet. Please wait {remaining_minutes} min and {remaining_seconds} sec."
-                return False, error_message
-            
+        cooldown = cls.get_cached(category)
+        if cooldown is None:
             return True, None
-            
-        except cls.DoesNotExist:
-            return True, None
\ No newline at end of file
+
+        in_cooldown, remaining_time = cooldown.is_in_cooldown(cooldown_minutes)
+        if in_cooldown:
+            remaining_minutes = int(remaining_time.total_seconds() // 60)
+            remaining_seconds = int(remaining_time.total_seconds() % 60)
+            error_message = f"Cannot create a {category} number yet. Please wait {remaining_minutes} min and {remaining_seconds} sec."
+            return False, error_message
+        
+        return True, None
+
+
+
+class ResourceVersion(models.Model):
+    """
+    Monotonic version counter for a group of polled resources.
+    
+    Counters are bumped in the same transaction as the write that changes the
+    resource (see api/signals.py), which lets polled endpoints answer
+    conditional GETs by comparing versions instead of re-serializing data.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}@{self.version}"
+
+
+
+class NumberPool(models.Model):
+    """
+    Allocation cursor for one geo code's virtual number space.
+    
+    next_index counts numbers drawn so far, up to the capacity; it is mapped
+    through the permutation (stride * index + offset) mod capacity to pick
+    the next number (see api/numbering.py).
+    """
+    geo_code = models.CharField(max_length=2, unique=True)
+    next_index = models.BigIntegerField(default=0)
+    stride = models.BigIntegerField()
+    offset = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"{self.geo_code}@{self.next_index}"
+
+
+class FreeNumber(models.Model):
+    """
+    A number of a geo code's space that was handed out and later released
+    for good. The allocator reuses these before drawing new ones from the
+    pool, so allocation never scans occupied numbers (see api/numbering.py).
+    """
+    geo_code = models.CharField(max_length=2)
+    # Long enough for the longest geo code (CA, 13 digits)
+    number = models.CharField(max_length=13, unique=True)
+    released_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Oldest released number first, per geo code
+            models.Index(fields=['geo_code', 'released_at'], name='free_number_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.number} ({self.geo_code})"
+
+
+
+class UnreadCounter(models.Model):
+    """
+    Denormalized count of unread messages across all virtual numbers.
+    
+    Updated in the same transaction as every write that changes read state
+    (see api/counters.py), so the notification badge is a single-row lookup
+    instead of a COUNT over the message table.
+    """
+    TOTAL = 'total'
+
+    name = models.CharField(max_length=50, unique=True)
+    count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}={self.count}"
+
+
+
+class SenderRule(models.Model):
+    """
+    One rule of the sender classification engine (see api/senders.py).
+    
+    exact, prefix, suffix and regex rules map a normalized sender ID to a
+    category; alias rules rename a sender ID to a canonical sender, which is
+    then classified by the other rules.
+    """
+    KIND_CHOICES = [
+        ('exact', 'Exact'),
+        ('prefix', 'Prefix'),
+        ('suffix', 'Suffix'),
+        ('regex', 'Regex'),
+        ('alias', 'Alias')
+    ]
+    CATEGORY_CHOICES = [
+        ('social-media', 'Social Media'),
+        ('e-commerce', 'E-commerce'),
+        ('personal', 'Personal')
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    pattern = models.CharField(max_length=200)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, blank=True)
+    # Canonical sender name for alias rules
+    target = models.CharField(max_length=100, blank=True)
+    # Regex rules are tried in ascending priority
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['kind', 'priority', 'id']
+    
+    def __str__(self):
+        return f"{self.kind}:{self.pattern}->{self.target or self.category}"
+
+    def clean(self):
+        if self.kind == 'regex':
+            error = regex_rule_error(self.pattern)
+            if error:
+                raise ValidationError({'pattern': error})
+
+    def save(self, *args, **kwargs):
+        # A bad regex would otherwise only surface when the rules are recompiled
+        if self.kind == 'regex':
+            self.clean()
+        super().save(*args, **kwargs)
+
+
+
+class NumberOwnership(models.Model):
+    """
+    Validity interval during which a physical number held a virtual number.
+    
+    One row is opened when a virtual number is created or restored and
+    closed when it is deleted (see api/signals.py), so every active,
+    recoverable or deleted number can be resolved to its owner, now or at
+    any past time, with one indexed query (see api/ownership.py).
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('recoverable', 'Recoverable'),
+        ('deleted', 'Deleted')
+    ]
+    CATEGORY_CHOICES = [
+        ('social-media', 'Social Media'),
+        ('e-commerce', 'E-commerce'),
+        ('personal', 'Personal')
+    ]
+    number = models.CharField(max_length=13)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    physical_number = models.ForeignKey(PhysicalNumber, on_delete=models.CASCADE, related_name='number_ownerships')
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='active')
+    valid_from = models.DateTimeField()
+    # Null while the number is still held
+    valid_to = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-valid_from']
+        indexes = [
+            models.Index(fields=['number', 'valid_from'], name='number_ownership_idx')
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['number'],
+                condition=Q(valid_to__isnull=True),
+                name='one_open_ownership_per_number'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.number}-{self.status}"
@@ -0,0 +1,242 @@
+"""
+Virtual number generation and allocation.
+
+Virtual numbers are walks over the digit graph G: the first digit is 6-9 and
+each following digit must be one of the previous digit's neighbours. For a
+given length that defines a finite number space, which the allocator hands
+out without collisions:
+
+- path_counts() gives the number of walks per (digit, remaining length). It
+  gives the exact capacity per geo code, lets unrank_number() turn an index
+  in [0, capacity) into the index-th number in walk order, and weights
+  generate_random_number() so it samples uniformly from the valid set.
+- Each geo code has a NumberPool row whose cursor is advanced atomically.
+  The cursor is mapped through a fixed permutation of the index space
+  (stride coprime to the capacity), so consecutive allocations look random
+  and each number is drawn from the pool at most once.
+- Numbers released for good (deleted without a recovery copy, or swept from
+  the recovery stack) go onto a FreeNumber free-list, which the allocator
+  drains before drawing from the pool.
+
+Allocation therefore costs a constant number of queries however full the
+space is, instead of retrying random numbers or walking occupied ones. The
+only numbers ever skipped are ones created before the pool existed, and
+each of those is skipped once.
+"""
+
+import functools
+import math
+import random
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import FreeNumber, NumberPool, VirtualNumber, RecoverableVirtualNumber
+
+
+# Graph representing valid digit connections for number generation
+# Each key represents a digit, and its value array shows which digits can follow it
+G = {
+    0: [4, 6],
+    1: [6, 8],
+    2: [7, 9],
+    3: [4, 8],
+    4: [0, 3, 9],
+    5: [],
+    6: [0, 1, 7],
+    7: [2, 6],
+    8: [1, 3],
+    9: [2, 4],
+}
+
+# Define number lengths for different country codes
+GEO_CODE_LENGTHS = {
+    'IN': 10,  # India: 10 digits
+    'US': 12,  # United States: 12 digits
+    'UK': 9,   # United Kingdom: 9 digits
+    'DE': 11,  # Germany: 11 digits
+    'CA': 13   # Canada: 13 digits
+}
+
+# Digits a virtual number may start with
+START_DIGITS = (6, 7, 8, 9)
+
+_random = random.SystemRandom()
+
+
+@functools.lru_cache(maxsize=None)
+def path_counts(length):
+    """
+    Count graph walks per (remaining length, digit).
+
+    Returns:
+        tuple: counts[r][d] is the number of ways to append r more digits
+        after digit d
+    """
+    counts = [[1] * 10]
+    for _ in range(length - 1):
+        previous = counts[-1]
+        counts.append([sum(previous[nxt] for nxt in G[digit]) for digit in range(10)])
+    return tuple(tuple(row) for row in counts)
+
+
+def capacity(geo_code):
+    """Exact number of distinct virtual numbers available for a geo code."""
+    length = GEO_CODE_LENGTHS[geo_code]
+    counts = path_counts(length)
+    return sum(counts[length - 1][digit] for digit in START_DIGITS)
+
+
+def capacities():
+    """Exact capacity of every configured geo code."""
+    return {geo_code: capacity(geo_code) for geo_code in GEO_CODE_LENGTHS}
+
+
+def collision_probability(geo_code, occupied):
+    """
+    Probability that a uniformly drawn number is already taken when
+    `occupied` numbers of the geo code are in use.
+    """
+    return min(1.0, occupied / capacity(geo_code))
+
+
+def generate_random_number(n=10, start=None):
+    """
+    Draw a number uniformly from all valid walks of length n.
+
+    Each digit is weighted by how many walks continue through it, so every
+    valid number is equally likely. (Picking uniformly among neighbours at
+    each step favours numbers that pass through low-degree digits.)
+
+    Args:
+        n (int): Number of digits
+        start (int): Optional fixed first digit; drawn from START_DIGITS if omitted
+    """
+    counts = path_counts(n)
+    candidates = (start,) if start is not None else START_DIGITS
+    digits = []
+    for remaining in range(n - 1, -1, -1):
+        weights = [counts[remaining][digit] for digit in candidates]
+        if not any(weights):
+            raise ValueError(f"No valid {n}-digit number starts with {start}")
+        digit = _random.choices(candidates, weights=weights)[0]
+        digits.append(str(digit))
+        candidates = G[digit]
+    return ''.join(digits)
+
+
+def unrank_number(geo_code, index):
+    """Return the index-th number (0-based) of the geo code's number space."""
+    length = GEO_CODE_LENGTHS[geo_code]
+    counts = path_counts(length)
+    candidates = START_DIGITS
+    digits = []
+    for remaining in range(length - 1, -1, -1):
+        for digit in candidates:
+            if index < counts[remaining][digit]:
+                break
+            index -= counts[remaining][digit]
+        else:
+            raise IndexError(f"Index out of range for {geo_code}")
+        digits.append(str(digit))
+        candidates = G[digit]
+    return ''.join(digits)
+
+
+def _pick_stride(size):
+    """Pick a stride coprime to `size` that scatters consecutive indices."""
+    stride = max(1, int(size * 0.6180339887)) | 1
+    while math.gcd(stride, size) != 1:
+        stride += 2
+    return stride
+
+
+def get_pool(geo_code):
+    """Return the geo code's NumberPool, creating it with a random permutation."""
+    size = capacity(geo_code)
+    pool, _ = NumberPool.objects.get_or_create(
+        geo_code=geo_code,
+        defaults={'stride': _pick_stride(size), 'offset': random.randrange(size)}
+    )
+    return pool
+
+
+def _reserve_index(geo_code):
+    """
+    Atomically advance the pool cursor.
+
+    Returns:
+        tuple: (pool, reserved index), or (pool, None) once every index
+        of the space has been drawn
+    """
+    size = capacity(geo_code)
+    get_pool(geo_code)
+    with transaction.atomic():
+        advanced = NumberPool.objects.filter(geo_code=geo_code, next_index__lt=size).update(next_index=F('next_index') + 1)
+        pool = NumberPool.objects.get(geo_code=geo_code)
+    return pool, pool.next_index - 1 if advanced else None
+
+
+def geo_code_for(number):
+    """Return the geo code whose number space contains `number`, or None."""
+    for geo_code, length in GEO_CODE_LENGTHS.items():
+        if len(number) == length:
+            digits = [int(digit) for digit in number] if number.isdigit() else []
+            if digits and digits[0] in START_DIGITS and all(b in G[a] for a, b in zip(digits, digits[1:])):
+                return geo_code
+    return None
+
+
+def is_held(number):
+    """Whether an active or recoverable virtual number holds `number` (one query)."""
+    held = VirtualNumber.objects.filter(numbers=number).order_by().values_list('numbers').union(
+        RecoverableVirtualNumber.objects.filter(number=number).order_by().values_list('number')
+    )
+    return bool(held[:1])
+
+
+def release_number(number):
+    """Put a number that nothing holds any more on its geo code's free-list."""
+    geo_code = geo_code_for(number)
+    if geo_code is None or is_held(number):
+        return False
+    _, created = FreeNumber.objects.get_or_create(number=number, defaults={'geo_code': geo_code})
+    return created
+
+
+# Free-list entries tried before falling back to the pool; more only helps
+# when concurrent allocations keep claiming the same entry
+FREE_LIST_ATTEMPTS = 3
+
+
+def allocate_number(geo_code):
+    """
+    Reserve an unused virtual number for a geo code: the oldest released
+    number if there is one, otherwise the next number drawn from the pool.
+
+    Returns:
+        str: the reserved number, or None if every number is in use
+    """
+    for _ in range(FREE_LIST_ATTEMPTS):
+        free = (
+            FreeNumber.objects.filter(geo_code=geo_code)
+            .order_by('released_at', 'id')
+            .values_list('id', 'number')
+            .first()
+        )
+        if free is None:
+            break
+        # Deleting the entry is the claim; a concurrent allocation that lost gets 0
+        claimed, _ = FreeNumber.objects.filter(id=free[0]).delete()
+        if claimed and not is_held(free[1]):
+            return free[1]
+
+    size = capacity(geo_code)
+    while True:
+        pool, index = _reserve_index(geo_code)
+        if index is None:
+            return None
+        number = unrank_number(geo_code, (pool.stride * index + pool.offset) % size)
+        # Only numbers created before the pool existed are held here
+        if not is_held(number):
+            return number
@@ -0,0 +1,113 @@
+"""
+Number ownership lookups.
+
+NumberOwnership keeps one validity interval per period a physical number
+held a virtual number, across active, recoverable and deleted numbers.
+Intervals of one number never overlap, so both "who owns this number" and
+"who owned it at time T" are answered by the newest interval starting at or
+before the given time: a single query on the (number, valid_from) index.
+
+Results go through a small in-process LRU cache. Writes in this process
+invalidate the affected number immediately (api/signals.py); other
+processes see changes once their entry's TTL runs out.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .models import NumberOwnership
+
+
+CACHE_SIZE = 10000
+CACHE_TTL = 30
+# Stored for numbers with no ownership history, so misses are cached too
+MISSING = object()
+
+
+class OwnershipCache:
+    """Thread-safe LRU of {(number, at): NumberOwnership} with per-entry expiry."""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, number):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == number]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ownership_cache = OwnershipCache()
+
+
+def find_owner(number, at=None):
+    """
+    Return the NumberOwnership interval of `number` at time `at` (default:
+    now, falling back to the most recent interval once the number is
+    deleted), with its physical number loaded, or None.
+    """
+    key = (number, at)
+    cached = ownership_cache.get(key)
+    if cached is not None:
+        return None if cached is MISSING else cached
+
+    ownerships = NumberOwnership.objects.select_related('physical_number').filter(number=number)
+    if at is not None:
+        ownerships = ownerships.filter(valid_from__lte=at)
+    ownership = ownerships.order_by('-valid_from').first()
+    if ownership and at is not None and ownership.valid_to and ownership.valid_to <= at:
+        # The number was between owners at that time
+        ownership = None
+
+    ownership_cache.set(key, ownership or MISSING)
+    return ownership
+
+
+def open_ownership(virtual_number):
+    """Start the interval of a newly created or restored virtual number."""
+    NumberOwnership.objects.create(
+        number=virtual_number.numbers,
+        category=virtual_number.category,
+        physical_number_id=virtual_number.physical_number_id,
+        valid_from=virtual_number.created_at or timezone.now()
+    )
+
+
+def close_ownership(virtual_number, recoverable=False):
+    """End the open interval of a deleted virtual number."""
+    NumberOwnership.objects.filter(number=virtual_number.numbers, valid_to__isnull=True).update(
+        valid_to=timezone.now(), status='recoverable' if recoverable else 'deleted'
+    )
+
+
+def expire_recoverable(numbers):
+    """Mark intervals as plain deleted once their number can no longer be restored."""
+    NumberOwnership.objects.filter(number__in=numbers, status='recoverable').update(status='deleted')
@@ -0,0 +1,114 @@
+"""
+Keyset pagination for message feeds.
+
+Messages are ordered by (received_at, id), which matches the composite
+index on Message(virtual_number, received_at, id). A cursor is an opaque,
+URL-safe token that encodes the position of one message in that order, so
+fetching a page only touches the rows on that page no matter how large the
+inbox is.
+
+Polling with ``after`` is keyed on the id alone. received_at is the time the
+carrier saw the message, and a message can commit long after newer ones (the
+ingest queue stores a batch with the carrier's timestamps), so a received_at
+keyset would skip it for good. Ids are assigned in commit order on SQLite,
+whose writers are serialized. Other backends hand out ids when a row is
+inserted, so a transaction can commit a lower id after a poll has moved
+past it. There ``after`` is refused and no latest_cursor is returned, and
+clients page with ``cursor`` instead.
+"""
+
+import base64
+import binascii
+import datetime
+
+from django.db import connections
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor or limit we cannot decode."""
+
+
+def encode_cursor(message):
+    """Encode the (received_at, id) position of a message."""
+    raw = f"{message.received_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    """Decode a cursor back into a (received_at, id) tuple."""
+    try:
+        raw = base64.urlsafe_b64decode(value.encode()).decode()
+        received_at, message_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(received_at), int(message_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {value}")
+
+
+def after_supported(queryset):
+    """Whether ids on the queryset's database follow commit order."""
+    return connections[queryset.db].vendor == 'sqlite'
+
+
+def parse_limit(value):
+    """Parse the page size, clamping it to MAX_PAGE_SIZE."""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidCursor(f"Invalid limit: {value}")
+    if limit < 1:
+        raise InvalidCursor(f"Invalid limit: {value}")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate_messages(queryset, limit, cursor=None, after=None):
+    """
+    Return one page of messages, newest first.
+
+    Args:
+        queryset: Message queryset already filtered to the requested inbox
+        limit (int): Maximum number of messages to return
+        cursor (str): Return messages older than this position
+        after (str): Return only messages stored after this position
+
+    Returns:
+        tuple: (messages, next_cursor, latest_cursor, has_more) where
+        next_cursor pages further back in time and latest_cursor is what a
+        polling client passes as ``after`` on its next request.
+    """
+    # Rows without a received_at have no position in the keyset order
+    queryset = queryset.filter(received_at__isnull=False)
+    pollable = after_supported(queryset)
+
+    if after:
+        if not pollable:
+            raise InvalidCursor("Polling with after is not supported on this database; page with cursor instead")
+        _, message_id = decode_cursor(after)
+        queryset = queryset.filter(id__gt=message_id).order_by('id')
+        page = list(queryset[:limit + 1])
+        has_more = len(page) > limit
+        # Serve the oldest unseen messages first so the client can catch up
+        page = page[:limit][::-1]
+        latest_cursor = encode_cursor(page[0]) if page else after
+        next_cursor = None
+        return page, next_cursor, latest_cursor, has_more
+
+    if cursor:
+        received_at, message_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(received_at__lt=received_at) | Q(received_at=received_at, id__lt=message_id)
+        )
+    queryset = queryset.order_by('-received_at', '-id')
+    page = list(queryset[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_cursor(page[-1]) if has_more else None
+    # The highest id on the page, which is not always the newest message
+    latest_cursor = encode_cursor(max(page, key=lambda message: message.id)) if page and not cursor and pollable else None
+    return page, next_cursor, latest_cursor, has_more
@@ -0,0 +1,145 @@
+"""
+Token-bucket rate limiting for the message ingest path.
+
+Every incoming message takes one token from the bucket of its virtual number
+and one from the bucket of its sender, before any database work happens. A
+flood therefore costs a dict lookup per message and is answered with
+`429 Too Many Requests` and a Retry-After header.
+
+Senders are keyed by their normalized ID (api/senders.normalize), so
+rotating the DLT operator prefix does not buy a fresh bucket.
+
+By default buckets live in process memory. Setting
+NUMGUARD_RATE_LIMIT['BACKEND'] to 'django' keeps them in a Django cache
+alias shared by every worker; updates there are read-modify-write, so
+concurrent workers may let a few extra messages through, which is fine for
+abuse control:
+
+    NUMGUARD_RATE_LIMIT = {'BACKEND': 'django', 'ALIAS': 'default',
+                           'NUMBER': (1, 60), 'SENDER': (5, 200)}
+
+NUMBER and SENDER are (tokens per second, burst size).
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# (tokens per second, burst size)
+DEFAULT_NUMBER_LIMIT = (1, 60)
+DEFAULT_SENDER_LIMIT = (5, 200)
+# Idle buckets are dropped once the local table grows past this many keys
+MAX_LOCAL_BUCKETS = 100000
+KEY_PREFIX = 'numguard:ratelimit:'
+
+
+class LocalBackend:
+    """Buckets in a thread-safe in-process dict: {key: (tokens, updated_at)}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def load(self, keys):
+        return {key: self.buckets[key] for key in keys if key in self.buckets}
+
+    def store(self, values, ttl):
+        self.buckets.update(values)
+        if len(self.buckets) > MAX_LOCAL_BUCKETS:
+            self.prune()
+
+    def prune(self):
+        # A bucket idle long enough to refill is the same as no bucket;
+        # an hour is well past the refill time of any sensible limit
+        now = time.monotonic()
+        self.buckets = {
+            key: (tokens, updated_at) for key, (tokens, updated_at) in self.buckets.items()
+            if now - updated_at < 3600
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class DjangoCacheBackend:
+    """Buckets in a Django cache alias, shared by every worker."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        # Serializes threads of this process; other processes race benignly
+        self.lock = threading.Lock()
+
+    def load(self, keys):
+        return self.cache.get_many(keys)
+
+    def store(self, values, ttl):
+        self.cache.set_many(values, timeout=ttl)
+
+    def clear(self):
+        # Keys cannot be listed portably; they expire once their bucket would be full
+        pass
+
+
+class RateLimiter:
+    """Token buckets per virtual number and per sender."""
+
+    def __init__(self, backend, number_limit=DEFAULT_NUMBER_LIMIT, sender_limit=DEFAULT_SENDER_LIMIT, clock=None):
+        self.backend = backend
+        self.limits = {'number': number_limit, 'sender': sender_limit}
+        # Shared-cache buckets need a clock every worker agrees on
+        self.clock = clock or (time.time if isinstance(backend, DjangoCacheBackend) else time.monotonic)
+
+    def check(self, virtual_number, sender=None):
+        """
+        Take one token from the number's and the sender's bucket.
+
+        Returns:
+            tuple: (allowed, retry_after seconds). Nothing is taken when either
+            bucket is empty, so a rejected message does not drain the other.
+        """
+        keys = {f"{KEY_PREFIX}number:{virtual_number}": self.limits['number']}
+        if sender:
+            keys[f"{KEY_PREFIX}sender:{sender}"] = self.limits['sender']
+
+        with self.backend.lock:
+            now = self.clock()
+            stored = self.backend.load(list(keys))
+            updated = {}
+            retry_after = 0
+            for key, (rate, burst) in keys.items():
+                tokens, updated_at = stored.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / rate)
+                updated[key] = (tokens, now)
+            if retry_after:
+                return False, retry_after
+            self.backend.store(
+                {key: (tokens - 1, now) for key, (tokens, now) in updated.items()},
+                ttl=max(math.ceil(burst / rate) for rate, burst in keys.values())
+            )
+        return True, 0
+
+    def reset(self):
+        self.backend.clear()
+
+
+def _build_limiter():
+    config = getattr(settings, 'NUMGUARD_RATE_LIMIT', {})
+    if config.get('BACKEND', 'local') == 'django':
+        backend = DjangoCacheBackend(config.get('ALIAS', 'default'))
+    else:
+        backend = LocalBackend()
+    return RateLimiter(
+        backend,
+        number_limit=tuple(config.get('NUMBER', DEFAULT_NUMBER_LIMIT)),
+        sender_limit=tuple(config.get('SENDER', DEFAULT_SENDER_LIMIT)),
+    )
+
+
+rate_limiter = _build_limiter()
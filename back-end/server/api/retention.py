@@ -0,0 +1,174 @@
+"""
+Retention policies for tables that only ever grow.
+
+Each policy names a model, the column its age is measured on and how many
+days rows are kept. `python manage.py enforce_retention` deletes rows past
+their age in small batches, one short transaction per batch, so request
+writers are never locked out for long. Batches can be written to gzipped
+NDJSON files first, one JSON object per row.
+
+Days are configured per policy; None turns a policy off. Pruning user
+messages is off unless a deployment opts in:
+
+    NUMGUARD_RETENTION = {
+        'deleted_numbers': 90,       # DeletedVirtualNumber, by deleted_at
+        'recoverable_messages': 0,   # archives of expired recovery stack entries
+        'recoverable_numbers': 0,    # the expired entries themselves
+        'read_messages': None,       # read Message rows, by received_at; e.g. 30
+        'ARCHIVE_DIR': BASE_DIR / 'archive',
+    }
+
+Only read messages are pruned, and the read state is rechecked in the
+DELETE itself, so the unread counters never change. Messages without a
+received_at (stored before it was recorded) are kept.
+"""
+
+import datetime
+import gzip
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cold_storage import lock_body_refs, rehydrate
+from .models import DeletedVirtualNumber, Message, RecoverableMessage, RecoverableVirtualNumber
+from .versioning import bump_version, MESSAGES
+
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class RetentionPolicy:
+    """Rows of `model` whose `age_field` is older than `days` days."""
+
+    def __init__(self, name, model, age_field, days, extra_filter=None, versions=()):
+        self.name = name
+        self.model = model
+        self.age_field = age_field
+        self.days = days
+        self.extra_filter = extra_filter or {}
+        # Resource versions to bump when rows are deleted (see api/versioning.py)
+        self.versions = versions
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def expired(self, now):
+        cutoff = now - datetime.timedelta(days=self.days)
+        return self.model.objects.filter(**{f"{self.age_field}__lt": cutoff}, **self.extra_filter)
+
+
+# Order matters: archived messages go before the entries they belong to
+POLICIES = [
+    ('deleted_numbers', DeletedVirtualNumber, 'deleted_at', 90, None, ()),
+    ('recoverable_messages', RecoverableMessage, 'recoverable_virtual_number__expires_at', 0, None, ()),
+    ('recoverable_numbers', RecoverableVirtualNumber, 'expires_at', 0, None, ()),
+    ('read_messages', Message, 'received_at', None, {'is_read': True}, (MESSAGES,)),
+]
+
+
+def retention_config():
+    config = getattr(settings, 'NUMGUARD_RETENTION', {})
+    return {
+        'policies': [
+            RetentionPolicy(name, model, age_field, config.get(name, days), extra_filter, versions)
+            for name, model, age_field, days, extra_filter, versions in POLICIES
+            if config.get(name, days) is not None
+        ],
+        'ARCHIVE_DIR': config.get('ARCHIVE_DIR', settings.BASE_DIR / 'archive'),
+    }
+
+
+class NDJSONArchive:
+    """Appends rows to `<dir>/<policy>-<timestamp>.ndjson.gz`, opened on first write."""
+
+    def __init__(self, directory, name, now):
+        self.path = os.path.join(directory, f"{name}-{now:%Y%m%dT%H%M%S}.ndjson.gz")
+        self.file = None
+
+    def write(self, rows):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = gzip.open(self.path, 'at', encoding='utf-8')
+        for row in rows:
+            self.file.write(json.dumps(row, cls=DjangoJSONEncoder))
+            self.file.write('\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def prune(policy, batch_size=DEFAULT_BATCH_SIZE, archive=None, pause=0, now=None, progress=None):
+    """
+    Delete the policy's expired rows, `batch_size` at a time.
+
+    Args:
+        archive (NDJSONArchive): optional; each batch is written inside the
+            transaction that deletes it, so a failed write keeps the rows.
+            Only rows the DELETE removed are written. The file itself is not
+            transactional: if the commit fails after the write, the archive
+            holds rows that still exist, and the next run writes them again.
+        pause (float): seconds to sleep between batches, to let writers in
+        progress (callable): called with the running total after every batch
+
+    Returns:
+        int: number of rows deleted
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            expired = policy.expired(now).order_by('pk')
+            if archive:
+                # Keep compaction from deleting the segments these rows point into
+                lock_body_refs()
+                # Lock the rows, so they still match the policy at the DELETE
+                rows = list(expired.select_for_update(of=('self',)).values()[:batch_size])
+                ids = [row['id'] for row in rows]
+            else:
+                ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Recheck the policy so rows changed since the select are kept
+            _, counts = policy.expired(now).filter(pk__in=ids).delete()
+            count = counts.get(policy.model._meta.label, 0)
+            if count and policy.versions:
+                bump_version(*policy.versions)
+            if archive:
+                if count < len(ids):
+                    # The recheck kept some rows; archive only what was deleted
+                    kept = set(policy.model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+                    rows = [row for row in rows if row['id'] not in kept]
+                # Archives hold the full body, wherever it is stored
+                archive.write(rehydrate(rows))
+        deleted += count
+        if progress:
+            progress(deleted)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def compact(tables, vacuum=False):
+    """
+    Refresh planner statistics and, optionally, return freed pages to the OS.
+    On SQLite VACUUM rewrites the whole file under an exclusive lock, so it is
+    only worth running after a large prune; freed pages are reused anyway.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if vacuum:
+                cursor.execute("VACUUM")
+            cursor.execute("ANALYZE")
+        elif connection.vendor == 'postgresql':
+            for table in tables:
+                quoted = connection.ops.quote_name(table)
+                cursor.execute(f"VACUUM ANALYZE {quoted}" if vacuum else f"ANALYZE {quoted}")
@@ -0,0 +1,272 @@
+"""
+Sender classification engine.
+
+Carriers deliver sender IDs such as `AX-AMAZON`, `VM-FLPKRT-S` or a bare
+phone number, not the short names the app reasons about. Sender IDs are
+normalized first: lowercased, with the two-letter DLT operator/circle
+prefix (`AX-`) and the trailing traffic-type tag (`-S`, `-P`, `-T`, `-G`)
+removed. They are then matched against SenderRule rows, plus an optional
+JSON rules file at NUMGUARD_SENDER_RULES_FILE:
+
+1. alias  - rename a sender ID to a canonical sender (`flpkrt` -> `flipkart`)
+2. exact  - whole normalized name
+3. prefix - longest matching prefix wins
+4. suffix - longest matching suffix wins
+5. regex  - must match the whole name; lowest priority value wins
+
+Rules are compiled once: exact and alias rules into dicts, prefix and
+suffix rules into tables keyed by their first/last character and then by
+length, and regex rules into combined alternations. A name whose edge
+characters start no pattern costs one dict probe per table. Regexes only
+run for names no other rule matched. Results are also memoized per
+compiled rule set, but `manage.py bench_senders` headlines the uncached
+cost, since a carrier stream keeps producing IDs the cache has not seen.
+
+The compiled rules are rebuilt when the SenderRule version changes (bumped
+by api/signals.py) or the rules file's mtime changes. Other processes pick
+that up within RELOAD_CHECK_SECONDS.
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+RELOAD_CHECK_SECONDS = 5
+CACHE_SIZE = 65536
+
+# Traffic-type tags of Indian DLT sender IDs (service, promotional, transactional, government)
+DLT_TRAFFIC_TYPES = frozenset('pstg')
+ASCII_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyz')
+
+
+def normalize(sender_id):
+    """Reduce a raw sender ID to the name rules are written against."""
+    name = sender_id.strip().lower()
+    # Operator/circle header prefix, e.g. "ax-amazon"; set lookups beat slicing and a regex here.
+    # CompiledRules.classify_uncached inlines these checks; keep the two in step.
+    if name[2:3] == '-' and len(name) > 3 and name[0] in ASCII_LETTERS and name[1] in ASCII_LETTERS:
+        name = name[3:]
+    if name[-2:-1] == '-' and len(name) > 2 and name[-1] in DLT_TRAFFIC_TYPES:
+        name = name[:-2]
+    return name
+
+
+# Constructs that change meaning or stop compiling once a pattern is one
+# alternative among others: global inline flags, backreferences and named groups
+GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+NAMED_GROUP = re.compile(r'\(\?P?<[A-Za-z_]')
+
+
+def combinable(pattern):
+    """Whether a regex rule can share the combined alternation."""
+    return not (GLOBAL_FLAGS.search(pattern) or BACKREFERENCE.search(pattern) or NAMED_GROUP.search(pattern))
+
+
+def regex_rule_error(pattern):
+    """Return why a regex rule pattern is not accepted, or None."""
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return f"Invalid regular expression: {e}"
+    if GLOBAL_FLAGS.search(pattern):
+        return "Inline flags are not allowed; sender IDs are already lowercased"
+    if BACKREFERENCE.search(pattern):
+        return "Backreferences are not allowed"
+    if NAMED_GROUP.search(pattern):
+        return "Named groups are not allowed"
+    return None
+
+
+class CompiledRules:
+    """An immutable, precompiled rule set."""
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (iterable): dicts with kind, pattern, category, target and
+                priority keys, in precedence order (earlier wins ties)
+        """
+        self.aliases = {}
+        self.exact = {}
+        prefixes, suffixes, regexes = {}, {}, []
+
+        for rule in sorted(rules, key=lambda rule: rule.get('priority', 0)):
+            kind, pattern = rule['kind'], rule['pattern']
+            if kind == 'alias':
+                self.aliases.setdefault(normalize(pattern), normalize(rule['target']))
+            elif kind == 'exact':
+                self.exact.setdefault(normalize(pattern), rule['category'])
+            elif kind == 'prefix':
+                prefixes.setdefault(pattern.lower(), rule['category'])
+            elif kind == 'suffix':
+                suffixes.setdefault(pattern.lower(), rule['category'])
+            elif kind == 'regex':
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    logger.warning("Skipping invalid sender regex %r: %s", pattern, e)
+                    continue
+                regexes.append((pattern, rule['category']))
+
+        # {first or last char: [(length, {pattern: category}), ...]}, longest first
+        self.prefixes = self._by_edge_char(prefixes, 0)
+        self.suffixes = self._by_edge_char(suffixes, -1)
+        self.regex_matchers = self._regex_matchers(regexes)
+
+        self.classify = functools.lru_cache(maxsize=CACHE_SIZE)(self.classify_uncached)
+
+    @staticmethod
+    def _regex_matchers(regexes):
+        """
+        Combine runs of regex rules into `(?P<r0>...)|(?P<r1>...)`
+        alternations, keeping precedence order.
+
+        Returns:
+            list: (compiled pattern, categories) pairs, tried in order; a
+            combined pattern's lastgroup `rN` indexes its categories. Rules
+            that cannot share an alternation get a pattern of their own.
+        """
+        matchers = []
+        run = []
+
+        def flush():
+            if not run:
+                return
+            try:
+                combined = re.compile('|'.join(f"(?P<r{index}>{pattern})" for index, (pattern, _) in enumerate(run)))
+                matchers.append((combined, [category for _, category in run]))
+            except re.error as e:
+                logger.warning("Sender regexes cannot be combined, matching them one by one: %s", e)
+                matchers.extend((re.compile(pattern), [category]) for pattern, category in run)
+            run.clear()
+
+        for pattern, category in regexes:
+            if combinable(pattern):
+                run.append((pattern, category))
+            else:
+                flush()
+                # On its own, so its flags and group numbers mean what the author wrote
+                matchers.append((re.compile(pattern), [category]))
+        flush()
+        return matchers
+
+    @staticmethod
+    def _by_edge_char(patterns, edge):
+        """
+        Group patterns by their first (edge=0) or last (edge=-1) character,
+        then by length, so a name whose edge character starts no pattern
+        costs one dict probe.
+        """
+        tables = {}
+        for pattern, category in patterns.items():
+            if pattern:
+                tables.setdefault(pattern[edge], {}).setdefault(len(pattern), {})[pattern] = category
+        return {char: sorted(by_length.items(), reverse=True) for char, by_length in tables.items()}
+
+    def classify_uncached(self, sender_id):
+        """Return the category for a raw sender ID, or None if no rule matches."""
+        # Every stage is inlined: at this size a Python call costs as much as a stage
+        name = sender_id.strip().lower()
+        if name[2:3] == '-' and len(name) > 3 and name[0] in ASCII_LETTERS and name[1] in ASCII_LETTERS:
+            name = name[3:]
+        if name[-2:-1] == '-' and len(name) > 2 and name[-1] in DLT_TRAFFIC_TYPES:
+            name = name[:-2]
+        name = self.aliases.get(name, name)
+
+        category = self.exact.get(name)
+        if category:
+            return category
+        # Longest prefix, then longest suffix; most names share no edge character with any pattern
+        for length, table in self.prefixes.get(name[:1], ()):
+            category = table.get(name[:length])
+            if category:
+                return category
+        for length, table in self.suffixes.get(name[-1:], ()):
+            category = table.get(name[-length:])
+            if category:
+                return category
+        for regex, categories in self.regex_matchers:
+            match = regex.fullmatch(name)
+            if match:
+                if len(categories) == 1:
+                    return categories[0]
+                # The wrapping group closes last, so lastgroup names the rule
+                return categories[int(match.lastgroup[1:])]
+        return None
+
+
+def load_rules():
+    """Collect active rules: SenderRule rows first, then the rules file."""
+    from .models import SenderRule
+
+    rules = list(
+        SenderRule.objects.filter(is_active=True)
+        .order_by('priority', 'id')
+        .values('kind', 'pattern', 'category', 'target', 'priority')
+    )
+    path = rules_file()
+    if path and os.path.exists(path):
+        with open(path) as f:
+            rules.extend(json.load(f))
+    return rules
+
+
+def rules_file():
+    return getattr(settings, 'NUMGUARD_SENDER_RULES_FILE', None)
+
+
+class SenderClassifier:
+    """Process-wide holder that rebuilds CompiledRules when rules change."""
+
+    def __init__(self, check_interval=RELOAD_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._compiled = None
+        self._stamp = None
+        self._checked_at = 0.0
+
+    def _current_stamp(self):
+        from .versioning import get_versions, SENDER_RULES
+
+        path = rules_file()
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        return get_versions(SENDER_RULES)[SENDER_RULES], mtime
+
+    def rules(self):
+        """Return the current CompiledRules, reloading them if they changed."""
+        now = time.monotonic()
+        if self._compiled is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._compiled is None or now - self._checked_at >= self.check_interval:
+                    stamp = self._current_stamp()
+                    if stamp != self._stamp or self._compiled is None:
+                        self._compiled = CompiledRules(load_rules())
+                        self._stamp = stamp
+                    self._checked_at = now
+        return self._compiled
+
+    def classify(self, sender_id):
+        return self.rules().classify(sender_id)
+
+    def invalidate(self):
+        """Force the next classification to reload the rules."""
+        with self._lock:
+            self._compiled = None
+
+
+sender_classifier = SenderClassifier()
+
+
+def classify_sender(sender_id):
+    """Return the category of a raw sender ID, or None if it is unknown."""
+    return sender_classifier.classify(sender_id)
@@ -9,14 +9,11 @@ class PhysicalNumberSerializer(serializers.ModelSerializer):
 
 class VirtualNumberSerializer(serializers.ModelSerializer):
     
-    unread_count=serializers.SerializerMethodField()
-    
     class Meta:
         model=VirtualNumber
         fields='__all__'
-        
-    def get_unread_count(self,obj):
-        return obj.messages.filter(is_read=False).count()
+        # Denormalized counter, maintained by api/counters.py
+        read_only_fields=['unread_count']
     
     def validate(self, data):
         physical_number = data.get('physical_number')
@@ -61,4 +58,10 @@ class DeletedVirtualNumberSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model=Message
-        fields='__all__'
\ No newline at end of file
+        exclude=['body_ref']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Bodies in cold storage are only previewed; read_message returns them whole
+        data['truncated'] = bool(instance.body_ref)
+        return data
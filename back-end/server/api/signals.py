@@ -0,0 +1,86 @@
+"""
+Model signal handlers that keep resource versions in step with writes.
+
+Bulk operations (QuerySet.update, bulk_create, raw deletes) do not send these
+signals; code paths that use them call api.versioning.bump_version (and the
+api.events publishers) directly.
+New unread messages also increment the denormalized unread counters here,
+so every Message.objects.create is counted; reads and deletes adjust them
+explicitly (see api/counters.py).
+VirtualNumber and RecoverableVirtualNumber writes also open and close
+NumberOwnership intervals (see api/ownership.py), and return numbers that
+nothing holds any more to the allocator's free-list (see api/numbering.py).
+Message deletes are bumped explicitly, because a post_delete receiver on
+Message would stop Django from fast-deleting an inbox when its virtual number
+is removed.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .counters import adjust_unread
+from .events import publish_message_created, publish_unread_count
+from .models import VirtualNumber, Message, SenderRule, RecoverableVirtualNumber
+from .numbering import release_number
+from .ownership import close_ownership, expire_recoverable, open_ownership, ownership_cache
+from .senders import sender_classifier
+from .versioning import bump_version, NUMBERS, MESSAGES, SENDER_RULES
+
+
+@receiver(post_save, sender=VirtualNumber)
+@receiver(post_delete, sender=VirtualNumber)
+def virtual_number_changed(sender, **kwargs):
+    # Deleting a number cascades to its messages
+    bump_version(NUMBERS, MESSAGES)
+
+
+def invalidate_ownership(number):
+    ownership_cache.invalidate(number)
+    # Again after commit, in case a concurrent lookup cached the old interval meanwhile
+    transaction.on_commit(lambda: ownership_cache.invalidate(number))
+
+
+@receiver(post_save, sender=VirtualNumber)
+def virtual_number_created(sender, instance, created, **kwargs):
+    if created:
+        open_ownership(instance)
+        invalidate_ownership(instance.numbers)
+
+
+@receiver(post_delete, sender=VirtualNumber)
+def virtual_number_deleted(sender, instance, **kwargs):
+    # delete_virtual_number stores the recoverable copy before deleting
+    recoverable = RecoverableVirtualNumber.objects.live().filter(number=instance.numbers).exists()
+    close_ownership(instance, recoverable=recoverable)
+    invalidate_ownership(instance.numbers)
+    # Only frees the number when no recovery copy holds it
+    release_number(instance.numbers)
+
+
+@receiver(post_delete, sender=RecoverableVirtualNumber)
+def recoverable_virtual_number_deleted(sender, instance, **kwargs):
+    expire_recoverable([instance.number])
+    invalidate_ownership(instance.number)
+    # Unless the number was restored, nothing holds it any more
+    release_number(instance.number)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    bump_version(MESSAGES)
+    if created and not instance.is_read:
+        adjust_unread({instance.virtual_number_id: 1})
+    # Push to stream subscribers once the row is visible to other connections
+    if created:
+        transaction.on_commit(lambda: publish_message_created(instance))
+    else:
+        transaction.on_commit(lambda: publish_unread_count(instance.virtual_number))
+
+
+@receiver(post_save, sender=SenderRule)
+@receiver(post_delete, sender=SenderRule)
+def sender_rule_changed(sender, **kwargs):
+    # Other processes notice the version bump; this one reloads right away
+    bump_version(SENDER_RULES)
+    transaction.on_commit(sender_classifier.invalidate)
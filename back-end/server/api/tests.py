@@ -1,3 +1,1580 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from importlib.util import find_spec
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import unquote, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from server.db_profile import database_config
+
+from . import cold_storage, counters, events, numbering, retention, senders, views, write_batcher
+from .cooldown_cache import (
+    CooldownCache, DjangoCacheBackend as DjangoCooldownBackend, LocalBackend as LocalCooldownBackend, cooldown_cache
+)
+from .ingest_queue import IngestQueue
+from .ownership import find_owner, ownership_cache
+from .ratelimit import LocalBackend, RateLimiter, rate_limiter
+from .models import (
+    CategoryCooldown, PhysicalNumber, VirtualNumber, Message, DeletedVirtualNumber, RecoverableVirtualNumber, RecoverableMessage,
+    SenderRule, NumberOwnership, FreeNumber, NumberPool
+)
+
+
+CATEGORIES = ['social-media', 'e-commerce', 'personal']
+# Optional PostgreSQL server for the pooled profile test
+POSTGRES_URL = os.environ.get('DATABASE_URL', '')
+
+
+def reset_cooldown_cache():
+    # The cache outlives the per-test transaction rollback
+    cooldown_cache.invalidate(*CATEGORIES)
+
+
+def make_virtual_number(physical_number, numbers, category='personal'):
+    return VirtualNumber.objects.create(
+        numbers=numbers,
+        category=category,
+        physical_number=physical_number
+    )
+
+
+def make_message(virtual_number, sender='family', is_read=False, message_body='hello', **kwargs):
+    return Message.objects.create(
+        virtual_number=virtual_number,
+        category=virtual_number.category,
+        sender=sender,
+        message_body=message_body,
+        is_read=is_read,
+        **kwargs
+    )
+
+
+class ViewVirtualNumbersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_fleet(self, size):
+        categories = ['social-media', 'e-commerce', 'personal']
+        offset = PhysicalNumber.objects.count()
+        for i in range(offset, offset + size):
+            physical = PhysicalNumber.objects.create(number=f"{9000000000 + i}", owner_name=f"owner-{i}")
+            virtual = make_virtual_number(physical, f"{7000000000 + i}", categories[i % 3])
+            make_message(virtual)
+            make_message(virtual)
+            make_message(virtual, is_read=True)
+
+    def test_unread_count_uses_counter(self):
+        self.create_fleet(2)
+        response = self.client.get(reverse('view_virtual_numbers'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['unread_count'] for row in response.data], [2, 2])
+
+    def test_listing_query_count_is_constant(self):
+        # One query for the ETag versions, one for the listing
+        self.create_fleet(1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('view_virtual_numbers'))
+
+        self.create_fleet(20)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('view_virtual_numbers'))
+
+
+class MessageFeedPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.virtual = make_virtual_number(physical, '7000000000', 'e-commerce')
+        base = timezone.now()
+        self.messages = [
+            make_message(self.virtual, sender='amazon', received_at=base + datetime.timedelta(seconds=i))
+            for i in range(5)
+        ]
+
+    def get_feed(self, **params):
+        return self.client.get(reverse('forward_message_to_front_end'), {'category': 'e-commerce', **params})
+
+    def test_pages_back_through_inbox(self):
+        first = self.get_feed(limit=2)
+        self.assertEqual([m['id'] for m in first.data['results']], [self.messages[4].id, self.messages[3].id])
+        self.assertTrue(first.data['has_more'])
+
+        second = self.get_feed(limit=2, cursor=first.data['next_cursor'])
+        third = self.get_feed(limit=2, cursor=second.data['next_cursor'])
+        self.assertEqual([m['id'] for m in second.data['results']], [self.messages[2].id, self.messages[1].id])
+        self.assertEqual([m['id'] for m in third.data['results']], [self.messages[0].id])
+        self.assertIsNone(third.data['next_cursor'])
+
+    def test_after_returns_only_new_messages(self):
+        latest = self.get_feed(limit=10).data['latest_cursor']
+        self.assertEqual(self.get_feed(after=latest).data['results'], [])
+
+        new = make_message(self.virtual, sender='amazon', received_at=timezone.now() + datetime.timedelta(minutes=1))
+        response = self.get_feed(after=latest)
+        self.assertEqual([m['id'] for m in response.data['results']], [new.id])
+        self.assertNotEqual(response.data['latest_cursor'], latest)
+
+    def test_after_includes_late_commits_with_older_received_at(self):
+        latest = self.get_feed(limit=10).data['latest_cursor']
+        # Stored from the ingest queue with the carrier's earlier timestamp
+        late = make_message(self.virtual, sender='amazon', received_at=self.messages[0].received_at - datetime.timedelta(hours=1))
+        response = self.get_feed(after=latest)
+        self.assertEqual([m['id'] for m in response.data['results']], [late.id])
+        self.assertEqual(self.get_feed(after=response.data['latest_cursor']).data['results'], [])
+
+    def test_after_is_refused_where_ids_do_not_follow_commit_order(self):
+        latest = self.get_feed(limit=10).data['latest_cursor']
+        with mock.patch('api.pagination.after_supported', return_value=False):
+            self.assertIsNone(self.get_feed(limit=10).data['latest_cursor'])
+            self.assertEqual(self.get_feed(after=latest).status_code, 400)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.get_feed(cursor='not-a-cursor').status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        reset_cooldown_cache()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.virtual = make_virtual_number(physical, '7000000000', 'personal')
+        self.message = make_message(self.virtual)
+
+    def assert_revalidates(self, url, params=None):
+        first = self.client.get(url, params)
+        self.assertIn('ETag', first)
+        with self.assertNumQueries(1):
+            second = self.client.get(url, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        return first['ETag']
+
+    def test_polled_endpoints_return_not_modified(self):
+        self.assert_revalidates(reverse('view_virtual_numbers'))
+        self.assert_revalidates(reverse('forward_message_to_front_end'), {'category': 'personal'})
+        self.assert_revalidates(reverse('get_total_notifaction_count'))
+
+    def test_cooldowns_not_modified_while_idle(self):
+        first = self.client.get(reverse('check_category_cooldowns'))
+        second = self.client.get(reverse('check_category_cooldowns'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.assert_revalidates(reverse('get_total_notifaction_count'))
+        self.client.get(reverse('read_message', args=[self.message.id]))
+        response = self.client.get(reverse('get_total_notifaction_count'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        self.client.delete(reverse('delete_message', args=[self.message.id]))
+        response = self.client.get(reverse('get_total_notifaction_count'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class EventStreamTests(SimpleTestCase):
+    async def test_subscribers_only_receive_matching_events(self):
+        broker = events.InProcessBroker()
+        personal = broker.subscribe(category='personal')
+        everything = broker.subscribe()
+
+        broker.publish({'type': 'message', 'category': 'e-commerce', 'virtual_number': '7000000000'})
+        broker.publish({'type': 'message', 'category': 'personal', 'virtual_number': '7000000001'})
+
+        self.assertEqual((await personal.get(timeout=1))['virtual_number'], '7000000001')
+        self.assertIsNone(await personal.get(timeout=0.01))
+        self.assertEqual((await everything.get(timeout=1))['category'], 'e-commerce')
+
+        broker.unsubscribe(personal)
+        self.assertTrue(broker.has_subscribers())
+
+    async def test_stream_endpoint_relays_events(self):
+        response = await self.async_client.get(reverse('stream_messages'), {'category': 'personal'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b': connected\n\n')
+
+        events.get_broker().publish({'type': 'unread_count', 'category': 'personal', 'unread_count': 3})
+        chunk = await anext(stream)
+        self.assertTrue(chunk.startswith(b'event: unread_count\n'))
+        await stream.aclose()
+
+
+class MessageEventTests(TestCase):
+    def test_new_message_is_published_after_commit(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        virtual = make_virtual_number(physical, '7000000000', 'personal')
+        published = []
+        broker = events.get_broker()
+        original_publish, original_has = broker.publish, broker.has_subscribers
+        broker.publish, broker.has_subscribers = published.append, lambda: True
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                make_message(virtual)
+        finally:
+            broker.publish, broker.has_subscribers = original_publish, original_has
+
+        self.assertEqual([event['type'] for event in published], ['message', 'unread_count'])
+        self.assertEqual(published[1]['unread_count'], 1)
+
+
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        rate_limiter.reset()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.shop = make_virtual_number(physical, '7000000000', 'e-commerce')
+        self.social = make_virtual_number(physical, '7000000001', 'social-media')
+        self.social.is_message_active = False
+        self.social.save()
+        # Load the sender rules outside the counted queries
+        senders.classify_sender('amazon')
+
+    def test_json_array_with_per_item_results(self):
+        items = [
+            {'virtual_number': '7000000000', 'sender_name': 'Amazon', 'message': 'Order shipped'},
+            {'virtual_number': '7000000000', 'sender_name': 'twitter', 'message': 'New follower'},
+            {'virtual_number': '7000000001', 'sender_name': 'insta', 'message': 'Like'},
+            {'virtual_number': '7999999999', 'sender_name': 'amazon', 'message': 'Lost'},
+            {'virtual_number': '7000000000', 'sender_name': 'ebay'},
+        ]
+        with self.assertNumQueries(7):
+            # number lookup, then insert, unread counters and version bump inside a savepoint
+            response = self.client.post(reverse('receive_messages_bulk'), items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([r['success'] for r in response.data['results']], [True, False, False, False, False])
+        self.assertTrue(Message.objects.filter(id=response.data['results'][0]['id'], sender='Amazon').exists())
+
+    def test_ndjson_stream(self):
+        body = '\n'.join(
+            json.dumps({'virtual_number': '7000000000', 'sender_name': 'flipkart', 'message': f'msg {i}'})
+            for i in range(50)
+        )
+        response = self.client.post(reverse('receive_messages_bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['accepted'], 50)
+        self.assertEqual(self.shop.messages.count(), 50)
+
+    def test_ndjson_with_charset_parameter(self):
+        body = '\n'.join(
+            json.dumps({'virtual_number': '7000000000', 'sender_name': 'flipkart', 'message': f'msg {i}'})
+            for i in range(3)
+        )
+        response = self.client.post(reverse('receive_messages_bulk'), body,
+                                    content_type='application/x-ndjson; charset=utf-8')
+        self.assertEqual(response.data['accepted'], 3)
+
+    def test_largest_batch_fits_the_upload_limit(self):
+        # Full-length multipart SMS bodies, as many as a request may carry
+        items = [
+            {'virtual_number': '7000000000', 'sender_name': 'amazon', 'message': 'x' * 1600}
+            for _ in range(views.MAX_INGEST_BATCH_SIZE)
+        ]
+        response = self.client.post(reverse('receive_messages_bulk'), items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), views.MAX_INGEST_BATCH_SIZE)
+
+        items.append(items[0])
+        response = self.client.post(reverse('receive_messages_bulk'), items, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_oversized_body_is_rejected(self):
+        items = [{'virtual_number': '7000000000', 'sender_name': 'amazon', 'message': 'x' * 200}]
+        response = self.client.post(reverse('receive_messages_bulk'), items, format='json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_malformed_body_is_rejected(self):
+        response = self.client.post(reverse('receive_messages_bulk'), '{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        rate_limiter.reset()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.personal = make_virtual_number(physical, '7000000000', 'personal')
+        self.shop = make_virtual_number(physical, '7000000001', 'e-commerce')
+        reset_cooldown_cache()
+
+    def assertCounters(self, personal, shop):
+        self.personal.refresh_from_db()
+        self.shop.refresh_from_db()
+        self.assertEqual((self.personal.unread_count, self.shop.unread_count), (personal, shop))
+        self.assertEqual(counters.total_unread(), personal + shop)
+        self.assertEqual(counters.reconcile(fix=False), {'numbers': [], 'total': None})
+
+    def test_counters_follow_every_write_path(self):
+        first = make_message(self.personal)
+        make_message(self.personal)
+        make_message(self.personal, is_read=True)
+        self.client.post(reverse('receive_messages_bulk'), [
+            {'virtual_number': '7000000001', 'sender_name': 'amazon', 'message': 'a'},
+            {'virtual_number': '7000000001', 'sender_name': 'ebay', 'message': 'b'},
+            {'virtual_number': '7000000000', 'sender_name': 'family', 'message': 'c'},
+        ], format='json')
+        self.assertCounters(3, 2)
+
+        self.client.get(reverse('read_message', args=[first.id]))
+        self.client.get(reverse('read_message', args=[first.id]))
+        self.assertCounters(2, 2)
+
+        self.client.delete(reverse('delete_message', args=[first.id]))
+        self.client.delete(reverse('delete_message', args=[self.personal.messages.filter(is_read=False).first().id]))
+        self.assertCounters(1, 2)
+
+        self.client.delete(reverse('delete_virtual_number', args=[self.shop.id]))
+        self.assertEqual(counters.total_unread(), 1)
+        self.client.post(reverse('restore_last_deleted_virtual_number'))
+        self.shop = VirtualNumber.objects.get(numbers='7000000001')
+        self.assertCounters(1, 2)
+
+    def test_notification_count_is_a_single_row_lookup(self):
+        make_message(self.personal)
+        make_message(self.shop)
+        with self.assertNumQueries(2):
+            # ETag version lookup, then the counter row
+            response = self.client.get(reverse('get_total_notifaction_count'))
+        self.assertEqual(response.data, {'total_notification': 2})
+
+    def test_reconcile_repairs_drift(self):
+        make_message(self.personal)
+        make_message(self.shop)
+        VirtualNumber.objects.filter(pk=self.personal.pk).update(unread_count=7)
+        Message.objects.filter(virtual_number=self.shop).update(is_read=True)
+
+        report = counters.reconcile()
+        self.assertEqual(report['numbers'], [('7000000000', 7, 1), ('7000000001', 1, 0)])
+        self.assertEqual(report['total'], (2, 1))
+        self.assertCounters(1, 0)
+
+
+class BulkMessageActionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.personal = make_virtual_number(physical, '7000000000', 'personal')
+        self.shop = make_virtual_number(physical, '7000000001', 'e-commerce')
+        now = timezone.now()
+        self.old = [make_message(self.personal, received_at=now - datetime.timedelta(days=2)) for _ in range(3)]
+        self.new = [make_message(self.personal, received_at=now) for _ in range(2)]
+        self.orders = [make_message(self.shop, sender='amazon', received_at=now) for _ in range(4)]
+
+    def counters_in_sync(self):
+        return counters.reconcile(fix=False) == {'numbers': [], 'total': None}
+
+    def test_read_by_ids_is_one_update(self):
+        ids = [message.id for message in self.old] + [self.orders[0].id]
+        with self.assertNumQueries(9):
+            # affected numbers, UPDATE, recount (lock, count, two adjusts), version bump, in a savepoint
+            response = self.client.post(reverse('read_messages'), {'ids': ids}, format='json')
+        self.assertEqual(response.data['updated'], 4)
+        self.assertEqual(Message.objects.filter(is_read=False).count(), 5)
+        self.assertEqual(counters.total_unread(), 5)
+        self.assertTrue(self.counters_in_sync())
+
+        # Already-read messages are not counted again
+        response = self.client.post(reverse('read_messages'), {'ids': ids}, format='json')
+        self.assertEqual(response.data['updated'], 0)
+
+    def test_read_and_delete_by_filter(self):
+        response = self.client.post(reverse('read_messages'), {'category': 'e-commerce'}, format='json')
+        self.assertEqual(response.data['updated'], 4)
+
+        before = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        response = self.client.post(
+            reverse('delete_messages'), {'virtual_number': '7000000000', 'before': before}, format='json'
+        )
+        self.assertEqual(response.data['deleted'], 3)
+        self.assertEqual(set(self.personal.messages.values_list('id', flat=True)), {m.id for m in self.new})
+
+        response = self.client.post(reverse('delete_messages'), {'category': 'e-commerce'}, format='json')
+        self.assertEqual(response.data['deleted'], 4)
+        self.assertEqual(counters.total_unread(), 2)
+        self.assertTrue(self.counters_in_sync())
+
+    def test_selector_is_required(self):
+        for body in ({}, {'ids': 'all'}, {'before': 'yesterday'}, [1, 2]):
+            response = self.client.post(reverse('delete_messages'), body, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Message.objects.count(), 9)
+
+
+class IngestQueueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        rate_limiter.reset()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.queue = IngestQueue(os.path.join(self.tmpdir.name, 'queue.sqlite3'))
+        self.addCleanup(self.queue.close)
+        patcher = mock.patch.multiple(
+            'api.views', queued_ingest_enabled=lambda: True, get_ingest_queue=lambda: self.queue
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.shop = make_virtual_number(physical, '7000000000', 'e-commerce')
+
+    def receive(self, key=None, sender='amazon', message='Order shipped'):
+        params = {'virtual_number': '7000000000', 'sender_name': sender, 'message': message}
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.get(reverse('receive_message'), params, **headers)
+
+    def test_webhook_is_acknowledged_before_storing(self):
+        response = self.receive('carrier-1')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.data['duplicate'])
+        self.assertEqual(Message.objects.count(), 0)
+        self.assertEqual(self.queue.stats()['pending'], 1)
+
+    def test_carrier_retries_are_deduplicated(self):
+        first = self.receive('carrier-1')
+        retry = self.receive('carrier-1')
+        self.assertTrue(retry.data['duplicate'])
+        self.assertEqual(retry.data['queue_id'], first.data['queue_id'])
+        self.receive('carrier-2')
+
+        self.assertEqual(views.drain_ingest_queue(self.queue), 2)
+        self.assertEqual(views.drain_ingest_queue(self.queue), 0)
+        self.assertEqual(self.shop.messages.count(), 2)
+
+        # A retry after draining is still recognised
+        self.assertTrue(self.receive('carrier-1').data['duplicate'])
+        self.assertEqual(views.drain_ingest_queue(self.queue), 0)
+
+    def test_drain_records_per_entry_results(self):
+        accepted = self.receive('a').data['queue_id']
+        rejected = self.receive('b', sender='twitter').data['queue_id']
+        views.drain_ingest_queue(self.queue)
+        self.assertTrue(self.queue.get(accepted)['result']['success'])
+        self.assertIn('Category mismatch', self.queue.get(rejected)['result']['message'])
+        self.assertEqual(self.shop.messages.get().received_at.date(), timezone.now().date())
+
+    def test_expired_claims_are_retried(self):
+        self.receive('carrier-1')
+        self.assertEqual(len(self.queue.claim(10)), 1)
+        # A second worker sees nothing while the lease is held
+        self.assertEqual(self.queue.claim(10), [])
+        self.assertEqual(len(self.queue.claim(10, lease_seconds=0)), 1)
+
+    def test_only_entries_failing_on_their_own_are_charged(self):
+        good = self.receive('good').data['queue_id']
+        poison = self.receive('poison', message='poison').data['queue_id']
+
+        def write(messages):
+            if any(message.message_body == 'poison' for message in messages):
+                raise ValueError("bad row")
+            return write_batcher.write_messages(messages)
+
+        with mock.patch('api.views.write_messages', side_effect=write):
+            self.assertEqual(views.drain_ingest_queue(self.queue), 2)
+
+        self.assertTrue(self.queue.get(good)['result']['success'])
+        self.assertEqual(self.shop.messages.count(), 1)
+        entry = self.queue.get(poison)
+        self.assertEqual((entry['attempts'], entry['done']), (1, False))
+        # Still leased to the worker that tried it
+        self.assertEqual(self.queue.fail_exhausted(max_attempts=1), 0)
+        self.assertEqual(self.queue.fail_exhausted(max_attempts=1, lease_seconds=0), 1)
+        self.assertTrue(self.queue.get(poison)['done'])
+
+    def test_database_errors_are_not_charged(self):
+        entry_id = self.receive('carrier-1').data['queue_id']
+        with mock.patch('api.views.write_messages', side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                views.drain_ingest_queue(self.queue)
+        self.assertEqual(self.queue.get(entry_id)['attempts'], 0)
+        self.assertEqual(self.queue.fail_exhausted(max_attempts=1, lease_seconds=0), 0)
+
+    @mock.patch('api.management.commands.drain_ingest_queue.time.sleep')
+    def test_drain_command_backs_off_and_continues_after_errors(self, sleep):
+        drain = mock.Mock(side_effect=[OperationalError("database is locked"), OperationalError("database is locked"), 3, 0])
+        with mock.patch.multiple('api.management.commands.drain_ingest_queue',
+                                 drain_ingest_queue=drain, get_ingest_queue=lambda: self.queue):
+            with self.assertLogs('api.management.commands.drain_ingest_queue', 'ERROR'):
+                out = StringIO()
+                call_command('drain_ingest_queue', '--interval', '1', stdout=out)
+
+        self.assertIn('Processed 3 queued message(s)', out.getvalue())
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [2, 4])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = 1000.0
+        self.limiter = RateLimiter(LocalBackend(), number_limit=(1, 3), sender_limit=(2, 5), clock=lambda: self.now)
+        patcher = mock.patch('api.views.rate_limiter', self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        make_virtual_number(physical, '7000000000', 'e-commerce')
+        make_virtual_number(physical, '7000000001', 'personal')
+
+    def test_token_bucket_refills(self):
+        self.assertEqual([self.limiter.check('a')[0] for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(self.limiter.check('a')[1], 1.0)
+        self.now += 1.5
+        self.assertEqual([self.limiter.check('a')[0] for _ in range(2)], [True, False])
+        # A rejected sender does not drain the number's bucket
+        self.assertTrue(self.limiter.check('b', 'spam')[0])
+
+    def test_flood_is_rejected_before_any_query(self):
+        params = {'virtual_number': '7000000000', 'sender_name': 'amazon', 'message': 'Deal'}
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('receive_message'), params).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('receive_message'), params)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_sender_limit_spans_numbers_and_dlt_prefixes(self):
+        senders_ids = ['AX-FAMILY', 'VM-FAMILY', 'JD-FAMILY-P']
+        items = [
+            {'virtual_number': '7000000001', 'sender_name': senders_ids[i % 3], 'message': f'hi {i}'}
+            for i in range(7)
+        ]
+        self.limiter.limits['number'] = (1, 100)
+        response = self.client.post(reverse('receive_messages_bulk'), items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['accepted'], 5)
+        self.assertEqual(response.data['results'][5]['message'], "Rate limit exceeded")
+        self.assertEqual(response['Retry-After'], '1')
+
+        response = self.client.post(reverse('receive_messages_bulk'), items[:1], format='json')
+        self.assertEqual(response.status_code, 429)
+
+
+class SenderClassificationTests(TestCase):
+    def setUp(self):
+        senders.sender_classifier.invalidate()
+        self.addCleanup(senders.sender_classifier.invalidate)
+
+    def test_dlt_sender_ids(self):
+        cases = {
+            'amazon': 'e-commerce',
+            'AX-AMAZON': 'e-commerce',
+            'VM-FLPKRT': 'e-commerce',
+            'JD-AMZN-S': 'e-commerce',
+            'BZ-AMAZONPAY': 'e-commerce',
+            'AD-INSTGM-T': 'social-media',
+            'Family': 'personal',
+            '+919812345678': 'personal',
+            'VM-HDFCBK': None,
+            'xy-': None,
+        }
+        for sender_id, category in cases.items():
+            self.assertEqual(senders.classify_sender(sender_id), category, sender_id)
+
+    def test_precedence(self):
+        rules = senders.CompiledRules([
+            {'kind': 'prefix', 'pattern': 'shop', 'category': 'e-commerce'},
+            {'kind': 'prefix', 'pattern': 'shopfriend', 'category': 'personal'},
+            {'kind': 'suffix', 'pattern': 'friend', 'category': 'social-media'},
+            {'kind': 'exact', 'pattern': 'shopfriends', 'category': 'social-media'},
+            {'kind': 'regex', 'pattern': r'(a+)b', 'category': 'personal', 'priority': 2},
+            {'kind': 'regex', 'pattern': r'a(a)b', 'category': 'e-commerce', 'priority': 1},
+            {'kind': 'regex', 'pattern': r'(', 'category': 'personal'},
+        ])
+        self.assertEqual(rules.classify('shopfriends'), 'social-media')
+        self.assertEqual(rules.classify('shopfriendly'), 'personal')
+        self.assertEqual(rules.classify('shopper'), 'e-commerce')
+        self.assertEqual(rules.classify('myfriend'), 'social-media')
+        self.assertEqual(rules.classify('aab'), 'e-commerce')
+        self.assertEqual(rules.classify('aaab'), 'personal')
+        self.assertIsNone(rules.classify('aabc'))
+
+    def test_rules_that_cannot_be_combined_still_match(self):
+        rules = senders.CompiledRules([
+            {'kind': 'regex', 'pattern': r'x(\d)\1', 'category': 'personal', 'priority': 1},
+            {'kind': 'regex', 'pattern': r'(?i)abc', 'category': 'e-commerce', 'priority': 2},
+            {'kind': 'regex', 'pattern': r'(?P<r0>zz)q', 'category': 'social-media', 'priority': 3},
+            {'kind': 'regex', 'pattern': r'(a)\1', 'category': 'personal', 'priority': 4},
+            {'kind': 'regex', 'pattern': r'b+', 'category': 'social-media', 'priority': 5},
+        ])
+        self.assertEqual(rules.classify('x11'), 'personal')
+        self.assertIsNone(rules.classify('x12'))
+        self.assertEqual(rules.classify('abc'), 'e-commerce')
+        self.assertEqual(rules.classify('zzq'), 'social-media')
+        self.assertEqual(rules.classify('aa'), 'personal')
+        self.assertEqual(rules.classify('bbb'), 'social-media')
+
+    def test_bad_regex_rules_are_rejected_on_save(self):
+        for pattern in [r'(?i)abc', r'(a)\1', r'(?P<name>a)', r'(']:
+            with self.assertRaises(ValidationError, msg=pattern):
+                SenderRule.objects.create(kind='regex', pattern=pattern, category='personal')
+        self.assertFalse(SenderRule.objects.filter(kind='regex', pattern__in=['(?i)abc', '(']).exists())
+        SenderRule.objects.create(kind='regex', pattern=r'(?i:ab)c+', category='personal')
+
+    def test_rule_changes_are_picked_up(self):
+        self.assertIsNone(senders.classify_sender('AX-HDFCBK'))
+        with self.captureOnCommitCallbacks(execute=True):
+            SenderRule.objects.create(kind='alias', pattern='hdfcbk', target='family')
+        self.assertEqual(senders.classify_sender('AX-HDFCBK'), 'personal')
+
+    def test_rules_file_is_reloaded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'rules.json')
+            with open(path, 'w') as f:
+                json.dump([{'kind': 'exact', 'pattern': 'hdfcbk', 'category': 'personal'}], f)
+            classifier = senders.SenderClassifier(check_interval=0)
+            with self.settings(NUMGUARD_SENDER_RULES_FILE=path):
+                self.assertEqual(classifier.classify('VM-HDFCBK'), 'personal')
+                with open(path, 'w') as f:
+                    json.dump([], f)
+                os.utime(path, (time.time() + 10, time.time() + 10))
+                self.assertIsNone(classifier.classify('VM-HDFCBK'))
+
+    def test_forward_message_accepts_dlt_sender(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        make_virtual_number(physical, '7000000000', 'e-commerce')
+        result = views.forward_message('7000000000', 'VM-FLPKRT', 'Order shipped')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['category'], 'e-commerce')
+
+
+@skipUnless(connection.vendor == 'sqlite', "Parses SQLite's EXPLAIN QUERY PLAN output")
+class QueryPlanTests(TestCase):
+    """Every statement a hot endpoint runs must be answered through an index."""
+
+    # One row per category / rule; read whole by design
+    SMALL_TABLES = {'api_categorycooldown', 'api_senderrule'}
+    # "SCAN api_message" is a full table scan; "SCAN ... USING INDEX" walks a whole index
+    TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?')
+    # Indexes that are already narrowed to the rows a query needs
+    PARTIAL_INDEXES = {'message_unread_idx'}
+
+    def setUp(self):
+        self.client = APIClient()
+        rate_limiter.reset()
+        reset_cooldown_cache()
+        senders.classify_sender('amazon')
+        ownership_cache.clear()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.shop = make_virtual_number(physical, '7000000000', 'e-commerce')
+        self.personal = make_virtual_number(physical, '7000000001', 'personal')
+        now = timezone.now()
+        self.messages = [make_message(self.shop, sender='amazon', received_at=now) for _ in range(3)]
+
+    def table_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        scans = []
+        for line in plan:
+            match = self.TABLE_SCAN.match(line)
+            if match and match.group(1) not in self.SMALL_TABLES and match.group(2) not in self.PARTIAL_INDEXES:
+                scans.append(line)
+        return scans
+
+    def assertIndexedQueries(self, request):
+        with CaptureQueriesContext(connection) as captured:
+            response = request()
+        self.assertLess(response.status_code, 500)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+                continue
+            self.assertEqual(self.table_scans(sql), [], sql)
+
+    def test_hot_endpoints_use_indexes(self):
+        before = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        requests = {
+            'list by category': lambda: self.client.get(reverse('view_virtual_numbers'), {'category': 'e-commerce'}),
+            'message feed': lambda: self.client.get(reverse('forward_message_to_front_end'), {'category': 'e-commerce'}),
+            'feed page': lambda: self.client.get(
+                reverse('forward_message_to_front_end'), {'category': 'e-commerce', 'limit': 2}
+            ),
+            'notifications': lambda: self.client.get(reverse('get_total_notifaction_count')),
+            'receive': lambda: self.client.get(
+                reverse('receive_message'), {'virtual_number': '7000000000', 'sender_name': 'amazon', 'message': 'hi'}
+            ),
+            'read': lambda: self.client.get(reverse('read_message', args=[self.messages[0].id])),
+            'bulk read': lambda: self.client.post(reverse('read_messages'), {'category': 'e-commerce'}, format='json'),
+            'bulk delete': lambda: self.client.post(
+                reverse('delete_messages'), {'virtual_number': '7000000000', 'before': before}, format='json'
+            ),
+            'delete': lambda: self.client.delete(reverse('delete_message', args=[self.messages[1].id])),
+            'owner lookup': lambda: self.client.get(
+                reverse('get_physical_number_by_virtual_number', args=['7000000001'])
+            ),
+            'cooldowns': lambda: self.client.get(reverse('check_category_cooldowns')),
+        }
+        for name, request in requests.items():
+            with self.subTest(name):
+                self.assertIndexedQueries(request)
+
+    def test_unread_recount_uses_partial_index(self):
+        sql = str(Message.objects.filter(virtual_number=self.shop, is_read=False).order_by().values('id').query)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('message_unread_idx', plan)
+
+
+class NumberOwnershipTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        ownership_cache.clear()
+        reset_cooldown_cache()
+        self.alice = PhysicalNumber.objects.create(number='9000000000', owner_name='alice')
+        self.bob = PhysicalNumber.objects.create(number='9000000001', owner_name='bob')
+
+    def lookup(self, number, **params):
+        return self.client.get(reverse('get_physical_number_by_virtual_number', args=[number]), params)
+
+    def delete(self, number):
+        virtual_number = VirtualNumber.objects.get(numbers=number)
+        self.client.delete(reverse('delete_virtual_number', args=[virtual_number.id]))
+
+    def test_number_deleted_twice_still_resolves(self):
+        make_virtual_number(self.alice, '7000000000')
+        self.delete('7000000000')
+        CategoryCooldown.objects.all().delete()
+        reset_cooldown_cache()
+        self.client.post(reverse('restore_last_deleted_virtual_number'))
+        self.delete('7000000000')
+
+        self.assertEqual(DeletedVirtualNumber.objects.filter(number='7000000000').count(), 2)
+        response = self.lookup('7000000000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['owner_name'], 'alice')
+        self.assertEqual(
+            list(NumberOwnership.objects.filter(number='7000000000').values_list('status', flat=True)),
+            ['recoverable', 'deleted']
+        )
+
+    def test_owner_at_time(self):
+        make_virtual_number(self.alice, '7000000000')
+        with self.captureOnCommitCallbacks(execute=True):
+            VirtualNumber.objects.get(numbers='7000000000').delete()
+        between = timezone.now()
+        time.sleep(0.01)
+        make_virtual_number(self.bob, '7000000000')
+        first = NumberOwnership.objects.filter(number='7000000000').order_by('valid_from').first()
+
+        self.assertEqual(self.lookup('7000000000').data['owner_name'], 'bob')
+        self.assertEqual(self.lookup('7000000000', at=first.valid_from.isoformat()).data['owner_name'], 'alice')
+        self.assertEqual(self.lookup('7000000000', at=between.isoformat()).status_code, 404)
+        before = (first.valid_from - datetime.timedelta(seconds=1)).isoformat()
+        self.assertEqual(self.lookup('7000000000', at=before).status_code, 404)
+        self.assertEqual(self.lookup('7000000000', at='noon').status_code, 400)
+
+    def test_lookups_are_cached_until_the_number_changes(self):
+        make_virtual_number(self.alice, '7000000000')
+        self.assertEqual(self.lookup('7000000000').status_code, 200)
+        self.assertEqual(self.lookup('7999999999').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(find_owner('7000000000').physical_number.owner_name, 'alice')
+            # Misses are cached as well
+            self.assertIsNone(find_owner('7999999999'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            VirtualNumber.objects.get(numbers='7000000000').delete()
+            make_virtual_number(self.bob, '7000000000')
+        self.assertEqual(find_owner('7000000000').physical_number.owner_name, 'bob')
+
+
+class DeleteVirtualNumberTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        reset_cooldown_cache()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        self.virtual = make_virtual_number(physical, '7000000000', 'personal')
+        self.created_at = [make_message(self.virtual).created_at for _ in range(5)]
+
+    def test_messages_are_archived(self):
+        response = self.client.delete(reverse('delete_virtual_number', args=[self.virtual.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['messages_archived'], 5)
+        self.assertIn('elapsed_ms', response.data)
+        self.assertEqual(
+            sorted(RecoverableMessage.objects.values_list('sender', 'is_read', 'created_at')),
+            sorted(('family', False, created_at) for created_at in self.created_at)
+        )
+        self.assertFalse(Message.objects.exists())
+
+    def test_restore_brings_back_messages(self):
+        self.client.delete(reverse('delete_virtual_number', args=[self.virtual.id]))
+        response = self.client.post(reverse('restore_last_deleted_virtual_number'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['messages_restored'], 5)
+        restored = VirtualNumber.objects.get(numbers='7000000000')
+        self.assertEqual(
+            sorted(restored.messages.values_list('created_at', flat=True)),
+            sorted(self.created_at)
+        )
+        # The used entry is expired at once and its archive swept later
+        self.assertFalse(RecoverableVirtualNumber.objects.live().exists())
+        self.assertEqual(RecoverableVirtualNumber.sweep_expired(), (1, 5))
+        self.assertFalse(RecoverableMessage.objects.exists())
+
+    def test_failure_rolls_back_everything(self):
+        with mock.patch('api.views.CategoryCooldown.mark_deletion', side_effect=RuntimeError('boom')):
+            response = self.client.delete(reverse('delete_virtual_number', args=[self.virtual.id]))
+        self.assertEqual(response.status_code, 500)
+        self.assertTrue(VirtualNumber.objects.filter(id=self.virtual.id).exists())
+        self.assertEqual(Message.objects.count(), 5)
+        self.assertFalse(DeletedVirtualNumber.objects.exists())
+        self.assertFalse(RecoverableMessage.objects.exists())
+
+
+class RecoveryStackTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        reset_cooldown_cache()
+        self.alice = PhysicalNumber.objects.create(number='9000000000', owner_name='alice')
+        self.bob = PhysicalNumber.objects.create(number='9000000001', owner_name='bob')
+
+    def delete(self, physical, number, category='personal', messages=0):
+        virtual = make_virtual_number(physical, number, category)
+        for _ in range(messages):
+            make_message(virtual)
+        response = self.client.delete(reverse('delete_virtual_number', args=[virtual.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def restore(self, **params):
+        CategoryCooldown.objects.all().delete()
+        reset_cooldown_cache()
+        return self.client.post(reverse('restore_last_deleted_virtual_number'), params, format='json')
+
+    def test_each_physical_number_keeps_its_own_stack(self):
+        self.delete(self.alice, '7000000000')
+        self.delete(self.alice, '7000000001', 'e-commerce')
+        self.delete(self.bob, '7000000002')
+        self.assertEqual(RecoverableVirtualNumber.objects.live().count(), 3)
+
+        self.assertEqual(self.restore(physical_number=self.alice.id).data['restored_number'], '7000000001')
+        self.assertEqual(self.restore().data['restored_number'], '7000000002')
+        self.assertEqual(self.restore().data['restored_number'], '7000000000')
+        self.assertEqual(self.restore().status_code, 404)
+
+    def test_longest_numbers_survive_delete_and_restore(self):
+        longest = max(numbering.GEO_CODE_LENGTHS.values())
+        # SQLite ignores max_length, so check every column that stores a number
+        for model, field in ((VirtualNumber, 'numbers'), (DeletedVirtualNumber, 'number'),
+                             (RecoverableVirtualNumber, 'number'), (NumberOwnership, 'number'), (FreeNumber, 'number')):
+            self.assertGreaterEqual(model._meta.get_field(field).max_length, longest, model.__name__)
+
+        response = self.client.post(reverse('create_virtual_number'), {'geo_code': 'CA', 'category': 'personal'})
+        self.assertEqual(response.status_code, 200)
+        virtual = VirtualNumber.objects.get()
+        self.assertEqual(len(virtual.numbers), 13)
+
+        self.assertEqual(self.client.delete(reverse('delete_virtual_number', args=[virtual.id])).status_code, 200)
+        self.assertEqual(DeletedVirtualNumber.objects.get().number, virtual.numbers)
+        self.assertEqual(self.restore().data['restored_number'], virtual.numbers)
+        self.assertEqual(VirtualNumber.objects.get().numbers, virtual.numbers)
+
+    def test_stack_is_bounded(self):
+        size = RecoverableVirtualNumber.RECOVERY_STACK_SIZE
+        for i in range(size + 2):
+            self.delete(self.alice, f"700000000{i}")
+        live = RecoverableVirtualNumber.objects.live().filter(physical_number=self.alice)
+        self.assertEqual(
+            sorted(live.values_list('number', flat=True)),
+            [f"700000000{i}" for i in range(2, size + 2)]
+        )
+        self.assertEqual(
+            NumberOwnership.objects.get(number='7000000000').status, 'deleted'
+        )
+
+    def test_delete_cost_ignores_other_archives(self):
+        self.delete(self.bob, '7000000009', messages=1)
+        with CaptureQueriesContext(connection) as small:
+            self.delete(self.alice, '7000000000', messages=1)
+
+        for i in range(3):
+            self.delete(self.bob, f"700000001{i}", messages=50)
+        RecoverableVirtualNumber.objects.filter(physical_number=self.bob).update(expires_at=timezone.now())
+        with CaptureQueriesContext(connection) as large:
+            self.delete(self.alice, '7000000001', messages=1)
+
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertFalse(any('DELETE FROM "api_recoverablemessage"' in q['sql'] for q in large.captured_queries))
+
+    def test_expired_entries_are_swept(self):
+        self.delete(self.alice, '7000000000', messages=3)
+        RecoverableVirtualNumber.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.restore().status_code, 404)
+
+        out = StringIO()
+        call_command('sweep_recoverable', stdout=out)
+        self.assertIn('Swept 1 expired entries and 3 archived messages', out.getvalue())
+        self.assertFalse(RecoverableMessage.objects.exists())
+
+
+class NumberAllocatorTests(TestCase):
+    def is_graph_walk(self, number):
+        digits = [int(d) for d in number]
+        return digits[0] in numbering.START_DIGITS and all(b in numbering.G[a] for a, b in zip(digits, digits[1:]))
+
+    def test_capacity_matches_enumeration(self):
+        size = numbering.capacity('UK')
+        numbers = {numbering.unrank_number('UK', i) for i in range(size)}
+        self.assertEqual(len(numbers), size)
+        self.assertTrue(all(len(n) == 9 and self.is_graph_walk(n) for n in numbers))
+
+    def test_random_numbers_are_uniform_over_valid_walks(self):
+        space = [numbering.unrank_number('UK', i) for i in range(numbering.capacity('UK'))]
+        length = len(space[0])
+        draws = 40 * len(space)
+        seen = {}
+        for _ in range(draws):
+            number = numbering.generate_random_number(n=length)
+            seen[number] = seen.get(number, 0) + 1
+        self.assertLessEqual(set(seen), set(space))
+        # Every count should sit near the expected 40 draws per number
+        self.assertGreater(min(seen.get(number, 0) for number in space), 10)
+        self.assertLess(max(seen.values()), 90)
+
+    @mock.patch.dict(numbering.GEO_CODE_LENGTHS, {'XX': 3})
+    def test_allocates_every_number_once_then_exhausts(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        # A number created before the allocator existed must be skipped
+        taken = numbering.unrank_number('XX', 0)
+        make_virtual_number(physical, taken)
+
+        size = numbering.capacity('XX')
+        allocated = []
+        for _ in range(size - 1):
+            number = numbering.allocate_number('XX')
+            allocated.append(number)
+            # Hold each number so the next cycle cannot hand it out again
+            RecoverableVirtualNumber.objects.create(number=number, category='personal', physical_number=physical)
+
+        self.assertNotIn(taken, allocated)
+        self.assertEqual(len(set(allocated)), size - 1)
+        self.assertIsNone(numbering.allocate_number('XX'))
+
+    @mock.patch.dict(numbering.GEO_CODE_LENGTHS, {'XX': 4})
+    def test_allocation_cost_is_flat_as_the_pool_fills(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        size = numbering.capacity('XX')
+
+        def allocate_and_hold():
+            with CaptureQueriesContext(connection) as queries:
+                number = numbering.allocate_number('XX')
+            RecoverableVirtualNumber.objects.create(number=number, category='personal', physical_number=physical)
+            return len(queries.captured_queries)
+
+        allocate_and_hold()  # creates the pool
+        first = allocate_and_hold()
+        for _ in range(size - 4):
+            allocate_and_hold()
+        self.assertEqual(allocate_and_hold(), first)
+
+        # Numbers released for good come back through the free-list, also at a flat cost
+        for entry in RecoverableVirtualNumber.objects.all()[:2]:
+            entry.delete()
+        self.assertEqual(FreeNumber.objects.count(), 2)
+        self.assertEqual([allocate_and_hold(), allocate_and_hold()], [3, 3])
+        self.assertFalse(FreeNumber.objects.exists())
+        self.assertEqual(allocate_and_hold(), first)
+        self.assertIsNone(numbering.allocate_number('XX'))
+
+    @mock.patch.dict(numbering.GEO_CODE_LENGTHS, {'XX': 3})
+    def test_recovery_copies_keep_numbers_off_the_free_list(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        number = numbering.allocate_number('XX')
+        virtual = make_virtual_number(physical, number)
+        entry = RecoverableVirtualNumber.objects.create(number=number, category='personal', physical_number=physical)
+        virtual.delete()
+        self.assertFalse(FreeNumber.objects.exists())
+        entry.delete()
+        self.assertEqual(list(FreeNumber.objects.values_list('number', flat=True)), [number])
+
+
+class CreateVirtualNumberTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        reset_cooldown_cache()
+
+    def create(self, category, geo_code='IN'):
+        return self.client.post(reverse('create_virtual_number'), {'geo_code': geo_code, 'category': category})
+
+    def test_uses_next_physical_number_with_room(self):
+        full = PhysicalNumber.objects.create(number='9000000000', owner_name='full')
+        for i, category in enumerate(['social-media', 'e-commerce', 'personal']):
+            make_virtual_number(full, f"700000000{i}", category)
+        partial = PhysicalNumber.objects.create(number='9000000001', owner_name='partial')
+        make_virtual_number(partial, '7000000010', 'personal')
+        free = PhysicalNumber.objects.create(number='9000000002', owner_name='free')
+
+        self.assertEqual(self.create('personal').status_code, 200)
+        self.assertEqual(free.virtual_numbers.get().category, 'personal')
+
+        self.assertEqual(self.create('e-commerce').status_code, 200)
+        self.assertEqual(partial.virtual_numbers.count(), 2)
+
+    def test_rejects_when_no_capacity(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='owner')
+        make_virtual_number(physical, '7000000000', 'personal')
+        self.assertEqual(self.create('personal').status_code, 400)
+        self.assertEqual(VirtualNumber.objects.count(), 1)
+        # The rejected request must not leave a creation claim behind
+        self.assertFalse(CategoryCooldown.objects.exclude(last_created_at=None).exists())
+
+    @mock.patch.dict(numbering.GEO_CODE_LENGTHS, {'XX': 3})
+    def test_exhausted_pool_rolls_back_the_claim(self):
+        holder = PhysicalNumber.objects.create(number='9000000000', owner_name='holder')
+        for _ in range(numbering.capacity('XX')):
+            number = numbering.allocate_number('XX')
+            RecoverableVirtualNumber.objects.create(number=number, category='personal', physical_number=holder)
+        PhysicalNumber.objects.create(number='9000000001', owner_name='owner')
+        pool = NumberPool.objects.values().get(geo_code='XX')
+
+        response = self.create('personal', geo_code='XX')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(VirtualNumber.objects.exists())
+        self.assertFalse(CategoryCooldown.objects.exclude(last_created_at=None).exists())
+        self.assertEqual(NumberPool.objects.values().get(geo_code='XX'), pool)
+
+
+class CooldownCacheTests(TestCase):
+    def setUp(self):
+        reset_cooldown_cache()
+
+    def test_checks_are_served_from_cache(self):
+        self.assertEqual(CategoryCooldown.check_creation_cooldown('personal'), (True, None))
+        with self.assertNumQueries(0):
+            CategoryCooldown.check_creation_cooldown('personal')
+            CategoryCooldown.get_cached_many(CATEGORIES)
+
+    def test_marks_invalidate_the_cache(self):
+        CategoryCooldown.check_creation_cooldown('personal')
+        CategoryCooldown.mark_deletion('personal')
+        allowed, error = CategoryCooldown.check_creation_cooldown('personal')
+        self.assertFalse(allowed)
+        self.assertIn('Please wait', error)
+
+        CategoryCooldown.mark_recovery('e-commerce')
+        self.assertIsNotNone(CategoryCooldown.get_cached('e-commerce').last_recovered_at)
+
+    def test_reload_racing_an_invalidation_is_not_stored(self):
+        for backend in (LocalCooldownBackend(), DjangoCooldownBackend('default')):
+            with self.subTest(backend=type(backend).__name__):
+                cache = CooldownCache(backend)
+                cache.invalidate(*CATEGORIES)
+                CategoryCooldown.objects.update_or_create(category='personal', defaults={'last_deleted_at': None})
+                load = cache._load
+
+                def load_then_mark(categories):
+                    # Another request deletes a number after our query ran
+                    loaded = load(categories)
+                    CategoryCooldown.objects.filter(category='personal').update(last_deleted_at=timezone.now())
+                    cache.invalidate('personal')
+                    return loaded
+
+                with mock.patch.object(cache, '_load', side_effect=load_then_mark):
+                    self.assertIsNone(cache.get('personal')['last_deleted_at'])
+                # The stale load was not cached, so the next read sees the mark
+                self.assertIsNotNone(cache.get('personal')['last_deleted_at'])
+
+
+class CooldownStatusTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        reset_cooldown_cache()
+
+    def test_idle_payload_is_cached_until_mutation(self):
+        first = self.client.get(reverse('check_category_cooldowns'))
+        self.assertEqual(first['Cache-Control'], 'private, max-age=60')
+        self.assertFalse(first.data['personal']['in_cooldown'])
+        with self.assertNumQueries(0):
+            self.client.get(reverse('check_category_cooldowns'))
+
+        CategoryCooldown.mark_deletion('personal')
+        response = self.client.get(reverse('check_category_cooldowns'))
+        self.assertTrue(response.data['personal']['in_cooldown'])
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_max_age_runs_until_earliest_cooldown_ends(self):
+        CategoryCooldown.objects.create(
+            category='personal', last_deleted_at=timezone.now() - datetime.timedelta(minutes=4)
+        )
+        CategoryCooldown.objects.create(
+            category='e-commerce', last_recovered_at=timezone.now() - datetime.timedelta(minutes=2)
+        )
+        response = self.client.get(reverse('check_category_cooldowns'))
+        max_age = int(response['Cache-Control'].split('max-age=')[1])
+        self.assertTrue(55 <= max_age <= 60)
+        self.assertTrue(response.data['e-commerce']['recovery_cooldown'])
+        self.assertIsNotNone(response.data['personal']['cooldown_ends_at'])
+
+
+class CooldownConcurrencyTests(TransactionTestCase):
+    """Hammer the cooldown claims from many threads at once."""
+
+    workers = 16
+
+    def setUp(self):
+        reset_cooldown_cache()
+
+    def run_concurrently(self, targets):
+        barrier = threading.Barrier(len(targets))
+        results = [None] * len(targets)
+
+        def run(index, target):
+            barrier.wait()
+            try:
+                # Retry lock conflicts so every worker ends with a real decision
+                for attempt in range(500):
+                    try:
+                        results[index] = target()
+                        break
+                    except OperationalError:
+                        time.sleep(0.001 * (attempt % 10))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i, target)) for i, target in enumerate(targets)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def recover(category):
+        # Same sequence as restore_last_deleted_virtual_number
+        cached = CategoryCooldown.get_cached_many(CATEGORIES).values()
+        if any(c and c.is_in_recovery_cooldown()[0] for c in cached):
+            return False
+        with transaction.atomic():
+            return CategoryCooldown.claim_recovery(category)[0]
+
+    @staticmethod
+    def create(category):
+        # Same sequence as create_virtual_number
+        if not CategoryCooldown.check_creation_cooldown(category)[0]:
+            return False
+        with transaction.atomic():
+            return CategoryCooldown.claim_creation(category)[0]
+
+    def test_only_one_concurrent_recovery_wins(self):
+        targets = [lambda category=CATEGORIES[i % 3]: self.recover(category) for i in range(self.workers)]
+        results = self.run_concurrently(targets)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(CategoryCooldown.objects.exclude(last_recovered_at=None).count(), 1)
+
+    def test_no_creation_is_claimed_after_a_deletion(self):
+        # One claim before the race, so last_created_at is always set below
+        self.assertTrue(self.create('personal'))
+
+        def delete():
+            with transaction.atomic():
+                CategoryCooldown.mark_deletion('personal')
+            return 'deleted'
+
+        targets = [lambda: self.create('personal') for _ in range(self.workers)]
+        targets.insert(self.workers // 2, delete)
+        results = self.run_concurrently(targets)
+
+        cooldown = CategoryCooldown.objects.get(category='personal')
+        self.assertIn('deleted', results)
+        self.assertNotIn(None, results)
+        # Any creation that was allowed must have been claimed before the deletion
+        self.assertLess(cooldown.last_created_at, cooldown.last_deleted_at)
+        self.assertFalse(self.create('personal'))
+
+
+@override_settings(NUMGUARD_RETENTION={'read_messages': 30})
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.physical = PhysicalNumber.objects.create(number='9000000000', owner_name='alice')
+        self.virtual = make_virtual_number(self.physical, '7000000000')
+        self.old = timezone.now() - datetime.timedelta(days=31)
+        self.old_read = [make_message(self.virtual, is_read=True, received_at=self.old) for _ in range(5)]
+        self.old_unread = make_message(self.virtual, received_at=self.old)
+        self.new_read = make_message(self.virtual, is_read=True, received_at=timezone.now())
+
+    def enforce(self, *args):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('enforce_retention', *args, stdout=out)
+        # VACUUM is opt-in (and cannot run inside the test transaction)
+        self.assertFalse(any('VACUUM' in query['sql'] for query in queries.captured_queries))
+        return out.getvalue()
+
+    def test_prunes_old_read_messages_in_batches(self):
+        output = self.enforce('--policy', 'read_messages', '--batch-size', '2', '--verbosity', '2')
+
+        self.assertEqual(
+            set(Message.objects.values_list('id', flat=True)),
+            {self.old_unread.id, self.new_read.id}
+        )
+        self.assertEqual(output.count('  read_messages: '), 3)
+        self.assertIn('read_messages: deleted 5 rows older than 30 days', output)
+        self.assertEqual(counters.unread_count(self.virtual.id), 1)
+        self.assertEqual(counters.reconcile(fix=False), {'numbers': [], 'total': None})
+
+    @override_settings(NUMGUARD_RETENTION={})
+    def test_read_messages_are_kept_unless_configured(self):
+        output = self.enforce()
+        self.assertNotIn('read_messages', output)
+        self.assertEqual(Message.objects.count(), 7)
+
+    def test_archives_deleted_rows(self):
+        DeletedVirtualNumber.objects.create(number='7000000001', category='personal', physical_number=self.physical)
+        DeletedVirtualNumber.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=91))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.enforce('--archive', '--archive-dir', tmpdir)
+
+            archived = {}
+            for name in os.listdir(tmpdir):
+                with gzip.open(os.path.join(tmpdir, name), 'rt') as f:
+                    archived[name.split('-')[0]] = [json.loads(line) for line in f]
+
+        self.assertEqual(sorted(row['id'] for row in archived['read_messages']), sorted(m.id for m in self.old_read))
+        self.assertEqual([row['number'] for row in archived['deleted_numbers']], ['7000000001'])
+        self.assertFalse(DeletedVirtualNumber.objects.exists())
+
+    def test_archive_skips_rows_the_recheck_keeps(self):
+        unread_again = self.old_read[0]
+
+        class RacingPolicy(retention.RetentionPolicy):
+            calls = 0
+
+            def expired(self, now):
+                self.calls += 1
+                if self.calls == 2:
+                    # Marked unread between the select and the DELETE's recheck
+                    Message.objects.filter(id=unread_again.id).update(is_read=False)
+                return super().expired(now)
+
+        policy = RacingPolicy('read_messages', Message, 'received_at', 30, {'is_read': True})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = retention.NDJSONArchive(tmpdir, policy.name, timezone.now())
+            deleted = retention.prune(policy, batch_size=10, archive=archive)
+            archive.close()
+            with gzip.open(archive.path, 'rt') as f:
+                archived = [json.loads(line)['id'] for line in f]
+
+        self.assertEqual(deleted, 4)
+        self.assertTrue(Message.objects.filter(id=unread_again.id).exists())
+        self.assertEqual(sorted(archived), sorted(message.id for message in self.old_read[1:]))
+
+    def test_expired_recovery_archives_are_pruned(self):
+        entry = RecoverableVirtualNumber.objects.create(
+            number='7000000002', category='personal', physical_number=self.physical,
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        RecoverableMessage.objects.create(
+            recoverable_virtual_number=entry, category='personal', sender='family',
+            message_body='hello', created_at=timezone.now()
+        )
+        self.enforce('--policy', 'recoverable_messages', '--policy', 'recoverable_numbers')
+        self.assertFalse(RecoverableMessage.objects.exists())
+        self.assertFalse(RecoverableVirtualNumber.objects.exists())
+
+
+class ColdStorageTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = cold_storage.SegmentStore(self.tmpdir.name)
+        patcher = mock.patch.object(cold_storage, '_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = APIClient()
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='alice')
+        self.virtual = make_virtual_number(physical, '7000000000')
+        old = timezone.now() - datetime.timedelta(days=8)
+        self.old = [
+            make_message(self.virtual, received_at=old + datetime.timedelta(seconds=i), message_body=f"old body {i} {'x' * 100}")
+            for i in range(5)
+        ]
+        self.new = make_message(self.virtual, received_at=timezone.now(), message_body='new body')
+
+    def test_old_bodies_move_out_and_read_back(self):
+        out = StringIO()
+        call_command('tier_messages', '--batch-size', '2', stdout=out)
+        self.assertIn('Moved 5 message bodies', out.getvalue())
+
+        preview = cold_storage.PREVIEW_CHARS
+        hot = dict(Message.objects.values_list('id', 'message_body'))
+        self.assertEqual([hot[message.id] for message in self.old], [message.message_body[:preview] for message in self.old])
+        self.assertEqual(hot[self.new.id], self.new.message_body)
+        self.assertEqual(Message.objects.filter(body_ref__isnull=True).count(), 1)
+
+        # Feeds serve the preview without reading cold storage
+        self.store.clear_cache()
+        with mock.patch.object(self.store, 'read', side_effect=AssertionError("cold read")):
+            for params in ({'category': 'personal'}, {'category': 'personal', 'limit': 10}):
+                response = self.client.get(reverse('forward_message_to_front_end'), params)
+                results = response.data['results'] if 'limit' in params else response.data
+                by_id = {message['id']: message for message in results}
+                self.assertEqual(by_id[self.old[0].id]['message_body'], hot[self.old[0].id])
+                self.assertTrue(by_id[self.old[0].id]['truncated'])
+                self.assertFalse(by_id[self.new.id]['truncated'])
+                self.assertNotIn('body_ref', results[0])
+
+        response = self.client.get(reverse('read_message', args=[self.old[2].id]))
+        self.assertEqual(response.data['message_body'], self.old[2].message_body)
+
+    def test_short_bodies_stay_hot(self):
+        short = make_message(self.virtual, received_at=self.old[0].received_at, message_body='short')
+        call_command('tier_messages', stdout=StringIO())
+        short.refresh_from_db()
+        self.assertIsNone(short.body_ref)
+        self.assertEqual(short.message_body, 'short')
+
+    @override_settings(NUMGUARD_COLD_STORAGE={'BLOCK_SIZE': 1})
+    def test_compaction_drops_mostly_dead_segments(self):
+        call_command('tier_messages', '--no-compact', stdout=StringIO())
+        # Seal the segment holding the tiered bodies
+        self.store.segment_bytes = 1
+        self.store.append(['filler'])
+        first = self.store.segments()[0]
+        survivor = self.old[4]
+        Message.objects.filter(id__in=[message.id for message in self.old[:4]]).delete()
+
+        self.assertEqual(cold_storage.compact_segments(self.store, min_dead_ratio=0.9), (0, 0))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            removed, reclaimed = cold_storage.compact_segments(self.store, min_dead_ratio=0.5)
+            # The file outlives the repointing transaction
+            self.assertIn(first, self.store.segments())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(removed, 1)
+        self.assertGreater(reclaimed, 0)
+
+        self.assertNotIn(first, self.store.segments())
+        survivor.refresh_from_db()
+        self.assertFalse(survivor.body_ref.startswith(f"{first}:"))
+        response = self.client.get(reverse('read_message', args=[survivor.id]))
+        self.assertEqual(response.data['message_body'], f"old body 4 {'x' * 100}")
+
+    @override_settings(NUMGUARD_COLD_STORAGE={'BLOCK_SIZE': 1})
+    def test_compaction_keeps_segments_copied_into_while_it_ran(self):
+        call_command('tier_messages', '--no-compact', stdout=StringIO())
+        self.store.segment_bytes = 1
+        self.store.append(['filler'])
+        first = self.store.segments()[0]
+        Message.objects.filter(id__in=[message.id for message in self.old[:4]]).delete()
+        old_ref = Message.objects.get(id=self.old[4].id).body_ref
+
+        # A recovery copy lands between compaction's scan and its repoint
+        bulk_update = Message.objects.bulk_update
+        def copy_then_repoint(*args, **kwargs):
+            recoverable = RecoverableVirtualNumber.objects.create(
+                number='7000000001', category='personal', physical_number=self.virtual.physical_number
+            )
+            views.archive_messages(self.virtual, recoverable)
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(Message.objects, 'bulk_update', side_effect=copy_then_repoint), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(cold_storage.compact_segments(self.store, min_dead_ratio=0.5), (0, 0))
+        self.assertIn(first, self.store.segments())
+        archived = RecoverableMessage.objects.get(body_ref__isnull=False)
+        self.assertEqual(archived.body_ref, old_ref)
+        self.assertEqual(cold_storage.full_body(archived), f"old body 4 {'x' * 100}")
+
+    def test_segments_roll_over_and_bad_refs_raise(self):
+        store = cold_storage.SegmentStore(self.tmpdir.name, segment_bytes=1)
+        first = store.append(['a', 'b'])
+        second = store.append(['c'])
+        self.assertEqual([ref.split(':')[0] for ref in first + second], ['1', '1', '2'])
+        self.assertEqual(store.read_many(first + second), {first[0]: 'a', first[1]: 'b', second[0]: 'c'})
+        for bad_ref in ('9:0:10:0', f"1:0:{first[0].split(':')[2]}:5", 'garbage'):
+            with self.assertRaises(cold_storage.ColdStorageError):
+                store.read_many(first + [bad_ref])
+
+    def test_unreadable_body_is_an_error_not_an_empty_message(self):
+        call_command('tier_messages', stdout=StringIO())
+        Message.objects.filter(id=self.old[0].id).update(body_ref='9:0:10:0')
+        response = self.client.get(reverse('read_message', args=[self.old[0].id]))
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('9:0:10:0', response.data['error'])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_connections_use_wal_and_wait_on_locks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = database_config({'NUMGUARD_SQLITE_BUSY_TIMEOUT_MS': '2500'}, Path(tmpdir))
+            self.assertEqual(config['NAME'], Path(tmpdir) / 'db.sqlite3')
+            self.assertEqual(config['CONN_MAX_AGE'], 600)
+            self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+            # The test runner guards the 'default' alias, so connect under another
+            handler = ConnectionHandler({'default': {}, 'profile': config})
+            try:
+                with handler['profile'].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertEqual(cursor.fetchone()[0], 2500)
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                    cursor.execute("PRAGMA mmap_size")
+                    self.assertEqual(cursor.fetchone()[0], 256 * 1024 * 1024)
+            finally:
+                handler.close_all()
+
+    def test_postgres_profile(self):
+        env = {'NUMGUARD_DB_ENGINE': 'postgres', 'NUMGUARD_DB_HOST': 'db', 'NUMGUARD_DB_PASSWORD': 'secret'}
+        config = database_config(env, Path('/srv'))
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['HOST'], config['PORT'], config['PASSWORD']), ('db', '5432', 'secret'))
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS'], config['OPTIONS']), (60, True, {}))
+
+        pooled = database_config({**env, 'NUMGUARD_DB_POOL': 'true', 'NUMGUARD_DB_POOL_MAX_SIZE': '20'}, Path('/srv'))
+        self.assertEqual(pooled['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10.0})
+        self.assertEqual((pooled['CONN_MAX_AGE'], pooled['CONN_HEALTH_CHECKS']), (0, False))
+
+        with self.assertRaises(ImproperlyConfigured):
+            database_config({**env, 'NUMGUARD_DB_POOL': '1', 'NUMGUARD_DB_CONN_MAX_AGE': '60'}, Path('/srv'))
+        with self.assertRaises(ImproperlyConfigured):
+            database_config({'NUMGUARD_DB_ENGINE': 'mysql'}, Path('/srv'))
+
+    @skipUnless(
+        POSTGRES_URL.startswith(('postgres://', 'postgresql://')) and find_spec('psycopg') and find_spec('psycopg_pool'),
+        "Needs DATABASE_URL pointing at PostgreSQL and psycopg[pool]"
+    )
+    def test_postgres_pooled_profile_connects(self):
+        url = urlsplit(POSTGRES_URL)
+        config = database_config({
+            'NUMGUARD_DB_ENGINE': 'postgres',
+            'NUMGUARD_DB_NAME': url.path.lstrip('/'),
+            'NUMGUARD_DB_USER': unquote(url.username or ''),
+            'NUMGUARD_DB_PASSWORD': unquote(url.password or ''),
+            'NUMGUARD_DB_HOST': url.hostname or 'localhost',
+            'NUMGUARD_DB_PORT': str(url.port or 5432),
+            'NUMGUARD_DB_POOL': 'true',
+            'NUMGUARD_DB_POOL_MIN_SIZE': '1',
+            'NUMGUARD_DB_POOL_MAX_SIZE': '2',
+        }, Path('/srv'))
+
+        handler = ConnectionHandler({'default': {}, 'profile': config})
+        profile = handler['profile']
+        try:
+            # Each close hands the connection back to the pool instead of dropping it
+            for _ in range(3):
+                with profile.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                profile.close()
+            self.assertIsNotNone(profile.pool)
+            self.assertLessEqual(profile.pool.get_stats()['pool_size'], 2)
+        finally:
+            handler.close_all()
+            profile.close_pool()
+
+
+class MessageWriteBatcherTests(SimpleTestCase):
+    workers = 8
+
+    def submit_concurrently(self, batcher, messages):
+        barrier = threading.Barrier(len(messages))
+        results = [None] * len(messages)
+
+        def run(index, message):
+            barrier.wait()
+            try:
+                results[index] = batcher.submit(message)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(i, message)) for i, message in enumerate(messages)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_writes_share_batches(self):
+        batches = []
+
+        def write(messages):
+            batches.append(list(messages))
+            # Long enough for the other writers to pile up behind the first
+            time.sleep(0.01)
+            return [message.upper() for message in messages]
+
+        batcher = write_batcher.MessageWriteBatcher(write=write, max_delay=0.05)
+        messages = [f"message {i}" for i in range(self.workers)]
+        self.assertEqual(self.submit_concurrently(batcher, messages), [m.upper() for m in messages])
+        self.assertLess(len(batches), self.workers)
+        self.assertEqual(sorted(sum(batches, [])), sorted(messages))
+
+    def test_a_bad_message_only_fails_itself(self):
+        def write(messages):
+            if 'bad' in messages:
+                raise ValueError("bad row")
+            return messages
+
+        batcher = write_batcher.MessageWriteBatcher(write=write, max_delay=0.05)
+        results = self.submit_concurrently(batcher, ['good', 'bad', 'fine'])
+        self.assertEqual(results[0], 'good')
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 'fine')
+
+    def test_a_lone_writer_does_not_wait(self):
+        batcher = write_batcher.MessageWriteBatcher(write=lambda messages: messages, max_delay=1)
+        started = time.perf_counter()
+        self.assertEqual(batcher.submit('only'), 'only')
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+
+@override_settings(NUMGUARD_WRITE_BATCHING={'ENABLED': True, 'MAX_DELAY_MS': 50})
+class BatchedIngestTests(TransactionTestCase):
+    # Other TransactionTestCases flush the migration-seeded sender rules
+    serialized_rollback = True
+    workers = 8
+
+    def test_forward_message_through_the_batcher(self):
+        physical = PhysicalNumber.objects.create(number='9000000000', owner_name='alice')
+        virtual = make_virtual_number(physical, '7000000000')
+        batches = []
+
+        def write(messages):
+            batches.append(len(messages))
+            return write_batcher.write_messages(messages)
+
+        batcher = write_batcher.MessageWriteBatcher(write=write, max_delay=0.05)
+        senders.sender_classifier.rules()
+        barrier = threading.Barrier(self.workers)
+        results = [None] * self.workers
+
+        def run(index):
+            barrier.wait()
+            try:
+                results[index] = views.forward_message(virtual, 'family', f"hello {index}")
+            finally:
+                connection.close()
+
+        with mock.patch.object(write_batcher, '_batcher', batcher):
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertTrue(all(result['success'] for result in results), results)
+        self.assertEqual(len({result['message_details']['id'] for result in results}), self.workers)
+        self.assertEqual(sum(batches), self.workers)
+        self.assertLess(len(batches), self.workers)
+        self.assertEqual(counters.unread_count(virtual.id), self.workers)
+        self.assertEqual(counters.total_unread(), self.workers)
 
-# Create your tests here.
@@ -6,15 +6,19 @@ from .views import (
     delete_virtual_number,
     forward_message_to_front_end,
     receive_message,
+    receive_messages_bulk,
     delete_message,
     get_total_notifcation_count,
     read_message,
+    read_messages,
+    delete_messages,
     get_physical_number_by_virtual_number,
     deactivate_virtual_number,
     deactivate_virtual_number_message,
     restore_last_deleted_virtual_number,
     deactivate_virtual_number_call,
-    check_category_cooldowns
+    check_category_cooldowns,
+    stream_messages
 )
 
 urlpatterns = [
@@ -33,8 +37,12 @@ urlpatterns = [
     #! Message Handling
     path('forward-message/', forward_message_to_front_end, name='forward_message_to_front_end'),
     path('receive-message/', receive_message, name='receive_message'),
+    path('receive-messages/', receive_messages_bulk, name='receive_messages_bulk'),
     path('delete-message/<int:message_id>/', delete_message, name='delete_message'),
     path('read-message/<int:message_id>/',read_message,name='read_message'),
+    path('read-messages/', read_messages, name='read_messages'),
+    path('delete-messages/', delete_messages, name='delete_messages'),
+    path('stream-messages/',stream_messages,name='stream_messages'),
 
     #! Notification
     path('total-notification/',get_total_notifcation_count, name='get_total_notifaction_count'),
@@ -0,0 +1,72 @@
+"""
+Resource versions and ETags for polled endpoints.
+
+Each polled resource group has a ResourceVersion counter that is bumped
+whenever data it depends on changes. Endpoints derive their ETag from those
+counters, so a client polling an unchanged resource gets `304 Not Modified`
+after a single indexed lookup, without the view or serializer running.
+Cooldown status is the exception: its ETag is a hash of the cached payload
+(see CategoryCooldown.status_payload), so those polls touch no table at all.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ResourceVersion, CategoryCooldown
+
+
+# Virtual number rows (creation, deletion, toggles)
+NUMBERS = 'numbers'
+# Messages and their read state
+MESSAGES = 'messages'
+# SenderRule rows (watched by api/senders.py to hot-reload the classifier)
+SENDER_RULES = 'sender_rules'
+
+
+def bump_version(*names):
+    """Increment the version of each named resource group."""
+    now = timezone.now()
+    for name in names:
+        updated = ResourceVersion.objects.filter(name=name).update(
+            version=F('version') + 1, updated_at=now
+        )
+        if not updated:
+            _, created = ResourceVersion.objects.get_or_create(name=name, defaults={'version': 1})
+            if not created:
+                ResourceVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now)
+
+
+def get_versions(*names):
+    """Return {name: version} for the named groups in a single query."""
+    versions = dict(ResourceVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    return {name: versions.get(name, 0) for name in names}
+
+
+def make_etag(*names, extra=None):
+    """Build an ETag from the current versions of the named groups."""
+    versions = get_versions(*names)
+    tag = '-'.join(f"{name}.{versions[name]}" for name in names)
+    if extra:
+        tag = f"{tag}-{extra}"
+    return tag
+
+
+#! ==================== ETAG FUNCTIONS ====================
+# Signature matches django.views.decorators.http.condition(etag_func=...)
+
+def virtual_numbers_etag(request, *args, **kwargs):
+    # unread_count is part of the listing, so messages count as well
+    return make_etag(NUMBERS, MESSAGES)
+
+
+def messages_etag(request, *args, **kwargs):
+    return make_etag(NUMBERS, MESSAGES)
+
+
+def notifications_etag(request, *args, **kwargs):
+    return make_etag(MESSAGES)
+
+
+def cooldowns_etag(request, *args, **kwargs):
+    # Derived from the cached payload, so an unchanged poll touches no table
+    return CategoryCooldown.status_payload()['etag']
@@ -20,58 +20,35 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import VirtualNumber, Message, PhysicalNumber, DeletedVirtualNumber,RecoverableMessage,RecoverableVirtualNumber,CategoryCooldown
 from .serializer import VirtualNumberSerializer, MessageSerializer, PhysicalNumberSerializer, DeletedVirtualNumberSerializer
+from .pagination import InvalidCursor, paginate_messages, parse_limit
+from .counters import adjust_unread, adjust_total, recount, total_unread
+from .ingest_queue import get_ingest_queue, queued_ingest_enabled
+from .cold_storage import ColdStorageError, full_body, lock_body_refs
+from .events import get_broker, publish_unread_count
+from .ownership import expire_recoverable, find_owner
+from .ratelimit import rate_limiter
+from .write_batcher import store_message, write_messages
+from .senders import classify_sender, normalize as normalize_sender
+from .numbering import GEO_CODE_LENGTHS, allocate_number
+from .versioning import bump_version, MESSAGES, virtual_numbers_etag, messages_etag, notifications_etag, cooldowns_etag
 from rest_framework.permissions import AllowAny
-import random
+import math
+import time
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.views.decorators.http import condition, require_GET
+from django.http import StreamingHttpResponse
+from django.core.exceptions import RequestDataTooBig
+import json
 
 
 #! ==================== NUMBER GENERATION LOGIC ====================
-
-# Starting digit for virtual numbers (6-9)
-st = random.randint(6, 9)
-
-# Graph representing valid digit connections for number generation
-# Each key represents a digit, and its value array shows which digits can follow it
-G = {
-    0: [4, 6],
-    1: [6, 8],
-    2: [7, 9],
-    3: [4, 8],
-    4: [0, 3, 9],
-    5: [],
-    6: [0, 1, 7],
-    7: [2, 6],
-    8: [1, 3],
-    9: [2, 4],
-}
-
-# Define number lengths for different country codes
-GEO_CODE_LENGTHS = {
-    'IN': 10,  # India: 10 digits
-    'US': 12,  # United States: 12 digits
-    'UK': 9,   # United Kingdom: 9 digits
-    'DE': 11,  # Germany: 11 digits
-    'CA': 13   # Canada: 13 digits
-}
+# Digit graph, geo code lengths and the number allocator live in numbering.py
 
 # Valid categories for virtual numbers
 CATEGORY_CHOICES = ['social-media', 'e-commerce', 'personal']
 
-def generate_random_number(n=10, start=st, G=G):
-    """
-    Generate a random virtual number using graph-based constraints.
-    Each digit is chosen based on valid connections defined in graph G.
-    """
-    number = str(start)
-    current = start
-    for _ in range(n - 1):
-        if not G[current]:
-            current = random.randint(0, 9)  # If no valid connections, pick random digit
-        else:
-            current = random.choice(G[current])  # Pick from valid connections
-        number += str(current)
-    return number
-
 
 #! ==================== VIRTUAL NUMBER MANAGEMENT ====================
 
@@ -93,27 +70,37 @@ def create_virtual_number(request):
     if category not in CATEGORY_CHOICES:
         return Response(status=status.HTTP_400_BAD_REQUEST)
     
-    # Check category cooldown
+    # Check category cooldown (cached fast path; re-checked atomically below)
     allowed, error_message = CategoryCooldown.check_creation_cooldown(category, cooldown_minutes=5)
     if not allowed:
         return Response({"error": error_message}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
-    # Generate number based on country code
-    n = GEO_CODE_LENGTHS[geo_code]
-    number = generate_random_number(n=n)
-
-    # Get available physical number
-    physical_number = PhysicalNumber.objects.filter(is_active=True).first()
-    if not physical_number or not physical_number.has_capacity_for_virtual_number():
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-
-    # Create virtual number
     try:
-        VirtualNumber.objects.create(
-            numbers=number,
-            category=category,
-            physical_number=physical_number
-        )
+        with transaction.atomic():
+            # Authoritative check-and-mark; holds the category row until commit
+            allowed, error_message = CategoryCooldown.claim_creation(category, cooldown_minutes=5)
+            if not allowed:
+                return Response({"error": error_message}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+            # Lock a physical number with room for this category
+            physical_number = PhysicalNumber.reserve_for_category(category)
+            if not physical_number:
+                # Nothing was created: undo the claim instead of committing it
+                transaction.set_rollback(True)
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+
+            # Reserve an unused number from the geo code's pool
+            number = allocate_number(geo_code)
+            if number is None:
+                transaction.set_rollback(True)
+                return Response({"error": f"No free {geo_code} numbers left"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            # Create virtual number
+            VirtualNumber.objects.create(
+                numbers=number,
+                category=category,
+                physical_number=physical_number
+            )
         return Response(status=status.HTTP_200_OK)
     except Exception as e:
         print("Error creating virtual number:", e)
@@ -130,75 +117,128 @@ def get_physical_numbers(request):
     serializer = PhysicalNumberSerializer(physical_numbers, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
+@condition(etag_func=virtual_numbers_etag)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def view_virtual_numbers(request):
     """Get virtual numbers, optionally filtered by category"""
     category = request.query_params.get('category')
+    virtual_numbers = VirtualNumber.objects.with_unread_count()
     if category:
-        virtual_numbers = VirtualNumber.objects.filter(category=category)
-    else:
-        virtual_numbers = VirtualNumber.objects.all()
+        virtual_numbers = virtual_numbers.filter(category=category)
     serializer = VirtualNumberSerializer(virtual_numbers, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 #! ==================== NUMBER DELETION AND RECOVERY ====================
 
+# Columns shared by Message and RecoverableMessage
+MESSAGE_COPY_FIELDS = ['category', 'sender', 'message_body', 'body_ref', 'is_read', 'received_at', 'created_at']
+
+def copy_messages(source_model, source_fk, source_id, target_model, target_fk, target_id):
+    """
+    Copy every message row owned by `source_id` into `target_model` rows owned
+    by `target_id` with a single INSERT ... SELECT. Rows never pass through
+    Python, so memory stays flat however large the inbox is. Holds
+    lock_body_refs so cold storage compaction cannot delete a segment the
+    copied body_refs point into. Call inside transaction.atomic().
+
+    Returns:
+        int: number of rows copied
+    """
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(source_model._meta.get_field(name).column) for name in MESSAGE_COPY_FIELDS)
+    sql = (
+        f"INSERT INTO {qn(target_model._meta.db_table)} "
+        f"({qn(target_model._meta.get_field(target_fk).column)}, {columns}) "
+        f"SELECT %s, {columns} FROM {qn(source_model._meta.db_table)} "
+        f"WHERE {qn(source_model._meta.get_field(source_fk).column)} = %s"
+    )
+    lock_body_refs()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target_id, source_id])
+        return cursor.rowcount
+
+
+def archive_messages(virtual_number, recoverable_virtual_number):
+    """Copy a virtual number's messages into RecoverableMessage rows."""
+    return copy_messages(
+        Message, 'virtual_number', virtual_number.id,
+        RecoverableMessage, 'recoverable_virtual_number', recoverable_virtual_number.id
+    )
+
+
+def restore_messages(recoverable_virtual_number, virtual_number):
+    """Copy archived messages back into Message rows, keeping their original timestamps."""
+    restored = copy_messages(
+        RecoverableMessage, 'recoverable_virtual_number', recoverable_virtual_number.id,
+        Message, 'virtual_number', virtual_number.id
+    )
+    # The raw insert bypasses post_save, including its unread counting
+    unread = recoverable_virtual_number.recoverable_messages.filter(is_read=False).count()
+    adjust_unread({virtual_number.id: unread})
+    bump_version(MESSAGES)
+    transaction.on_commit(lambda: publish_unread_count(virtual_number))
+    return restored
+
+
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
 def delete_virtual_number(request, virtual_number_id):
     """
     Delete a virtual number and prepare it for potential recovery.
-    Steps:
+    Steps (all in one transaction, so a failure leaves nothing half-copied):
     1. Create deletion record
-    2. Store recoverable copy with messages
+    2. Push a recoverable copy with messages onto the physical number's stack
     3. Mark category for cooldown
     4. Delete original number
+    Work is proportional to this number alone: entries pushed off the stack
+    are only marked expired and swept later (manage.py sweep_recoverable).
     """
+    started = time.perf_counter()
     try:
-        virtual_number = VirtualNumber.objects.get(id=virtual_number_id)
-        category = virtual_number.category
+        with transaction.atomic():
+            # Lock the row so its unread_count cannot change before it is subtracted
+            virtual_number = VirtualNumber.objects.select_for_update().select_related('physical_number').get(id=virtual_number_id)
+            category = virtual_number.category
+
+            # Create deletion record
+            DeletedVirtualNumber.objects.create(
+                number=virtual_number.numbers,
+                category=virtual_number.category,
+                physical_number=virtual_number.physical_number
+            )
+            
+            # Keep the physical number's recovery stack bounded
+            expired_numbers = RecoverableVirtualNumber.make_room(virtual_number.physical_number)
+            if expired_numbers:
+                expire_recoverable(expired_numbers)
+
+            # Store recoverable copy
+            recoverable_virtual_number = RecoverableVirtualNumber.objects.create(
+                number=virtual_number.numbers,
+                category=virtual_number.category,
+                physical_number=virtual_number.physical_number,
+                is_active=virtual_number.is_active,
+                is_message_active=virtual_number.is_message_active,
+                is_call_active=virtual_number.is_call_active
+            )
 
-        # Create deletion record
-        DeletedVirtualNumber.objects.create(
-            number=virtual_number.numbers,
-            category=virtual_number.category,
-            physical_number=virtual_number.physical_number
-        )
-        
-        # Clear previous recoverable data
-        RecoverableVirtualNumber.objects.all().delete()
-
-        # Store recoverable copy
-        recoverable_virtual_number = RecoverableVirtualNumber.objects.create(
-            number=virtual_number.numbers,
-            category=virtual_number.category,
-            physical_number=virtual_number.physical_number,
-            is_active=virtual_number.is_active,
-            is_message_active=virtual_number.is_message_active,
-            is_call_active=virtual_number.is_call_active
-        )
+            # Store associated messages
+            messages_archived = archive_messages(virtual_number, recoverable_virtual_number)
+            
+            # Start deletion cooldown
+            CategoryCooldown.mark_deletion(category)
 
-        # Store associated messages
-        messages = Message.objects.filter(virtual_number=virtual_number)
-        for message in messages:
-            RecoverableMessage.objects.create(
-                recoverable_virtual_number=recoverable_virtual_number,
-                category=message.category,
-                sender=message.sender,
-                message_body=message.message_body,
-                is_read=message.is_read,
-                received_at=message.received_at,
-                created_at=message.created_at
-            )
-        
-        # Start deletion cooldown
-        CategoryCooldown.mark_deletion(category)
+            # Delete the original number (its messages go with a single cascade DELETE)
+            virtual_number.delete()
+            adjust_total(-virtual_number.unread_count)
 
-        # Delete the original number
-        virtual_number.delete()
-        return Response({"message": "Virtual number deleted successfully"}, status=status.HTTP_200_OK)
+        return Response({
+            "message": "Virtual number deleted successfully",
+            "messages_archived": messages_archived,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }, status=status.HTTP_200_OK)
     
     except VirtualNumber.DoesNotExist:
         return Response({"error": "Virtual number not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -210,33 +250,35 @@ def delete_virtual_number(request, virtual_number_id):
 @permission_classes([AllowAny])
 def restore_last_deleted_virtual_number(request):
     """
-    Restore the most recently deleted virtual number.
+    Restore the most recently deleted virtual number, optionally from the
+    recovery stack of one `physical_number` (id).
     Steps:
     1. Check recovery cooldown for all categories
     2. Get last deleted number
-    3. Restore number and its messages
-    4. Start recovery cooldown
-    5. Clean up recoverable data
+    3. Start recovery cooldown (atomically re-checked)
+    4. Claim the stack entry, restore number and its messages
     """
     try:
         # Check cooldown status for all categories
         categories = ['social-media', 'e-commerce', 'personal']
-        for category in categories:
-            try:
-                cooldown = CategoryCooldown.objects.get(category=category)
-                in_recovery_cooldown, remaining_time = cooldown.is_in_recovery_cooldown()
-                if in_recovery_cooldown:
-                    remaining_minutes = int(remaining_time.total_seconds() // 60)
-                    remaining_seconds = int(remaining_time.total_seconds() % 60)
-                    return Response(
-                        {"message": f"Cannot recover number yet. Please wait {remaining_minutes}m {remaining_seconds}s."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            except CategoryCooldown.DoesNotExist:
+        for category, cooldown in CategoryCooldown.get_cached_many(categories).items():
+            if cooldown is None:
                 continue
-
-        # Get last deleted number
-        last_deleted_virtual_number = RecoverableVirtualNumber.objects.first()
+            in_recovery_cooldown, remaining_time = cooldown.is_in_recovery_cooldown()
+            if in_recovery_cooldown:
+                remaining_minutes = int(remaining_time.total_seconds() // 60)
+                remaining_seconds = int(remaining_time.total_seconds() % 60)
+                return Response(
+                    {"message": f"Cannot recover number yet. Please wait {remaining_minutes}m {remaining_seconds}s."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        # Get last deleted number that can still be recovered
+        recoverables = RecoverableVirtualNumber.objects.live().select_related('physical_number')
+        physical_number_id = request.data.get('physical_number') or request.GET.get('physical_number')
+        if physical_number_id:
+            recoverables = recoverables.filter(physical_number_id=physical_number_id)
+        last_deleted_virtual_number = recoverables.first()
         if not last_deleted_virtual_number:
             return Response({"message": "No recently deleted virtual number found to restore"}, 
                            status=status.HTTP_404_NOT_FOUND)
@@ -248,36 +290,32 @@ def restore_last_deleted_virtual_number(request):
         
         category = last_deleted_virtual_number.category
         
-        # Restore the virtual number
-        recovered_virtual_number = VirtualNumber.objects.create(
-            numbers=last_deleted_virtual_number.number,
-            category=last_deleted_virtual_number.category,
-            physical_number=last_deleted_virtual_number.physical_number,
-            is_active=last_deleted_virtual_number.is_active,
-            is_message_active=last_deleted_virtual_number.is_message_active,
-            is_call_active=last_deleted_virtual_number.is_call_active
-        )
-
-        # Restore associated messages
-        recoverable_messages = RecoverableMessage.objects.filter(recoverable_virtual_number=last_deleted_virtual_number)
-        message_count = recoverable_messages.count()
-        
-        for rec_message in recoverable_messages:
-            Message.objects.create(
-                virtual_number=recovered_virtual_number,
-                category=rec_message.category,
-                sender=rec_message.sender,
-                message_body=rec_message.message_body,
-                is_read=rec_message.is_read,
-                received_at=rec_message.received_at,
-                created_at=rec_message.created_at
+        with transaction.atomic():
+            # Check-and-mark the recovery cooldown in one step so concurrent
+            # restores cannot both pass the check above
+            allowed, error_message = CategoryCooldown.claim_recovery(category)
+            if not allowed:
+                return Response({"message": error_message}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Take the entry off the stack; it may have expired since it was read
+            if not last_deleted_virtual_number.claim():
+                transaction.set_rollback(True)
+                return Response({"message": "No recently deleted virtual number found to restore"},
+                                status=status.HTTP_404_NOT_FOUND)
+            expire_recoverable([last_deleted_virtual_number.number])
+
+            # Restore the virtual number
+            recovered_virtual_number = VirtualNumber.objects.create(
+                numbers=last_deleted_virtual_number.number,
+                category=last_deleted_virtual_number.category,
+                physical_number=last_deleted_virtual_number.physical_number,
+                is_active=last_deleted_virtual_number.is_active,
+                is_message_active=last_deleted_virtual_number.is_message_active,
+                is_call_active=last_deleted_virtual_number.is_call_active
             )
-        
-        # Start recovery cooldown
-        CategoryCooldown.mark_recovery(category)
-        
-        # Clean up recoverable data
-        RecoverableVirtualNumber.objects.all().delete()
+
+            # Restore associated messages (the archive itself is swept later)
+            message_count = restore_messages(last_deleted_virtual_number, recovered_virtual_number)
         
         return Response({
             "message": "Virtual number restored successfully",
@@ -342,39 +380,19 @@ def deactivate_virtual_number_call(request, virtual_number_id):
 
 #! ==================== MESSAGE HANDLING ====================
 
+@condition(etag_func=notifications_etag)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_total_notifcation_count(request):
     """Get count of unread messages"""
     try:
-        total_notification = Message.objects.filter(is_read=False).count()
+        total_notification = total_unread()
         if total_notification == 0:
             return Response({'message':'No new notifications'}, status=status.HTTP_200_OK)
         return Response({'total_notification':total_notification}, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({'error':str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-# Map of sender names to their categories
-SENDER_CATEGORIES = {
-    # E-commerce senders
-    'shopeasy':'e-commerce',
-    'amazon': 'e-commerce',
-    'flipkart': 'e-commerce',
-    'ebay': 'e-commerce',
-    'walmart': 'e-commerce',
-
-    # Social media senders
-    'insta': 'social-media',
-    'twitter': 'social-media',
-    'linkedin': 'social-media',
-
-    # Personal senders
-    '12': 'personal',
-    'personal': 'personal',
-    'family': 'personal',
-    'friend': 'personal',
-}
-
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def receive_message(request):
@@ -394,6 +412,26 @@ def receive_message(request):
     if not virtual_number or not msg or not sender_name:
         return Response({"message": "Both message and sender name are required"}, 
                         status=status.HTTP_400_BAD_REQUEST)
+
+    # Reject floods before any database or journal write
+    allowed, retry_after = rate_limiter.check(virtual_number, normalize_sender(sender_name))
+    if not allowed:
+        return rate_limited_response(retry_after)
+
+    if queued_ingest_enabled():
+        # Acknowledge once the message is in the durable journal; drain workers store it
+        idempotency_key = request.headers.get('Idempotency-Key') or request.GET.get('message_id')
+        entry_id, duplicate = get_ingest_queue().append({
+            'virtual_number': virtual_number,
+            'sender_name': sender_name,
+            'message': msg,
+            'received_at': timezone.now().isoformat(),
+        }, idempotency_key)
+        return Response({
+            "message": "Message already queued" if duplicate else "Message queued",
+            "queue_id": entry_id,
+            "duplicate": duplicate
+        }, status=status.HTTP_202_ACCEPTED)
     
     try:
         virtual_number_obj = VirtualNumber.objects.get(numbers=virtual_number)
@@ -408,8 +446,8 @@ def receive_message(request):
             return Response({"message": "Virtual number is not active"}, 
                            status=status.HTTP_400_BAD_REQUEST)
 
-        # Process and store message
-        result = forward_message(virtual_number, sender_name, msg)
+        # Process and store message (reusing the number we already looked up)
+        result = forward_message(virtual_number_obj, sender_name, msg)
         
         if result.get('success'):
             return Response({
@@ -425,13 +463,28 @@ def receive_message(request):
         return Response({"message": "Virtual number not found"}, 
                         status=status.HTTP_404_NOT_FOUND)
 
+def rate_limited_response(retry_after):
+    """429 response telling the carrier when to retry."""
+    retry_after = math.ceil(retry_after)
+    response = Response({"message": f"Too many messages. Retry after {retry_after}s.", "retry_after": retry_after},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(retry_after)
+    return response
+
 def forward_message(virtual_number, sender_name, msg):
-    """Process and store incoming message with category validation"""
+    """
+    Process and store incoming message with category validation.
+    `virtual_number` may be the number string or an already loaded VirtualNumber.
+    """
     try:
-        virtual_number_obj = VirtualNumber.objects.get(numbers=virtual_number)
+        if isinstance(virtual_number, VirtualNumber):
+            virtual_number_obj = virtual_number
+            virtual_number = virtual_number_obj.numbers
+        else:
+            virtual_number_obj = VirtualNumber.objects.get(numbers=virtual_number)
         
         # Get sender's category
-        category = SENDER_CATEGORIES.get(sender_name.lower())
+        category = classify_sender(sender_name)
         if not category:
             return {
                 'success': False, 
@@ -445,15 +498,15 @@ def forward_message(virtual_number, sender_name, msg):
                 'message': f"Category mismatch: Sender category '{category}' doesn't match virtual number category '{virtual_number_obj.category}'"
             }
         
-        # Store message
-        message = Message.objects.create(
+        # Store message; concurrent requests may share one transaction (api/write_batcher.py)
+        message = store_message(Message(
             virtual_number=virtual_number_obj,
             sender=sender_name,
             message_body=msg,
             category=category,
             is_read=False,
             received_at=timezone.now()
-        )
+        ))
         
         return {
             'success': True,
@@ -480,10 +533,176 @@ def forward_message(virtual_number, sender_name, msg):
             'message': f"Error processing message: {str(e)}"
         }
 
+# Upper bound on messages accepted in one bulk request. The request body must
+# also fit DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB by default), which holds 1000
+# messages of up to ~2 KB each, longer than a full multipart SMS.
+MAX_INGEST_BATCH_SIZE = 1000
+
+def forward_messages(items, received_at=None, rate_limit=False):
+    """
+    Validate and store a batch of incoming messages.
+    All target numbers are resolved with one IN query, senders are classified
+    in memory and accepted messages are written with bulk_create.
+
+    Args:
+        items (list): dicts with virtual_number, sender_name and message keys
+        received_at (list): optional receive time per item (defaults to now)
+        rate_limit (bool): charge each item to the ingest rate limiter first
+
+    Returns:
+        list: one result dict per item, in input order
+    """
+    numbers = {
+        item.get('virtual_number') for item in items
+        if isinstance(item, dict) and isinstance(item.get('virtual_number'), str)
+    }
+    virtual_numbers = {vn.numbers: vn for vn in VirtualNumber.objects.filter(numbers__in=numbers)}
+
+    results = []
+    pending = []
+    now = timezone.now()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'success': False, 'message': "Item must be an object"})
+            continue
+        number, sender_name, msg = item.get('virtual_number'), item.get('sender_name'), item.get('message')
+        if not all(isinstance(value, str) and value for value in (number, sender_name, msg)):
+            results.append({'index': index, 'success': False,
+                            'message': "virtual_number, sender_name and message are required strings"})
+            continue
+        if rate_limit:
+            allowed, retry_after = rate_limiter.check(number, normalize_sender(sender_name))
+            if not allowed:
+                results.append({'index': index, 'success': False, 'message': "Rate limit exceeded",
+                                'retry_after': math.ceil(retry_after)})
+                continue
+
+        virtual_number_obj = virtual_numbers.get(number)
+        error = None
+        if virtual_number_obj is None:
+            error = f"Virtual number not found: {number}"
+        elif not virtual_number_obj.is_message_active:
+            error = "Virtual number is not active for messages"
+        elif not virtual_number_obj.is_active:
+            error = "Virtual number is not active"
+        else:
+            category = classify_sender(sender_name)
+            if not category:
+                error = f"Unknown sender: {sender_name}"
+            elif virtual_number_obj.category != category:
+                error = f"Category mismatch: Sender category '{category}' doesn't match virtual number category '{virtual_number_obj.category}'"
+        if error:
+            results.append({'index': index, 'success': False, 'message': error})
+            continue
+
+        result = {'index': index, 'success': True, 'category': category, 'virtual_number': number}
+        results.append(result)
+        pending.append((result, Message(
+            virtual_number=virtual_number_obj,
+            sender=sender_name,
+            message_body=msg,
+            category=category,
+            is_read=False,
+            received_at=received_at[index] if received_at else now
+        )))
+
+    if pending:
+        created = write_messages([message for _, message in pending])
+        for (result, _), message in zip(pending, created):
+            result['id'] = message.id
+    return results
+
+
+def drain_ingest_queue(queue, batch_size=500, worker=None):
+    """
+    Claim one batch from the ingest queue, store it through forward_messages
+    and record each entry's result.
+
+    If the batch cannot be stored, its entries are retried one by one and
+    only those that fail on their own are charged an attempt. Database
+    outages propagate and leave the batch leased for a later retry.
+
+    Returns:
+        int: number of entries processed (0 when the queue is empty)
+    """
+    entries = queue.claim(batch_size, worker=worker)
+    if not entries:
+        return 0
+    items = [payload for _, payload in entries]
+    received_at = [parse_datetime(payload.get('received_at') or '') or timezone.now() for payload in items]
+    try:
+        results = forward_messages(items, received_at=received_at)
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:
+        results, errors = {}, {}
+        try:
+            for (entry_id, payload), when in zip(entries, received_at):
+                try:
+                    results[entry_id] = forward_messages([payload], received_at=[when])[0]
+                except (OperationalError, InterfaceError):
+                    raise
+                except Exception as e:
+                    errors[entry_id] = f"Could not store message: {e}"
+        finally:
+            # Record what was stored even if the database went away midway
+            queue.complete(results)
+            queue.record_failures(errors)
+        return len(entries)
+    queue.complete({entry_id: result for (entry_id, _), result in zip(entries, results)})
+    return len(entries)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def receive_messages_bulk(request):
+    """
+    Receive a batch of messages in one request.
+    Accepts a JSON array, or NDJSON (one JSON object per line) when sent as
+    application/x-ndjson. Returns a per-item result list.
+    """
+    # Compare the media type only: clients may add "; charset=utf-8"
+    media_type = request.content_type.split(';')[0].strip().lower()
+    try:
+        body = request.body.decode('utf-8')
+        if media_type in ('application/x-ndjson', 'application/jsonl'):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except RequestDataTooBig:
+        return Response({"message": f"Request body too large: send at most {MAX_INGEST_BATCH_SIZE} messages per request"},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    except (UnicodeDecodeError, ValueError) as e:
+        return Response({"message": f"Invalid request body: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(items, list):
+        return Response({"message": "Expected a list of messages"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_INGEST_BATCH_SIZE:
+        return Response({"message": f"Batch too large: at most {MAX_INGEST_BATCH_SIZE} messages per request"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    results = forward_messages(items, rate_limit=True)
+    accepted = sum(1 for result in results if result['success'])
+    retry_after = max((result.get('retry_after', 0) for result in results), default=0)
+    response = Response({
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS if retry_after and not accepted else status.HTTP_200_OK)
+    if retry_after:
+        response['Retry-After'] = str(retry_after)
+    return response
+
+@condition(etag_func=messages_etag)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def forward_message_to_front_end(request):
-    """Retrieve messages for a specific category"""
+    """
+    Retrieve messages for a specific category.
+    Passing any of `limit`, `cursor` or `after` switches to cursor pagination:
+    - cursor: page back through older messages
+    - after: fetch only messages stored since the last one seen (SQLite only)
+    """
     category = request.GET.get('category')
     if not category:
         return Response({"error": "Category parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -492,6 +711,23 @@ def forward_message_to_front_end(request):
     if not virtual_number.exists():
         return Response({"error": f"No active virtual numbers found for category: {category}"}, 
                         status=status.HTTP_404_NOT_FOUND)
+
+    if any(key in request.GET for key in ('limit', 'cursor', 'after')):
+        try:
+            page, next_cursor, latest_cursor, has_more = paginate_messages(
+                Message.objects.filter(virtual_number__in=virtual_number),
+                limit=parse_limit(request.GET.get('limit')),
+                cursor=request.GET.get('cursor'),
+                after=request.GET.get('after')
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "results": MessageSerializer(page, many=True).data,
+            "next_cursor": next_cursor,
+            "latest_cursor": latest_cursor,
+            "has_more": has_more
+        }, status=status.HTTP_200_OK)
     
     message = Message.objects.filter(virtual_number__in=virtual_number).order_by('-received_at')
     if not message:
@@ -504,52 +740,207 @@ def forward_message_to_front_end(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])         
 def read_message(request, message_id):
-    """Mark a message as read"""
+    """Mark a message as read and return its full body"""
     try:
-        message = Message.objects.get(id=message_id)
-        if not message.is_read:
-            message.is_read = True
-            message.save()
-            return Response({'message':"Message read"}, status=status.HTTP_200_OK)
-        return Response({'message':"Message already read"}, status=status.HTTP_200_OK)
+        message = Message.objects.select_related('virtual_number').get(id=message_id)
+        with transaction.atomic():
+            # Conditional update, so concurrent reads decrement the counters once
+            marked = Message.objects.filter(id=message_id, is_read=False).update(is_read=True)
+            if marked:
+                adjust_unread({message.virtual_number_id: -1})
+                bump_version(MESSAGES)
+                transaction.on_commit(lambda: publish_unread_count(message.virtual_number))
+        # Feeds only carry a preview of bodies in cold storage
+        body = full_body(message)
+        if marked:
+            return Response({'message':"Message read", 'message_body': body}, status=status.HTTP_200_OK)
+        return Response({'message':"Message already read", 'message_body': body}, status=status.HTTP_200_OK)
     except Message.DoesNotExist:
         return Response({'message':"Message not found"}, status=status.HTTP_404_NOT_FOUND)
+    except ColdStorageError as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['DELETE'])
 @permission_classes([AllowAny])
 def delete_message(request, message_id):
     """Delete a specific message"""
     try:
-        message = Message.objects.get(id=message_id)
-        message.delete()
+        with transaction.atomic():
+            # Lock the row so a concurrent read cannot change is_read under us
+            message = Message.objects.select_for_update().select_related('virtual_number').get(id=message_id)
+            virtual_number = message.virtual_number
+            message.delete()
+            if not message.is_read:
+                adjust_unread({virtual_number.id: -1})
+            bump_version(MESSAGES)
+            transaction.on_commit(lambda: publish_unread_count(virtual_number))
         return Response({'message':'Message deleted successfully'}, status=status.HTTP_200_OK)
     except Message.DoesNotExist:
         return Response({'message':'Message not found'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+# Upper bound on message ids accepted by one bulk read/delete request
+MAX_BULK_MESSAGE_IDS = 10000
+
+def select_messages(data):
+    """
+    Build the Message queryset targeted by a bulk read/delete request.
+    Accepts `ids` (a list of message ids) and/or the filters `category`,
+    `virtual_number` and `before` (ISO timestamp, compared to received_at).
+    At least one selector is required so an empty body cannot hit every row.
+
+    Returns:
+        tuple: (queryset, error message or None)
+    """
+    if not isinstance(data, dict):
+        return None, "Expected a JSON object"
+    messages = Message.objects.all()
+    selected = False
+
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return None, "ids must be a list of message ids"
+        if len(ids) > MAX_BULK_MESSAGE_IDS:
+            return None, f"Too many ids: at most {MAX_BULK_MESSAGE_IDS} per request"
+        messages = messages.filter(id__in=ids)
+        selected = True
+
+    category = data.get('category')
+    if category:
+        messages = messages.filter(category=category)
+        selected = True
+
+    virtual_number = data.get('virtual_number')
+    if virtual_number:
+        messages = messages.filter(virtual_number__numbers=virtual_number)
+        selected = True
+
+    before = data.get('before')
+    if before:
+        before_dt = parse_datetime(before) if isinstance(before, str) else None
+        if before_dt is None:
+            return None, f"Invalid before timestamp: {before}"
+        if timezone.is_naive(before_dt):
+            before_dt = timezone.make_aware(before_dt)
+        messages = messages.filter(received_at__lt=before_dt)
+        selected = True
+
+    if not selected:
+        return None, "Provide ids or at least one of category, virtual_number, before"
+    return messages, None
+
+
+def publish_unread_counts(virtual_number_ids):
+    """Publish the new unread count of each affected virtual number after commit."""
+    def publish():
+        for virtual_number in VirtualNumber.objects.filter(pk__in=virtual_number_ids):
+            publish_unread_count(virtual_number)
+    if virtual_number_ids and get_broker().has_subscribers():
+        transaction.on_commit(publish)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def read_messages(request):
+    """Mark every selected message as read with a single UPDATE"""
+    messages, error = select_messages(request.data)
+    if error:
+        return Response({'message': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    unread = messages.filter(is_read=False)
+    with transaction.atomic():
+        affected_numbers = set(unread.values_list('virtual_number', flat=True).distinct())
+        updated = unread.update(is_read=True)
+        if updated:
+            recount(affected_numbers)
+            bump_version(MESSAGES)
+            publish_unread_counts(affected_numbers)
+    return Response({'message': f"{updated} message(s) marked as read", 'updated': updated},
+                    status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def delete_messages(request):
+    """Delete every selected message with a single DELETE"""
+    messages, error = select_messages(request.data)
+    if error:
+        return Response({'message': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        affected_numbers = set(messages.values_list('virtual_number', flat=True).distinct())
+        # Message has no delete signals or dependents, so this is one DELETE statement
+        deleted, _ = messages.delete()
+        if deleted:
+            recount(affected_numbers)
+            bump_version(MESSAGES)
+            publish_unread_counts(affected_numbers)
+    return Response({'message': f"{deleted} message(s) deleted", 'deleted': deleted},
+                    status=status.HTTP_200_OK)
+
+
+#! ==================== SERVER PUSH ====================
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_HEARTBEAT_SECONDS = 15
+
+@require_GET
+async def stream_messages(request):
+    """
+    Stream new messages and unread count changes as Server-Sent Events.
+    Optional filters: category, virtual_number.
+    Needs an ASGI server (server/asgi.py) to hold connections without a thread each.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(
+        category=request.GET.get('category'),
+        virtual_number=request.GET.get('virtual_number')
+    )
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                event = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 #! ==================== NUMBER LOOKUP ENDPOINTS ====================
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def get_physical_number_by_virtual_number(request, virtual_number):
-    """Find physical number associated with a virtual number"""
+    """
+    Find the physical number that holds a virtual number, or held it last if
+    it was deleted. Pass `at` (ISO timestamp) to ask who held it at that time.
+    """
     try:
-        # Check active virtual numbers
-        try:
-            virtual_number_obj = VirtualNumber.objects.get(numbers=virtual_number)
-            physical_number = virtual_number_obj.physical_number
-            serializer = PhysicalNumberSerializer(physical_number)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except VirtualNumber.DoesNotExist:
-            # Check deleted virtual numbers
-            try:
-                deleted_virtual_number = DeletedVirtualNumber.objects.get(number=virtual_number)
-                physical_number = deleted_virtual_number.physical_number
-                serializer = PhysicalNumberSerializer(physical_number)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except DeletedVirtualNumber.DoesNotExist:
-                return Response({"error": "Virtual number not found in active or deleted records"}, 
-                               status=status.HTTP_404_NOT_FOUND)
+        at = request.GET.get('at')
+        if at:
+            at = parse_datetime(at)
+            if at is None:
+                return Response({"error": "Invalid at timestamp"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+
+        # One indexed lookup over active, recoverable and deleted numbers
+        ownership = find_owner(virtual_number, at or None)
+        if ownership is None:
+            return Response({"error": "Virtual number not found in active or deleted records"}, 
+                           status=status.HTTP_404_NOT_FOUND)
+        serializer = PhysicalNumberSerializer(ownership.physical_number)
+        return Response(serializer.data, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -559,7 +950,7 @@ def get_virtual_number_by_physical_number(request, physical_number):
     """Find all active virtual numbers associated with a physical number"""
     try:
         physical_number = PhysicalNumber.objects.filter(is_active=True).get(id=physical_number)
-        virtual_numbers = VirtualNumber.objects.filter(physical_number=physical_number, is_active=True)
+        virtual_numbers = VirtualNumber.objects.with_unread_count().filter(physical_number=physical_number, is_active=True)
         serializer = VirtualNumberSerializer(virtual_numbers, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except PhysicalNumber.DoesNotExist:
@@ -568,6 +959,10 @@ def get_virtual_number_by_physical_number(request, physical_number):
 
 #! ==================== COOLDOWN MANAGEMENT ====================
 
+# max-age advertised while no cooldown is running
+COOLDOWN_IDLE_MAX_AGE = 60
+
+@condition(etag_func=cooldowns_etag)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def check_category_cooldowns(request):
@@ -578,45 +973,20 @@ def check_category_cooldowns(request):
     - Last deletion time
     - Last recovery time
     - Remaining cooldown time
+    The payload is rendered once and cached until the next cooldown boundary
+    or mutation; Cache-Control tells clients when the earliest cooldown ends.
     """
     try:
-        categories = ['social-media', 'e-commerce', 'personal']
-        cooldowns = {}
-        
-        for category in categories:
-            try:
-                cooldown = CategoryCooldown.objects.get(category=category)
-                in_cooldown, remaining_time = cooldown.is_in_cooldown()
-                in_recovery_cooldown, recovery_remaining_time = cooldown.is_in_recovery_cooldown()
-                
-                if in_cooldown:
-                    remaining_minutes = int(remaining_time.total_seconds() // 60)
-                    remaining_seconds = int(remaining_time.total_seconds() % 60)
-                    status = f"In cooldown - {remaining_minutes}m {remaining_seconds}s remaining"
-                else:
-                    status = "Available for creation"
-                
-                cooldowns[category] = {
-                    "in_cooldown": in_cooldown,
-                    "last_deleted": cooldown.last_deleted_at.strftime("%Y-%m-%d %H:%M:%S") if cooldown.last_deleted_at else "Never",
-                    "last_recovered": cooldown.last_recovered_at.strftime("%Y-%m-%d %H:%M:%S") if cooldown.last_recovered_at else "Never",
-                    "status": status,
-                    "recovery_cooldown": in_recovery_cooldown,
-                    "recovery_remaining_time": f"{int(recovery_remaining_time.total_seconds() // 60)}m {int(recovery_remaining_time.total_seconds() % 60)}s" if in_recovery_cooldown else None
-                }
-            except CategoryCooldown.DoesNotExist:
-                cooldowns[category] = {
-                    "in_cooldown": False,
-                    "last_deleted": "Never",
-                    "last_recovered": "Never",
-                    "status": "Available for creation",
-                    "recovery_cooldown": False,
-                    "recovery_remaining_time": None
-                }
-        
-        return Response(cooldowns)
+        entry = CategoryCooldown.status_payload()
+        if entry['expires_at']:
+            max_age = max(1, math.ceil((entry['expires_at'] - timezone.now()).total_seconds()))
+        else:
+            max_age = COOLDOWN_IDLE_MAX_AGE
+        response = Response(entry['payload'])
+        response['Cache-Control'] = f"private, max-age={max_age}"
+        return response
     except Exception as e:
         return Response(
             {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
-        )
\ No newline at end of file
+        )
@@ -2,6 +2,9 @@
 ASGI config for server project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn server.asgi:application``) so the
+``/api/stream-messages/`` Server-Sent Events endpoint can hold many idle
+connections without tying up a thread each.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -0,0 +1,114 @@
+"""
+Environment-driven database profiles.
+
+SQLite (the default) suits a single node. Connections are kept open between
+requests, and every new connection switches the database to WAL mode and
+waits on locks instead of failing with "database is locked":
+
+    NUMGUARD_DB_ENGINE=sqlite
+    NUMGUARD_DB_NAME=/srv/numguard/db.sqlite3       # default: BASE_DIR / 'db.sqlite3'
+    NUMGUARD_SQLITE_BUSY_TIMEOUT_MS=5000
+    NUMGUARD_SQLITE_SYNCHRONOUS=NORMAL              # FULL to fsync every commit, not just checkpoints
+    NUMGUARD_SQLITE_MMAP_SIZE=268435456             # bytes of the file read through mmap; 0 disables
+    NUMGUARD_SQLITE_TRANSACTION_MODE=IMMEDIATE      # optional: take write locks at BEGIN
+
+PostgreSQL is for scale-out. Either keep persistent connections per worker,
+or set NUMGUARD_DB_POOL to share a psycopg pool per process (this needs
+`psycopg[pool]`):
+
+    NUMGUARD_DB_ENGINE=postgres
+    NUMGUARD_DB_NAME=numguard NUMGUARD_DB_USER=numguard NUMGUARD_DB_PASSWORD=...
+    NUMGUARD_DB_HOST=localhost NUMGUARD_DB_PORT=5432
+    NUMGUARD_DB_POOL=true NUMGUARD_DB_POOL_MIN_SIZE=2 NUMGUARD_DB_POOL_MAX_SIZE=10
+
+Both profiles honour NUMGUARD_DB_CONN_MAX_AGE (in seconds; a pool requires 0)
+and NUMGUARD_DB_HEALTH_CHECKS. The test suite runs against whichever
+profile the environment selects. DatabaseProfileTests also connects through
+the pooled PostgreSQL profile when DATABASE_URL points at a server and
+psycopg[pool] is installed; otherwise that test is skipped.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+SQLITE_CONN_MAX_AGE = 600
+POSTGRES_CONN_MAX_AGE = 60
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def env_flag(env, name, default=False):
+    value = env.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in TRUE_VALUES
+
+
+def sqlite_pragmas(env):
+    """PRAGMA statements run on every new SQLite connection, in order."""
+    busy_timeout = int(env.get('NUMGUARD_SQLITE_BUSY_TIMEOUT_MS', SQLITE_BUSY_TIMEOUT_MS))
+    synchronous = env.get('NUMGUARD_SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        raise ImproperlyConfigured(f"Unknown NUMGUARD_SQLITE_SYNCHRONOUS: {synchronous!r}")
+    return {
+        # Readers no longer block the writer, nor the writer readers
+        'journal_mode': 'WAL',
+        'busy_timeout': busy_timeout,
+        # In WAL mode NORMAL only fsyncs at checkpoints: a power loss can drop
+        # the last commits but never corrupts the database
+        'synchronous': synchronous,
+        'mmap_size': int(env.get('NUMGUARD_SQLITE_MMAP_SIZE', SQLITE_MMAP_SIZE)),
+    }
+
+
+def sqlite_profile(env, base_dir):
+    options = {
+        'init_command': '; '.join(f"PRAGMA {name}={value}" for name, value in sqlite_pragmas(env).items()),
+    }
+    if env.get('NUMGUARD_SQLITE_TRANSACTION_MODE'):
+        options['transaction_mode'] = env['NUMGUARD_SQLITE_TRANSACTION_MODE'].upper()
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('NUMGUARD_DB_NAME') or base_dir / 'db.sqlite3',
+        'CONN_MAX_AGE': int(env.get('NUMGUARD_DB_CONN_MAX_AGE', SQLITE_CONN_MAX_AGE)),
+        'CONN_HEALTH_CHECKS': env_flag(env, 'NUMGUARD_DB_HEALTH_CHECKS', True),
+        'OPTIONS': options,
+    }
+
+
+def postgres_profile(env):
+    pooled = env_flag(env, 'NUMGUARD_DB_POOL')
+    options = {}
+    if pooled:
+        options['pool'] = {
+            'min_size': int(env.get('NUMGUARD_DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('NUMGUARD_DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(env.get('NUMGUARD_DB_POOL_TIMEOUT', 10)),
+        }
+    conn_max_age = int(env.get('NUMGUARD_DB_CONN_MAX_AGE', 0 if pooled else POSTGRES_CONN_MAX_AGE))
+    if pooled and conn_max_age:
+        raise ImproperlyConfigured("NUMGUARD_DB_POOL needs NUMGUARD_DB_CONN_MAX_AGE=0: the pool keeps connections open")
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('NUMGUARD_DB_NAME', 'numguard'),
+        'USER': env.get('NUMGUARD_DB_USER', 'numguard'),
+        'PASSWORD': env.get('NUMGUARD_DB_PASSWORD', ''),
+        'HOST': env.get('NUMGUARD_DB_HOST', 'localhost'),
+        'PORT': env.get('NUMGUARD_DB_PORT', '5432'),
+        'CONN_MAX_AGE': conn_max_age,
+        # A pool checks connections itself
+        'CONN_HEALTH_CHECKS': env_flag(env, 'NUMGUARD_DB_HEALTH_CHECKS', not pooled),
+        'OPTIONS': options,
+    }
+
+
+def database_config(env, base_dir):
+    """Build DATABASES['default'] from NUMGUARD_DB_* environment variables."""
+    engine = env.get('NUMGUARD_DB_ENGINE', 'sqlite').strip().lower()
+    if engine in ('sqlite', 'sqlite3'):
+        return sqlite_profile(env, base_dir)
+    if engine in ('postgres', 'postgresql'):
+        return postgres_profile(env)
+    raise ImproperlyConfigured(f"Unknown NUMGUARD_DB_ENGINE: {engine!r} (use 'sqlite' or 'postgres')")
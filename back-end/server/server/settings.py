@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .db_profile import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -89,11 +92,19 @@ WSGI_APPLICATION = 'server.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Selected by NUMGUARD_DB_* environment variables, see server/db_profile.py
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ, BASE_DIR)
+}
+
+# Group commit for incoming messages, see api/write_batcher.py. Concurrent
+# webhook writes share one transaction, which multiplies ingest throughput on
+# SQLite; a writer that is alone skips the wait and commits on its own, so
+# light traffic keeps direct-write latency.
+NUMGUARD_WRITE_BATCHING = {
+    'ENABLED': True,
+    'MAX_DELAY_MS': 2,
 }
 
 
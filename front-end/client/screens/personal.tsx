@@ -24,6 +24,8 @@ interface Message {
   virtual_number: number;
   sender: string;
   message_body: string;
+  // Set when message_body is a preview; opening the message loads the rest
+  truncated?: boolean;
   category: string;
   is_read: boolean;
   received_at: string;
@@ -186,8 +188,16 @@ const Personal: React.FC = () => {
     try {
       const response = await api.get(`/read-message/${id}/`);
       if (response.status === 200) {
+        // Older messages arrive as a preview; the full body comes back here
         const updatedMessages = messages.map((msg) =>
-          msg.id === id ? { ...msg, is_read: true } : msg
+          msg.id === id
+            ? {
+                ...msg,
+                is_read: true,
+                message_body: response.data.message_body ?? msg.message_body,
+                truncated: false,
+              }
+            : msg
         );
         setMessages(updatedMessages);
         const updatedUnreadCount = unreadNotifications > 0 ? unreadNotifications - 1 : 0;
@@ -536,7 +546,10 @@ const Personal: React.FC = () => {
                       {formatTimestamp(item.received_at || item.created_at)}
                     </Text>
                   </View>
-                  <Text style={styles.messageText}>{item.message_body}</Text>
+                  <Text style={styles.messageText}>
+                    {item.message_body}
+                    {item.truncated ? "…" : ""}
+                  </Text>
                 </View>
               </TouchableOpacity>
             ))